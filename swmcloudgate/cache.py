@@ -1,115 +1,451 @@
+import os
+import abc
+import json
+import fcntl
+import heapq
 import atexit
 import pickle  # nosec B403
+import typing
+import asyncio
+import hashlib
 import logging
+import sqlite3
+import tempfile
+import threading
+import contextlib
 from pathlib import Path
 from datetime import datetime, timedelta
-from functools import lru_cache
+from functools import partial, lru_cache
 
-from pydantic import BaseModel
-
-from swmcloudgate import config
+from swmcloudgate import config, metrics, tracing
+from swmcloudgate.routers.executor import provider_executor
 
 LOG = logging.getLogger("swm")
 
 DEFAULT_CONFIG_FILE: Path = Path.home() / ".swm" / "cloud-gate.yaml"
+SQLITE_BUSY_TIMEOUT = 30.0
+
+CacheKey = tuple[str, ...]
+CacheValue = list[typing.Any] | dict[typing.Any, typing.Any]  # of pydantic models
+CacheEntry = tuple[datetime, CacheValue]
+V = typing.TypeVar("V", bound=CacheValue)
+R = typing.TypeVar("R")
+
+
+def normalize_key(key: typing.Iterable[str]) -> CacheKey:
+    return tuple(str(it) for it in key)
+
+
+async def run_blocking(func: typing.Callable[..., R], *args: typing.Any) -> R:
+    """Run the storage call in the cache executor, so a busy database or a locked file does not stall the event loop."""
+    return await provider_executor("cache").run(func, *args)
+
+
+class CacheStorage(abc.ABC):
+    """Base class for persistent cache storage backends."""
+
+    def __init__(self, file_path: Path) -> None:
+        self._file_path = file_path
+        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def file_path(self) -> Path:
+        return self._file_path
+
+    @abc.abstractmethod
+    def get(self, key: CacheKey) -> CacheEntry | None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def put(self, key: CacheKey, timestamp: datetime, value: CacheValue) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def purge(self, fresh_timestamp: datetime) -> int:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def items(self) -> list[tuple[CacheKey, CacheEntry]]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        raise NotImplementedError()
+
+
+class PickleCacheStorage(CacheStorage):
+    """Legacy storage: the whole cache is pickled into one file.
+    The file is replaced atomically, so a killed worker never leaves a torn file behind.
+    Writers re-read the file under an exclusive lock, so workers do not overwrite each other's entries.
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        super().__init__(file_path)
+        self._data: dict[CacheKey, CacheEntry] | None = None
+        self._mtime_ns: int | None = None
+
+    def get(self, key: CacheKey) -> CacheEntry | None:
+        return self._load().get(key)
+
+    def put(self, key: CacheKey, timestamp: datetime, value: CacheValue) -> None:
+        with self._file_lock():
+            self._load()[key] = (timestamp, value)
+            self._write(self._file_path, self._dump())
+
+    def purge(self, fresh_timestamp: datetime) -> int:
+        with self._file_lock():
+            data = self._load()
+            expired = [key for key, (timestamp, _) in data.items() if timestamp < fresh_timestamp]
+            for key in expired:
+                del data[key]
+            if expired:
+                self._write(self._file_path, self._dump())
+        return len(expired)
+
+    def items(self) -> list[tuple[CacheKey, CacheEntry]]:
+        return list(self._load().items())
+
+    def close(self) -> None:
+        pass  # the file is opened only while it is read or written
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> typing.Iterator[None]:
+        with open(self._file_path.with_name(f"{self._file_path.name}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> dict[CacheKey, CacheEntry]:
+        try:
+            mtime_ns = self._file_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if self._data is None or mtime_ns != self._mtime_ns:  # the file was replaced by another worker
+            self._data = {
+                normalize_key(key): (timestamp, value) for timestamp, key, value in self._read(self._file_path)
+            }
+            self._mtime_ns = mtime_ns
+        return self._data
+
+    def _dump(self) -> list[tuple[datetime, list[str], CacheValue]]:
+        return [(timestamp, list(key), value) for key, (timestamp, value) in self._load().items()]
+
+    def _read(self, file_path: Path) -> list[tuple[datetime, list[str], CacheValue]]:
+        LOG.debug(f"Read cache: {file_path}")
+        try:
+            with open(file_path, "rb") as file:
+                return pickle.load(file)  # nosec B301
+        except EOFError as e:
+            LOG.debug(f"Cannot load cache file {file_path}: {e}")
+        except FileNotFoundError as e:
+            LOG.debug(f"File not found: {e}")
+        return []
+
+    def _write(self, file_path: Path, data: list[tuple[datetime, list[str], CacheValue]]) -> None:
+        LOG.debug(f"Dump cache data into {file_path}")
+        fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(data, file)  # nosec B301
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, file_path)
+            if file_path == self._file_path:
+                self._mtime_ns = file_path.stat().st_mtime_ns
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+
+class SqliteCacheStorage(CacheStorage):
+    """Storage that keeps one SQLite row per cache key.
+    Only the changed key is written on update and entries are read on demand.
+    The database is opened in WAL mode, so it is shared safely by all workers of the node.
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        super().__init__(file_path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            file_path,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")  # readers of other workers do not block the writer
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, timestamp REAL NOT NULL, value BLOB NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp)")
+
+    def get(self, key: CacheKey) -> CacheEntry | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT timestamp, value FROM entries WHERE key = ?", (self._serialize_key(key),)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return datetime.fromtimestamp(row[0]), pickle.loads(row[1])  # nosec B301
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            LOG.debug(f"Cannot load cache entry {key} from {self._file_path}: {e}")
+        return None
+
+    def put(self, key: CacheKey, timestamp: datetime, value: CacheValue) -> None:
+        blob = pickle.dumps(value)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, timestamp, value) VALUES (?, ?, ?)",
+                (self._serialize_key(key), timestamp.timestamp(), blob),
+            )
+
+    def purge(self, fresh_timestamp: datetime) -> int:
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM entries WHERE timestamp < ?", (fresh_timestamp.timestamp(),))
+        return cursor.rowcount
+
+    def items(self) -> list[tuple[CacheKey, CacheEntry]]:
+        with self._lock:
+            rows = self._connection.execute("SELECT key, timestamp, value FROM entries").fetchall()
+        result: list[tuple[CacheKey, CacheEntry]] = []
+        for key, timestamp, value in rows:
+            try:
+                data = pickle.loads(value)  # nosec B301
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+                LOG.debug(f"Cannot load cache entry {key} from {self._file_path}: {e}")
+                continue
+            result.append((normalize_key(json.loads(key)), (datetime.fromtimestamp(timestamp), data)))
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _serialize_key(self, key: CacheKey) -> str:
+        return json.dumps(list(key))
+
+
+STORAGES: dict[str, tuple[type[CacheStorage], str]] = {
+    "pickle": (PickleCacheStorage, "dat"),
+    "sqlite": (SqliteCacheStorage, "sqlite"),
+}
 
 
 class Cache:
     """Class for caching rarely changed data retrieved from cloud provider.
-    The cache is maintained in memory but saved in file on exit and then loaded on start.
+    The cache is maintained in memory and written through to a pluggable persistent storage
+    from which entries are loaded lazily, one key at a time.
+    Entries are indexed by the normalized key, while a heap ordered by timestamp
+    keeps expired entries purgeable without scanning the whole cache.
     """
 
-    _cache_file_path: Path = Path()
-    _data: list[tuple[datetime, list[str], list[BaseModel]]] = []
+    _data: dict[CacheKey, CacheEntry] = {}
+    _expiry: list[tuple[datetime, CacheKey]] = []
 
     def __init__(self, data_kind: str, data_provider: str, settings: config.Settings) -> None:
         self._data_kind = data_kind
         self._data_provider = data_provider
         self._settings = settings
-        self._data, self._cache_file_path = self._load_from_filesystem()
-        LOG.debug(f"Start {data_kind} cache: {self._cache_file_path}")
+        self._data = {}
+        self._expiry = []
+        self._in_flight: dict[CacheKey, asyncio.Task[typing.Any]] = {}
+        self._storage = self._open_storage()
+        LOG.debug(f"Start {data_kind} cache: {self._storage.file_path}")
 
     def __del__(self) -> None:
         LOG.debug(f"Stop {self._data_kind} cache")
-        self._write(self._cache_file_path, self._data)
+        if storage := getattr(self, "_storage", None):
+            storage.close()
 
     @property
     def expire(self) -> int:
-        return self._settings.base.cache_expire
-
-    def fetch_and_update(self, key: list[str]) -> list[BaseModel] | None:
-        LOG.debug(f"Try to fetch {self._data_kind} from in-memory cache by key: {key}")
-        for timestamp, cached_key, cached_value in self._data[:]:
-            if timestamp >= datetime.now() - timedelta(seconds=self._settings.base.cache_expire):
-                if key == cached_key:
-                    return cached_value
+        return self._settings.base.cache_expire_by_kind.get(self._data_kind, self._settings.base.cache_expire)
+
+    @property
+    def refresh(self) -> int | None:
+        return self._settings.base.cache_refresh_by_kind.get(self._data_kind, self._settings.base.cache_refresh)
+
+    def fetch_and_update(self, key: list[str]) -> CacheValue | None:
+        LOG.debug(f"Try to fetch {self._data_kind} from cache by key: {key}")
+        if entry := self._get_entry(normalize_key(key), datetime.now() - timedelta(seconds=self.expire)):
+            return entry[1]
         return None
 
-    def update(self, key: list[str], value: list[BaseModel]) -> tuple[int, int]:
-        LOG.debug(f"Update in-memory cache: {self._data_kind}")
-        changed: int = 0
-        deleted: int = 0
+    async def fetch(self, key: list[str]) -> CacheValue | None:
+        """Return the cached value like fetch_and_update, the storage is read in the cache executor."""
+        if entry := await self._fetch_entry(normalize_key(key), datetime.now() - timedelta(seconds=self.expire)):
+            return entry[1]
+        return None
+
+    def update(self, key: list[str], value: CacheValue) -> tuple[int, int]:
+        LOG.debug(f"Update cache: {self._data_kind}")
+        now = datetime.now()
+        fresh_timestamp = now - timedelta(seconds=self.expire)
+        self._purge(fresh_timestamp)
+        cache_key = normalize_key(key)
+        changed, deleted = self._write(cache_key, now, value, self._get_memory_entry(cache_key, fresh_timestamp))
+        self._insert(cache_key, now, value)
+        return changed, deleted
 
-        data: list[tuple[datetime, list[str], list[BaseModel]]] = []
-        found = False
+    async def _update(self, cache_key: CacheKey, value: CacheValue) -> tuple[int, int]:
+        LOG.debug(f"Update cache: {self._data_kind}")
         now = datetime.now()
-        fresh_timestamp = now - timedelta(seconds=self._settings.base.cache_expire)
-        for timestamp, cached_key, cached_value in self._data:
-            if cached_key == key:
-                if timestamp < fresh_timestamp:
-                    deleted += 1
-                    continue
-                found = True
-                if cached_value != value:
-                    data.append((now, cached_key, value))
-                    changed += 1
+        fresh_timestamp = now - timedelta(seconds=self.expire)
+        self._purge(fresh_timestamp)
+        entry = self._get_memory_entry(cache_key, fresh_timestamp)
+        changed, deleted = await run_blocking(self._write, cache_key, now, value, entry)
+        self._insert(cache_key, now, value)
+        return changed, deleted
+
+    def _write(
+        self, cache_key: CacheKey, timestamp: datetime, value: CacheValue, entry: CacheEntry | None
+    ) -> tuple[int, int]:
+        """Write the value to the storage, return whether it differs from the entry and the number of purged entries.
+        When the entry is not in memory, the value is compared with the stored one.
+        """
+        fresh_timestamp = timestamp - timedelta(seconds=self.expire)
+        deleted = self._storage.purge(fresh_timestamp)
+        if entry is None and (stored := self._storage.get(cache_key)) and stored[0] >= fresh_timestamp:
+            entry = stored
+        self._storage.put(cache_key, timestamp, value)  # also renews the timestamp of the unchanged value
+        return int(entry is None or entry[1] != value), deleted
+
+    async def fetch_or_load(
+        self,
+        key: list[str],
+        loader: typing.Callable[[], typing.Awaitable[V]],
+    ) -> V:
+        """Return the cached value or load it with the loader coroutine function.
+        Concurrent misses of the same key are coalesced: only one caller runs the loader
+        while the others await its result (or its exception).
+        When the entry is older than the refresh period, but is not expired yet, the stale value
+        is returned immediately while the entry is reloaded in background.
+        """
+        with tracing.span(f"cache.{self._data_kind}"):
+            now = datetime.now()
+            cache_key = normalize_key(key)
+            if (entry := await self._fetch_entry(cache_key, now - timedelta(seconds=self.expire))) and entry[1]:
+                timestamp, data = entry
+                if self.refresh is not None and timestamp < now - timedelta(seconds=self.refresh):
+                    LOG.debug(f"Cached {self._data_kind} are stale, refresh them in background: {key}")
+                    self._count("stale")
+                    self._loading(cache_key, loader)
                 else:
-                    data.append((timestamp, cached_key, cached_value))
-            elif timestamp < fresh_timestamp:
-                deleted += 1
-            else:
-                data.append((timestamp, cached_key, cached_value))  # not changed
-        self._data = data
+                    LOG.debug(f"Cached {self._data_kind} found (amount={len(data)})")
+                    self._count("hit")
+                return typing.cast(V, data)  # the loader of the key returned it
 
-        if not found:
-            self._data.append((now, key, value))
-            changed += 1
+            self._count("miss")
 
-        self._write(self._cache_file_path, self._data)
+            if cache_key in self._in_flight:
+                LOG.debug(f"Wait for {self._data_kind} already being loaded by key: {key}")
+            return await asyncio.shield(self._loading(cache_key, loader))
 
-        return changed, deleted
+    def _count(self, result: str) -> None:
+        labels = {"provider": self._data_provider, "kind": self._data_kind, "result": result}
+        metrics.METRICS.inc("swm_cache_requests_total", labels)
+        tracing.annotate(result=result)
 
-    def _load_from_filesystem(self) -> tuple[list[tuple[datetime, list[str], list[BaseModel]]], Path]:
-        LOG.debug(f"Load cache data from directory: {self._settings.base.cache_dir}")
-        data: list[tuple[datetime, list[str], list[BaseModel]]] = []
-        cache_file_path = Path(
-            f"{self._settings.base.cache_dir}/cloud-gate-{self._data_provider}-{self._data_kind}.dat"
-        ).expanduser()
-        if cache_file_path.exists():
-            data = self._read(cache_file_path)
-        else:
-            cache_file_path.parent.mkdir(parents=True, exist_ok=True)
-            cache_file_path.touch(exist_ok=True)
-        return data, cache_file_path
-
-    def _read(self, file_path: Path) -> list[tuple[datetime, list[str], list[BaseModel]]]:
-        LOG.debug(f"Read cache: {file_path}")
-        try:
-            with open(file_path, "rb") as file:
-                return pickle.load(file)  # nosec B301
-        except EOFError as e:
-            LOG.debug(f"Cannot load cache file {file_path}: {e}")
-        except FileNotFoundError as e:
-            LOG.debug(f"File not found: {e}")
-        return []
+    def _loading(
+        self,
+        cache_key: CacheKey,
+        loader: typing.Callable[[], typing.Awaitable[V]],
+    ) -> asyncio.Task[V]:
+        if task := self._in_flight.get(cache_key):
+            return task
+        task = asyncio.create_task(self._load(cache_key, loader))
+        task.add_done_callback(partial(self._loaded, cache_key))
+        self._in_flight[cache_key] = task
+        return task
 
-    def _write(self, file_path: Path, data: list[tuple[datetime, list[str], list[BaseModel]]]) -> None:
-        if data:
-            LOG.debug(f"Dump cache {self._data_kind} data into {file_path}")
-            with open(file_path, "wb") as file:
-                pickle.dump(data, file)  # nosec B301
-        else:
-            LOG.debug(f"Nothing to dump for {self._data_kind} data")
+    def _loaded(self, cache_key: CacheKey, task: asyncio.Task[typing.Any]) -> None:
+        del self._in_flight[cache_key]
+        if not task.cancelled() and (error := task.exception()):  # also marks the exception as retrieved
+            LOG.warning(f"Cannot load {self._data_kind} by key {list(cache_key)}: {error}")
+
+    async def _load(
+        self,
+        cache_key: CacheKey,
+        loader: typing.Callable[[], typing.Awaitable[V]],
+    ) -> V:
+        with await run_blocking(self._open_lock_file, cache_key) as lock_file:
+            with tracing.span("cache.lock"):
+                # waits for the loader of another worker, so it is not limited by the executor timeout
+                await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+            try:
+                period = self.expire if self.refresh is None else min(self.refresh, self.expire)
+                if entry := await self._fetch_entry(cache_key, datetime.now() - timedelta(seconds=period)):
+                    if entry[1]:
+                        LOG.debug(f"Cached {self._data_kind} loaded by another worker (amount={len(entry[1])})")
+                        return typing.cast(V, entry[1])
+                data = await loader()
+                changed, deleted = await self._update(cache_key, data)
+                if changed or deleted:
+                    LOG.debug(f"Cache {self._data_kind} updated (changed={changed}, deleted={deleted})")
+                return data
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lock_file_path(self, key: typing.Iterable[str]) -> Path:
+        digest = hashlib.sha256(json.dumps(list(normalize_key(key))).encode()).hexdigest()[:32]
+        lock_path = self._storage.file_path.parent / "locks" / f"{self._storage.file_path.stem}-{digest}.lock"
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        return lock_path
+
+    def _open_lock_file(self, key: typing.Iterable[str]) -> typing.TextIO:
+        return open(self._lock_file_path(key), "a")
+
+    def _get_entry(self, cache_key: CacheKey, fresh_timestamp: datetime) -> CacheEntry | None:
+        if entry := self._get_memory_entry(cache_key, fresh_timestamp):
+            return entry
+        return self._accept_stored_entry(cache_key, self._storage.get(cache_key), fresh_timestamp)
+
+    async def _fetch_entry(self, cache_key: CacheKey, fresh_timestamp: datetime) -> CacheEntry | None:
+        if entry := self._get_memory_entry(cache_key, fresh_timestamp):
+            return entry
+        return self._accept_stored_entry(cache_key, await run_blocking(self._storage.get, cache_key), fresh_timestamp)
+
+    def _get_memory_entry(self, cache_key: CacheKey, fresh_timestamp: datetime) -> CacheEntry | None:
+        if (entry := self._data.get(cache_key)) and entry[0] >= fresh_timestamp:
+            return entry
+        return None
+
+    def _accept_stored_entry(
+        self, cache_key: CacheKey, entry: CacheEntry | None, fresh_timestamp: datetime
+    ) -> CacheEntry | None:
+        if entry and entry[0] >= fresh_timestamp:
+            LOG.debug(f"Load {self._data_kind} cache entry from {self._storage.file_path}: {cache_key}")
+            self._insert(cache_key, *entry)
+            return entry
+        return None
+
+    def _insert(self, key: typing.Iterable[str], timestamp: datetime, value: CacheValue) -> None:
+        cache_key = normalize_key(key)
+        self._data[cache_key] = (timestamp, value)
+        heapq.heappush(self._expiry, (timestamp, cache_key))
+        if len(self._expiry) > 2 * len(self._data) + 64:  # drop heap items of superseded entries
+            self._expiry = [(timestamp, key) for key, (timestamp, _) in self._data.items()]
+            heapq.heapify(self._expiry)
+
+    def _purge(self, fresh_timestamp: datetime) -> int:
+        deleted: int = 0
+        while self._expiry and self._expiry[0][0] < fresh_timestamp:
+            timestamp, cache_key = heapq.heappop(self._expiry)
+            if (entry := self._data.get(cache_key)) and entry[0] == timestamp:
+                del self._data[cache_key]  # otherwise the heap item was superseded by a newer insert
+                deleted += 1
+        return deleted
+
+    def _open_storage(self) -> CacheStorage:
+        storage_class, suffix = STORAGES[self._settings.base.cache_storage]
+        file_path = Path(
+            f"{self._settings.base.cache_dir}/cloud-gate-{self._data_provider}-{self._data_kind}.{suffix}"
+        ).expanduser()
+        LOG.debug(f"Open {self._settings.base.cache_storage} cache storage: {file_path}")
+        return storage_class(file_path)
 
 
 @lru_cache(maxsize=64)
@@ -1,4 +1,5 @@
 import os
+import typing
 from pathlib import Path
 from functools import lru_cache
 
@@ -10,7 +11,23 @@ DEFAULT_CONFIG_PATH = Path(os.path.expanduser("~/.swm/cloud-gate.yaml"))
 
 class BaseSection(BaseModel):
     cache_expire: int = 7200000
+    cache_expire_by_kind: dict[str, int] = Field({}, description="Expiration (seconds) overridden per data kind")
+    cache_refresh: int | None = Field(None, description="Age (seconds) after which entries are refreshed in background")
+    cache_refresh_by_kind: dict[str, int] = Field({}, description="Refresh age (seconds) overridden per data kind")
     cache_dir: Path = Field(..., description="Cache directory path (supports ~)")
+    cache_storage: typing.Literal["sqlite", "pickle"] = "sqlite"
+    fanout_concurrency: int = Field(8, description="Max number of concurrent requests when fetching details of items")
+    fanout_timeout: float = Field(60.0, description="Timeout (seconds) of fetching details of one item")
+    creation_timeout: float = Field(
+        300.0, description="Timeout (seconds) of waiting for the creation of one partition of a batch"
+    )
+    executor_threads: int = Field(4, description="Threads running blocking calls of one provider")
+    executor_threads_by_provider: dict[str, int] = Field(
+        {}, description="Threads overridden per provider, cache or metrics"
+    )
+    executor_timeout: float = Field(60.0, description="Timeout (seconds) of one blocking provider call")
+    slow_request_seconds: float | None = Field(30.0, description="Requests slower than that are logged with timeline")
+    server_timing: bool = Field(False, description="Add Server-Timing header with the request timeline summary")
 
 
 class AzureApiCredentials(BaseModel):
@@ -48,10 +65,17 @@ class Providers(BaseModel):
     azure: AzureProvider = AzureProvider()
 
 
+class AdminSection(BaseModel):
+    enabled: bool = Field(False, description="Serve the profiling endpoints under /admin")
+    token: str = Field("", description="Token expected in X-Admin-Token header, admin endpoints are refused without it")
+    max_profile_seconds: float = Field(60.0, description="Longest CPU profiling or memory tracing period (seconds)")
+
+
 class Settings(BaseModel):
     version: int = 1
     base: BaseSection = BaseSection(cache_dir=Path("~/.swm/cache"))
     providers: Providers = Providers()
+    admin: AdminSection = AdminSection()
 
 
 def load_config(path: str | Path) -> Settings:
@@ -2,10 +2,16 @@ import logging
 
 from fastapi import FastAPI
 
+from .metrics import METRICS
+from .routers import admin, executor, monitoring
 from .routers.azure import sizes as azure_sizes
 from .routers.azure import images as azure_images
+from .routers.azure import clients as azure_clients
+from .routers.azure import operations as azure_operations
 from .routers.azure import partitions as azure_partitions
+from .routers.azure import deployments as azure_deployments
 from .routers.openstack import sizes as openstack_sizes
+from .routers.openstack import client as openstack_client
 from .routers.openstack import images as openstack_images
 from .routers.openstack import partitions as openstack_partitions
 
@@ -13,6 +19,13 @@ LOGGER = logging.getLogger("swm")
 LOGGER.setLevel(logging.DEBUG)
 
 app = FastAPI(debug=True)
+app.middleware("http")(monitoring.measure_request)
+app.add_event_handler("startup", METRICS.start)
+app.add_event_handler("shutdown", azure_deployments.DEPLOYMENTS.close)
+app.add_event_handler("shutdown", azure_clients.CLIENT_POOL.close)
+app.add_event_handler("shutdown", openstack_client.CLIENT.close)
+app.add_event_handler("shutdown", executor.shutdown)
+app.add_event_handler("shutdown", METRICS.stop)
 
 app.include_router(openstack_partitions.ROUTER)
 app.include_router(openstack_images.ROUTER)
@@ -21,3 +34,7 @@ app.include_router(openstack_sizes.ROUTER)
 app.include_router(azure_partitions.ROUTER)
 app.include_router(azure_images.ROUTER)
 app.include_router(azure_sizes.ROUTER)
+app.include_router(azure_operations.ROUTER)
+
+app.include_router(monitoring.ROUTER)
+app.include_router(admin.ROUTER)
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import fcntl
+import typing
+import asyncio
+import logging
+import functools
+import threading
+import contextlib
+from pathlib import Path
+
+from swmcloudgate import config, tracing
+
+LOG = logging.getLogger("swm")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FLUSH_INTERVAL = 5  # seconds, metrics of other workers are at most that old
+ARCHIVE_FILE = "archive.json"  # counters and histograms of the exited workers
+
+HELP = {
+    "swm_http_requests_in_flight": ("gauge", "HTTP requests being served"),
+    "swm_http_request_duration_seconds": ("histogram", "HTTP request latency by route"),
+    "swm_upstream_calls_in_flight": ("gauge", "Calls of cloud provider APIs being made"),
+    "swm_upstream_call_duration_seconds": ("histogram", "Latency of cloud provider calls by connector method"),
+    "swm_cache_requests_total": ("counter", "Cache lookups by data kind and result (hit, stale, miss)"),
+    "swm_executor_queued_calls": ("gauge", "Blocking provider calls waiting for a thread"),
+    "swm_executor_running_calls": ("gauge", "Blocking provider calls being run"),
+    "swm_executor_wait_seconds_total": ("counter", "Time blocking provider calls waited for a thread"),
+    "swm_executor_calls_total": ("counter", "Finished blocking provider calls by outcome"),
+}
+
+Samples = dict[str, dict[str, typing.Any]]  # metric name -> serialized labels -> value or histogram buckets
+
+
+def _labels_key(labels: dict[str, str]) -> str:
+    return json.dumps(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """Counters, gauges and latency histograms of one worker.
+    Every worker writes its samples to a file in the metrics directory shared by the workers of the node,
+    the worker that serves /metrics sums the files up. Gauges of exited workers are dropped, while their
+    counters and histograms are folded into an archive file, so the totals do not go back after a restart.
+    """
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._counters: Samples = {}
+        self._gauges: Samples = {}
+        self._histograms: Samples = {}
+        self._collectors: list[typing.Callable[["MetricsRegistry"], None]] = []
+        self._flusher: asyncio.Task[None] | None = None
+
+    @property
+    def directory(self) -> Path:
+        if self._directory is None:
+            self._directory = Path(f"{config.get_settings().base.cache_dir}/metrics").expanduser()
+        self._directory.mkdir(parents=True, exist_ok=True)
+        return self._directory
+
+    def inc(self, name: str, labels: dict[str, str], value: float = 1.0) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            samples = self._counters.setdefault(name, {})
+            samples[key] = samples.get(key, 0.0) + value
+
+    def add(self, name: str, labels: dict[str, str], value: float) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            samples = self._gauges.setdefault(name, {})
+            samples[key] = samples.get(key, 0.0) + value
+
+    def set(self, name: str, labels: dict[str, str], value: float) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+    def set_total(self, name: str, labels: dict[str, str], value: float) -> None:
+        """Set the counter to a total counted elsewhere, like by an executor."""
+        with self._lock:
+            self._counters.setdefault(name, {})[_labels_key(labels)] = value
+
+    def add_collector(self, collector: typing.Callable[["MetricsRegistry"], None]) -> None:
+        """Register a function that updates samples of the state kept elsewhere before they are written."""
+        self._collectors.append(collector)
+
+    def observe(self, name: str, labels: dict[str, str], seconds: float) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            samples = self._histograms.setdefault(name, {})
+            histogram = samples.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[index] += 1
+                    break
+            else:
+                histogram[len(LATENCY_BUCKETS)] += 1  # above the last bound, counted in +Inf only
+            histogram[-1] += seconds
+
+    @contextlib.contextmanager
+    def track(self, duration: str, in_flight: str, labels: dict[str, str]) -> typing.Iterator[dict[str, str]]:
+        """Count the block in flight and observe its duration, the block can add labels, like the outcome."""
+        started = time.perf_counter()
+        extra: dict[str, str] = {}
+        self.add(in_flight, labels, 1)
+        try:
+            yield extra
+        finally:
+            self.add(in_flight, labels, -1)
+            self.observe(duration, labels | extra, time.perf_counter() - started)
+
+    def snapshot(self) -> dict[str, typing.Any]:
+        for collector in self._collectors:
+            collector(self)
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": json.loads(json.dumps(self._counters)),
+                "gauges": json.loads(json.dumps(self._gauges)),
+                "histograms": json.loads(json.dumps(self._histograms)),
+            }
+
+    def flush(self) -> None:
+        file_path = self.directory / f"{os.getpid()}.json"
+        temp_path = file_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self.snapshot()))
+        temp_path.replace(file_path)  # readers never see a partly written file
+
+    def collect(self) -> dict[str, typing.Any]:
+        """Return the samples of all workers of the node summed up."""
+        self.flush()
+        total: dict[str, typing.Any] = {"counters": {}, "gauges": {}, "histograms": {}}
+        with open(self.directory / "archive.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                archive_path = self.directory / ARCHIVE_FILE
+                archive = (archive_path.exists() and self._read(archive_path)) or {"counters": {}, "histograms": {}}
+                exited: list[Path] = []
+                for file_path in self.directory.glob("*.json"):
+                    if file_path.name == ARCHIVE_FILE or not (data := self._read(file_path)):
+                        continue
+                    if _is_running(data["pid"]):
+                        _merge(total, data)
+                    else:
+                        _merge(archive, {"counters": data["counters"], "histograms": data["histograms"]})
+                        exited.append(file_path)
+                if exited:
+                    LOG.debug(f"Archive metrics of {len(exited)} exited workers")
+                    temp_path = self.directory / f"{ARCHIVE_FILE}.tmp"
+                    temp_path.write_text(json.dumps(archive))
+                    temp_path.replace(self.directory / ARCHIVE_FILE)
+                    for file_path in exited:
+                        file_path.unlink(missing_ok=True)
+                _merge(total, archive)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return total
+
+    def render(self) -> str:
+        """Return the samples of all workers in Prometheus text exposition format."""
+        total = self.collect()
+        lines: list[str] = []
+        for kind in ["counters", "gauges", "histograms"]:
+            for name, samples in sorted(total[kind].items()):
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name][1]}")
+                    lines.append(f"# TYPE {name} {HELP[name][0]}")
+                for key, value in sorted(samples.items()):
+                    labels = dict(json.loads(key))
+                    if kind != "histograms":
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], value[:-1]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels | {'le': str(bound)})} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value[-1]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    async def start(self) -> None:
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+        self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                LOG.warning(f"Cannot write metrics: {e}")
+
+    def _read(self, file_path: Path) -> dict[str, typing.Any] | None:
+        try:
+            return json.loads(file_path.read_text())
+        except (OSError, ValueError) as e:
+            LOG.warning(f"Cannot read metrics from {file_path}: {e}")
+        return None
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(total: dict[str, typing.Any], data: dict[str, typing.Any]) -> None:
+    for kind, metrics in data.items():
+        if kind not in ["counters", "gauges", "histograms"]:
+            continue
+        for name, samples in metrics.items():
+            merged = total[kind].setdefault(name, {})
+            for key, value in samples.items():
+                if kind == "histograms":
+                    merged[key] = [a + b for a, b in zip(merged.get(key, [0] * len(value)), value)]
+                else:
+                    merged[key] = merged.get(key, 0.0) + value
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+
+def timed(provider: str) -> typing.Callable[[typing.Callable[..., typing.Any]], typing.Callable[..., typing.Any]]:
+    """Decorate a connector coroutine method to measure the latency of its calls by provider and method
+    and to add the calls to the timeline of the request.
+    """
+
+    def decorator(method: typing.Callable[..., typing.Any]) -> typing.Callable[..., typing.Any]:
+        labels = {"provider": provider, "method": method.__name__}
+        span_name = f"{provider}.{method.__name__}"
+
+        @functools.wraps(method)
+        async def wrapper(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+            with (
+                tracing.span(span_name),
+                METRICS.track("swm_upstream_call_duration_seconds", "swm_upstream_calls_in_flight", labels) as extra,
+            ):
+                extra["outcome"] = "error"
+                result = await method(*args, **kwargs)
+                extra["outcome"] = "ok"
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+METRICS = MetricsRegistry()
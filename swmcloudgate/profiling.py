@@ -0,0 +1,102 @@
+import os
+import sys
+import typing
+import asyncio
+import logging
+import threading
+import contextlib
+import tracemalloc
+from collections import Counter
+
+LOG = logging.getLogger("swm")
+SAMPLING_INTERVAL = 0.005  # seconds, about 200 samples per second
+MEMORY_TRACE_FRAMES = 16
+
+_BUSY = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+@contextlib.contextmanager
+def _exclusive(kind: str) -> typing.Iterator[None]:
+    if not _BUSY.acquire(blocking=False):
+        raise ProfilerBusyError(f"Worker {os.getpid()} is already being profiled")
+    LOG.info(f"Start {kind} profiling of worker {os.getpid()}")
+    try:
+        yield
+    finally:
+        _BUSY.release()
+        LOG.info(f"Stop {kind} profiling of worker {os.getpid()}")
+
+
+def _frame_name(frame: typing.Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(";", ",")
+
+
+def collapse(thread_name: str, frame: typing.Any) -> str:
+    """Return the stack of the frame in the collapsed format: thread;outermost frame;...;innermost frame."""
+    frames: list[str] = []
+    while frame is not None:
+        frames.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join([thread_name.replace(";", ","), *reversed(frames)])
+
+
+def _sample(stop: threading.Event, interval: float) -> Counter[str]:
+    samples: Counter[str] = Counter()
+    own_id = threading.get_ident()
+    while not stop.wait(interval):
+        names = {it.ident: it.name for it in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own_id:
+                samples[collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+    return samples
+
+
+async def profile_cpu(seconds: float, interval: float = SAMPLING_INTERVAL) -> str:
+    """Sample the stacks of all threads of the worker for the period.
+    The samples are taken by a separate thread, so no tracing hook slows down the event loop. The result
+    is a "stack count" line per distinct stack, that flamegraph.pl or speedscope can draw.
+    """
+    with _exclusive("CPU"):
+        stop = threading.Event()
+        sampler = threading.Thread(target=lambda: result.append(_sample(stop, interval)), name="swm-profiler")
+        result: list[Counter[str]] = []
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+    return "".join(f"{stack} {count}\n" for stack, count in result[0].most_common())
+
+
+async def trace_memory(seconds: float, limit: int) -> list[dict[str, typing.Any]]:
+    """Return the allocation sites whose memory grew the most while the worker ran for the period."""
+    with _exclusive("memory"):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    statistics = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    return [
+        {
+            "file": it.traceback[0].filename,
+            "line": it.traceback[0].lineno,
+            "size_diff": it.size_diff,
+            "size": it.size,
+            "count_diff": it.count_diff,
+            "count": it.count,
+        }
+        for it in statistics[:limit]
+    ]
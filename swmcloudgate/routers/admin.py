@@ -0,0 +1,59 @@
+import os
+import hmac
+import http.client
+
+from fastapi import Query, Header, Depends, APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from swmcloudgate import config, profiling
+
+EMPTY_HEADER = Header(None)
+PERIOD_QUERY = Query(10.0, gt=0, description="Profiling period (seconds), limited by admin.max_profile_seconds")
+INTERVAL_QUERY = Query(profiling.SAMPLING_INTERVAL, ge=0.001, le=1.0, description="Sampling interval (seconds)")
+LIMIT_QUERY = Query(20, gt=0, le=1000, description="Number of allocation sites to return")
+
+
+def check_access(x_admin_token: str = EMPTY_HEADER) -> config.AdminSection:
+    """Hide the admin endpoints unless they are enabled, and refuse requests without the configured token."""
+    settings = config.get_settings().admin
+    if not settings.enabled:
+        raise HTTPException(status_code=http.client.NOT_FOUND, detail="Not Found")
+    if not settings.token or not hmac.compare_digest((x_admin_token or "").encode(), settings.token.encode()):
+        raise HTTPException(status_code=http.client.FORBIDDEN, detail="Admin token is not valid")
+    return settings
+
+
+ROUTER = APIRouter()
+ADMIN_ACCESS = Depends(check_access)
+
+
+def _period(seconds: float, settings: config.AdminSection) -> float:
+    return min(seconds, settings.max_profile_seconds)
+
+
+@ROUTER.get("/admin/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = PERIOD_QUERY,
+    interval: float = INTERVAL_QUERY,
+    settings: config.AdminSection = ADMIN_ACCESS,
+):
+    """Profile the worker that serves the request and return the samples as collapsed stacks."""
+    try:
+        stacks = await profiling.profile_cpu(_period(seconds, settings), interval)
+    except profiling.ProfilerBusyError as e:
+        raise HTTPException(status_code=http.client.CONFLICT, detail=str(e)) from e
+    return PlainTextResponse(stacks, headers={"X-Worker-PID": str(os.getpid())})
+
+
+@ROUTER.get("/admin/memory/diff")
+async def diff_memory(
+    seconds: float = PERIOD_QUERY,
+    limit: int = LIMIT_QUERY,
+    settings: config.AdminSection = ADMIN_ACCESS,
+):
+    """Trace allocations of the worker that serves the request and return the sites that grew the most."""
+    try:
+        statistics = await profiling.trace_memory(_period(seconds, settings), limit)
+    except profiling.ProfilerBusyError as e:
+        raise HTTPException(status_code=http.client.CONFLICT, detail=str(e)) from e
+    return {"pid": os.getpid(), "statistics": statistics}
@@ -0,0 +1,179 @@
+import time
+import typing
+import asyncio
+import hashlib
+import logging
+import contextlib
+from collections import OrderedDict
+from dataclasses import field, dataclass
+
+from azure.identity.aio import CertificateCredential
+from azure.mgmt.compute.aio import ComputeManagementClient
+from azure.mgmt.commerce.aio import UsageManagementClient
+from azure.mgmt.resourcegraph.aio import ResourceGraphClient
+from azure.mgmt.resource.resources.aio import ResourceManagementClient
+from azure.mgmt.resource.subscriptions.aio import SubscriptionClient
+
+from swmcloudgate import tracing
+
+LOG = logging.getLogger("swm")
+ARM_SCOPE = "https://management.azure.com/.default"
+CLIENT_POOL_SIZE = 16
+TOKEN_REFRESH_MARGIN = 240  # seconds before expiration, a bit less than the SDK's own refresh offset
+TOKEN_REFRESH_RETRY_DELAY = 30
+EVICTED_CLIENTS_CLOSE_DELAY = 60  # let requests in flight finish with evicted clients
+
+
+@dataclass
+class AzureClients:
+    credential: CertificateCredential
+    compute_client: ComputeManagementClient
+    resource_client: ResourceManagementClient
+    commerce_client: UsageManagementClient
+    resource_graph_client: ResourceGraphClient
+    subscription: typing.Any
+    token_expires_on: int = 0
+    token_refresher: asyncio.Task[None] | None = field(default=None, repr=False)
+
+    async def close(self) -> None:
+        if self.token_refresher:
+            self.token_refresher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.token_refresher
+        for client in [
+            self.compute_client,
+            self.resource_client,
+            self.commerce_client,
+            self.resource_graph_client,
+            self.credential,
+        ]:
+            await client.close()
+
+
+def fingerprint(subscription_id: str, tenant_id: str, app_id: str, pem_data: bytes) -> str:
+    digest = hashlib.sha256()
+    for it in [subscription_id, tenant_id, app_id]:
+        digest.update(it.encode())
+        digest.update(b"\0")
+    digest.update(pem_data if isinstance(pem_data, bytes) else pem_data.encode())
+    return digest.hexdigest()
+
+
+class AzureClientPool:
+    """Pool of initialized Azure clients keyed by the credentials fingerprint.
+    Credential setup (PEM parsing, AAD token acquisition and subscription retrieval) is paid
+    once per credentials, least recently used clients are evicted and access tokens are
+    refreshed in background before they expire.
+    """
+
+    def __init__(self, max_size: int = CLIENT_POOL_SIZE) -> None:
+        self._max_size = max_size
+        self._clients: OrderedDict[str, AzureClients] = OrderedDict()
+        self._creating: dict[str, asyncio.Task[AzureClients]] = {}
+        self._evicted: dict[asyncio.Task[None], AzureClients] = {}
+        self._hits = 0
+        self._misses = 0
+        self._creation_seconds = 0.0
+
+    @property
+    def average_creation_seconds(self) -> float:
+        return self._creation_seconds / self._misses if self._misses else 0.0
+
+    async def get(self, subscription_id: str, tenant_id: str, app_id: str, pem_data: bytes) -> AzureClients:
+        with tracing.span("azure.credentials"):
+            return await self._get(subscription_id, tenant_id, app_id, pem_data)
+
+    async def _get(self, subscription_id: str, tenant_id: str, app_id: str, pem_data: bytes) -> AzureClients:
+        started = time.perf_counter()
+        key = fingerprint(subscription_id, tenant_id, app_id, pem_data)
+        if clients := self._clients.get(key):
+            self._clients.move_to_end(key)
+            self._hits += 1
+            LOG.debug(
+                f"Azure clients reused in {(time.perf_counter() - started) * 1000:.2f} ms "
+                f"(creation takes {self.average_creation_seconds * 1000:.2f} ms on average, "
+                f"hits={self._hits}, misses={self._misses})"
+            )
+            return clients
+
+        if not (task := self._creating.get(key)):
+            task = asyncio.create_task(self._create(key, subscription_id, tenant_id, app_id, pem_data))
+            self._creating[key] = task
+            task.add_done_callback(lambda _: self._creating.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def close(self) -> None:
+        for task in list(self._creating.values()):
+            task.cancel()
+        await asyncio.gather(*self._creating.values(), return_exceptions=True)
+        while self._evicted:
+            task, clients = self._evicted.popitem()
+            if task.cancel():
+                await clients.close()
+        while self._clients:
+            _, clients = self._clients.popitem()
+            await clients.close()
+
+    def _add(self, key: str, clients: AzureClients) -> None:
+        self._clients[key] = clients
+        clients.token_refresher = asyncio.create_task(self._refresh_token(clients))
+        while len(self._clients) > self._max_size:
+            _, evicted = self._clients.popitem(last=False)
+            LOG.debug(f"Evict Azure clients of subscription {evicted.subscription.subscription_id}")
+            task = asyncio.create_task(self._close_later(evicted))
+            self._evicted[task] = evicted
+            task.add_done_callback(lambda it: self._evicted.pop(it, None))
+
+    async def _close_later(self, clients: AzureClients) -> None:
+        await asyncio.sleep(EVICTED_CLIENTS_CLOSE_DELAY)
+        await clients.close()
+
+    async def _create(
+        self, key: str, subscription_id: str, tenant_id: str, app_id: str, pem_data: bytes
+    ) -> AzureClients:
+        """Create the clients and add them to the pool, even when the request that started it is cancelled meanwhile."""
+        started = time.perf_counter()
+        clients = await self._create_clients(subscription_id, tenant_id, app_id, pem_data)
+        elapsed = time.perf_counter() - started
+        self._misses += 1
+        self._creation_seconds += elapsed
+        LOG.debug(f"Azure clients created in {elapsed * 1000:.2f} ms")
+        self._add(key, clients)
+        return clients
+
+    async def _create_clients(self, subscription_id: str, tenant_id: str, app_id: str, pem_data: bytes) -> AzureClients:
+        credential = CertificateCredential(
+            tenant_id=tenant_id,
+            client_id=app_id,
+            certificate_data=pem_data,
+        )
+        try:
+            token = await credential.get_token(ARM_SCOPE)
+            async with SubscriptionClient(credential) as subscription_client:
+                subscription = await subscription_client.subscriptions.get(subscription_id)
+        except BaseException:
+            await credential.close()
+            raise
+        return AzureClients(
+            credential=credential,
+            compute_client=ComputeManagementClient(credential, subscription_id),
+            resource_client=ResourceManagementClient(credential, subscription_id),
+            commerce_client=UsageManagementClient(credential, subscription_id),
+            resource_graph_client=ResourceGraphClient(credential),
+            subscription=subscription,
+            token_expires_on=token.expires_on,
+        )
+
+    async def _refresh_token(self, clients: AzureClients) -> None:
+        while True:
+            delay = clients.token_expires_on - TOKEN_REFRESH_MARGIN - time.time()
+            await asyncio.sleep(max(delay, TOKEN_REFRESH_RETRY_DELAY))
+            try:
+                token = await clients.credential.get_token(ARM_SCOPE)
+                clients.token_expires_on = token.expires_on
+                LOG.debug(f"Azure access token refreshed, expires on {token.expires_on}")
+            except Exception as e:
+                LOG.warning(f"Cannot refresh Azure access token: {e}")
+
+
+CLIENT_POOL = AzureClientPool()
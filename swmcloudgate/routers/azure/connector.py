@@ -1,71 +1,67 @@
 import os
-import json
 import typing
+import asyncio
 import logging
+from datetime import datetime, timedelta
 
-import jinja2
-from azure.identity import CertificateCredential
-from azure.mgmt.compute import ComputeManagementClient
-from azure.mgmt.commerce import UsageManagementClient
-from azure.mgmt.resource import SubscriptionClient, ResourceManagementClient
 from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
 from azure.mgmt.compute.models import VirtualMachineSize, VirtualMachineImage
-from azure.mgmt.resource.resources.models import DeploymentMode, DeploymentExtended
-
-from swmcloudgate import cache
-
+from azure.mgmt.resource.resources.models import DeploymentMode
+
+from swmcloudgate import cache, config, metrics
+
+from . import resourcegraph
+from .. import fanout
+from .skus import SkuCatalog
+from .prices import PriceIndex
+from ..models import OperationInfo, AzurePartitionSpec
+from .clients import CLIENT_POOL, AzureClients
+from ..executor import provider_executor
+from ..templates import TEMPLATES
+from .deployments import DEPLOYMENTS
 from ..baseconnector import BaseConnector
 
 LOG = logging.getLogger("swm")
 TEMLPATE_FILE = "swmcloudgate/routers/azure/templates/partition.json"
 CLOUD_INIT_SCRIPT_FILE = "swmcloudgate/routers/azure/templates/cloud-init.sh"
 CLOUD_INIT_YAML = "swmcloudgate/routers/azure/templates/cloud-init.yaml"
+IMAGE_SKUS_CONCURRENCY = 8
+RESOURCE_GRAPH_LAG_SECONDS = 300  # gate operations recorded within that may be missing from Resource Graph yet
 
 
-class AzureConnector(BaseConnector):
-    def __init__(self) -> None:
-        self._compute_client = None
-        self._resource_client = None
-        self._commerce_client = None
-        self._subscription = None
-        self._subscription_id = None
-        super().__init__("azure")
-
-    def reinitialize(
-        self,
-        subscription_id: str,
-        tenant_id: str,
-        app_id: str,
-        pem_data: bytes,
-    ) -> None:
-        self._init_azure_clients(subscription_id, tenant_id, app_id, pem_data)
+def version_key(version: str) -> tuple[int, ...]:
+    return tuple(int(it) if it.isdigit() else -1 for it in version.split("."))
+
 
-    def _init_azure_clients(
+async def get_connector(subscription_id: str, tenant_id: str, app_id: str, pem_data: bytes) -> "AzureConnector":
+    """Return a connector bound to the credentials, its clients are taken from the shared pool."""
+    if os.getenv("SWM_TEST_CONFIG", None):
+        return AzureConnector(subscription_id)
+    if subscription_id and tenant_id and app_id and len(pem_data):
+        return AzureConnector(subscription_id, await CLIENT_POOL.get(subscription_id, tenant_id, app_id, pem_data))
+    msg = (
+        "Not enough parameters provided to initialize Azure connection:"
+        f"{subscription_id}, {tenant_id}, {app_id}, {len(pem_data)}"
+    )
+    raise Exception(msg)
+
+
+class AzureConnector(BaseConnector):
+    def __init__(
         self,
-        subscription_id: str,
-        tenant_id: str,
-        app_id: str,
-        pem_data: bytes,
+        subscription_id: str | None = None,
+        clients: AzureClients | None = None,
+        test_responses: dict[str, typing.Any] | None = None,
     ) -> None:
         self._subscription_id = subscription_id
-        if os.getenv("SWM_TEST_CONFIG", None):
-            return
-        if subscription_id and tenant_id and app_id and len(pem_data):
-            credential = CertificateCredential(
-                tenant_id=tenant_id,
-                client_id=app_id,
-                certificate_data=pem_data,
-            )
-            self._compute_client = ComputeManagementClient(credential, subscription_id)
-            self._resource_client = ResourceManagementClient(credential, subscription_id)
-            self._commerce_client = UsageManagementClient(credential, subscription_id)
-            self._subscription = SubscriptionClient(credential).subscriptions.get(subscription_id)
-        else:
-            msg = (
-                "Not enough parameters provided to initialize Azure connection:"
-                f"{subscription_id}, {tenant_id}, {app_id}, {len(pem_data)}"
-            )
-            raise Exception(msg)
+        self._compute_client = clients.compute_client if clients else None
+        self._resource_client = clients.resource_client if clients else None
+        self._commerce_client = clients.commerce_client if clients else None
+        self._resource_graph_client = clients.resource_graph_client if clients else None
+        self._subscription = clients.subscription if clients else None
+        self._sku_catalog = SkuCatalog(subscription_id or "", clients.compute_client) if clients else None
+        self._price_index = PriceIndex(clients.commerce_client) if clients else None
+        super().__init__("azure", test_responses)
 
     def _get_deployment_properties(
         self,
@@ -77,9 +73,10 @@ class AzureConnector(BaseConnector):
         user_pub_key: str,
         cloud_init_script: str,
         ports: str,
+        template: dict[str, typing.Any] | None = None,
     ) -> dict[str, dict[str, typing.Any]]:
-        with open(TEMLPATE_FILE) as template_file:
-            template = json.load(template_file)
+        if template is None:
+            template = self._get_deployment_template(ports)
         template_parameters = self._get_template_parameters(
             job_id,
             partition_name,
@@ -90,7 +87,6 @@ class AzureConnector(BaseConnector):
             cloud_init_script,
         )
         LOG.debug(f"Template parameters for job {job_id}: {template_parameters}")
-        self._append_security_rules(ports, template)
         return {
             "properties": {
                 "template": template,
@@ -99,6 +95,11 @@ class AzureConnector(BaseConnector):
             }
         }
 
+    def _get_deployment_template(self, ports: str) -> dict[str, typing.Any]:
+        template = TEMPLATES.load_json(TEMLPATE_FILE)
+        self._append_security_rules(ports, template)
+        return template
+
     def _append_security_rules(self, ports: str, template: dict[str, typing.Any]) -> None:
         for resource in template["resources"]:
             if resource["type"] == "Microsoft.Network/networkSecurityGroups":
@@ -134,10 +135,9 @@ class AzureConnector(BaseConnector):
         user_pub_key: str,
         cloud_init_script: str,
     ) -> dict[str, str]:
-        template_loader = jinja2.FileSystemLoader(searchpath="./")
-        template_env = jinja2.Environment(loader=template_loader, autoescape=False)  # nosec B701
-        template = template_env.get_template(CLOUD_INIT_YAML)
-        cloud_init_yaml: str = template.render(
+        cloud_init_yaml: str = TEMPLATES.render(
+            CLOUD_INIT_YAML,
+            autoescape=False,
             cloud_init_script=self._indent_lines(cloud_init_script, 6),
         )
         return {
@@ -150,8 +150,7 @@ class AzureConnector(BaseConnector):
         }
 
     def _read_template(self, template_path) -> str:
-        with open(template_path) as template_file:
-            return json.load(template_file)
+        return TEMPLATES.load_json(template_path)
 
     def _get_pem_data(self, cert_file_path: str, key_file_path: str) -> str:
         with open(cert_file_path, "rb") as file:
@@ -169,7 +168,8 @@ class AzureConnector(BaseConnector):
     def _get_deployment_name(self, partition_name: str) -> str:
         return f"{partition_name}-deployment"
 
-    def list_sizes(self, location: str) -> list[VirtualMachineSize]:
+    @metrics.timed("azure")
+    async def list_sizes(self, location: str) -> list[VirtualMachineSize]:
         if "sizes" in self._test_responses:
             node_sizes = []
             for it in self._test_responses["sizes"]:
@@ -183,87 +183,51 @@ class AzureConnector(BaseConnector):
                 node_sizes.append(vm_size)
             return node_sizes
 
-        if data := cache.data_cache("flavors", "azure").fetch_and_update([location]):
-            LOG.debug(f"Flavors are taken from cache (amount={len(data)})")
-            return data
+        return await cache.data_cache("flavors", "azure").fetch_or_load(
+            [location],
+            lambda: self._retrieve_sizes(location),
+        )
 
+    @metrics.timed("azure")
+    async def _retrieve_sizes(self, location: str) -> list[VirtualMachineSize]:
         size_map: dict[str, VirtualMachineSize] = {}
-        for size in self._compute_client.virtual_machine_sizes.list(location):
+        async for size in self._compute_client.virtual_machine_sizes.list(location):
             size.extra: dict[str, str] = {}
             size_map[size.name] = size
         LOG.debug(f"Retrieved {len(size_map)} flavors from Azure")
-        self._add_gpus(location, size_map)
-        result = self._add_prices(location, size_map)
-
-        changed, deleted = cache.data_cache("flavors", "azure").update([location], result)
-        if changed or deleted:
-            LOG.debug(f"Flavors cache updated (changed={changed}, deleted={deleted})")
-
-        return result
-
-    def _add_gpus(self, location: str, size_map: dict[str, VirtualMachineSize]) -> None:
-        LOG.debug("Retrieve GPU flavors information from Azure")
-        skus = self._compute_client.resource_skus.list()
-        for sku in skus:
-            if sku.resource_type.lower() != "virtualmachines":
-                continue
-            if sku.name not in size_map.keys():
-                continue
-            location_from_sku = sku.locations[0] if sku.locations else "Unknown"
-            if location != location_from_sku:
-                continue
-            if gpu_count := next((int(c.value) for c in sku.capabilities if c.name.lower() == "gpus"), 0):
-                size_map[sku.name].extra["gpus"] = gpu_count
-
-    def _add_prices(self, location: str, size_map: dict[str, VirtualMachineSize]) -> list[VirtualMachineSize]:
+        await self._add_gpus(location, size_map)
+        return await self._add_prices(location, size_map)
+
+    @metrics.timed("azure")
+    async def _add_gpus(self, location: str, size_map: dict[str, VirtualMachineSize]) -> None:
+        LOG.debug("Add GPU information to flavors")
+        sku_index = await self._sku_catalog.get_index(location)
+        for name, size in size_map.items():
+            if (sku := sku_index.get(name)) and sku.gpus:
+                size.extra["gpus"] = sku.gpus
+
+    @metrics.timed("azure")
+    async def _add_prices(self, location: str, size_map: dict[str, VirtualMachineSize]) -> list[VirtualMachineSize]:
         results: list[VirtualMachineSize] = []
 
         if self._subscription.subscription_policies.quota_id.lower().startswith("payasyougo"):
             offer_id = "0003P"
         else:
             raise Exception("For now only PayAsYouGo offers are supported")
-        filter_string = (
-            f"OfferDurableId eq 'MS-AZR-{offer_id}'"
-            "and Currency eq 'USD' and Locale eq 'en-US' and RegionInfo eq 'US'"
-        )
-        LOG.debug(f"Rates filter: {filter_string}")
-        meters = self._commerce_client.rate_card.get(filter_string).meters
-        LOG.debug(f"Retrieved {len(meters)} meters")
-
-        already_added = set()
-        duplication_counter = 1
-        for meter in meters:
-            if meter.meter_category != "Virtual Machines":
-                continue
-            if meter.meter_name.endswith("Low Priority"):
-                continue
-            parts = meter.meter_region.split(" ")
-            if len(parts) == 1:
-                location_from_meter = parts[0]
-            elif len(parts) >= 2:
-                location_from_meter = parts[1] + parts[0]
-            else:
-                continue
-            if len(parts) == 3:
-                location_from_meter += parts[2]
-            if location != location_from_meter.lower():
-                continue
-            for meter_name in meter.meter_name.split("/"):
-                size_name = f"Standard_{meter_name.replace(' ', '_')}"
-                if vm_size := size_map.get(size_name):
-                    vm_size.extra["price"] = meter.meter_rates["0"]
-                    vm_size.extra["description"] = meter.meter_sub_category
-                    if vm_size.name not in already_added:
-                        already_added.add(vm_size.name)
-                        results.append(vm_size)
-                    else:
-                        duplication_counter += 1
+        price_index = await self._price_index.get_index(offer_id)
+
+        for name, vm_size in size_map.items():
+            if price_info := price_index.get((location, name)):
+                vm_size.extra["price"] = price_info.price
+                vm_size.extra["description"] = price_info.description
+                results.append(vm_size)
         LOG.debug(f"Number of final flavors: {len(results)}")
         return results
 
-    def list_images(self, location: str, publisher: str, offer: str, skus: str) -> list[VirtualMachineImage]:
-        images: list[VirtualMachineImage] = []
+    @metrics.timed("azure")
+    async def list_images(self, location: str, publisher: str, offer: str, skus: str) -> list[VirtualMachineImage]:
         if "images" in self._test_responses:
+            images: list[VirtualMachineImage] = []
             for it in self._test_responses["images"]:
                 vm_image = VirtualMachineImage(
                     id=it["id"],
@@ -280,43 +244,47 @@ class AzureConnector(BaseConnector):
 
         LOG.debug(f"List images: location={location}, publisher={publisher}, offer={offer}, skus={skus}")
         cache_key = [location, publisher, offer, skus] if skus else [location, publisher, offer]
-        if data := cache.data_cache("vmimages", "azure").fetch_and_update(cache_key):
-            LOG.debug(f"VM images are taken from cache (amount={len(data)})")
-            return data
+        return await cache.data_cache("vmimages", "azure").fetch_or_load(
+            cache_key,
+            lambda: self._retrieve_images(location, publisher, offer, skus),
+        )
 
+    @metrics.timed("azure")
+    async def _retrieve_images(self, location: str, publisher: str, offer: str, skus: str) -> list[VirtualMachineImage]:
         if skus:
-            if azure_image := self._get_latest_sku_image(location, publisher, offer, skus):
-                images.append(azure_image)
+            sku_names = [skus]
         else:
-            azure_skus = self._compute_client.virtual_machine_images.list_skus(
+            azure_skus = await self._compute_client.virtual_machine_images.list_skus(
                 location=location,
                 publisher_name=publisher,
                 offer=offer,
             )
-            for sku in azure_skus:
-                if azure_image := self._get_latest_sku_image(location, publisher, offer, sku.name):
-                    images.append(azure_image)
+            sku_names = [sku.name for sku in azure_skus]
 
-        changed, deleted = cache.data_cache("vmimages", "azure").update(cache_key, images)
-        if changed or deleted:
-            LOG.debug(f"VM image cache updated (changed={changed}, deleted={deleted})")
+        semaphore = asyncio.Semaphore(IMAGE_SKUS_CONCURRENCY)
 
+        async def get_latest_sku_image(sku: str) -> VirtualMachineImage | None:
+            async with semaphore:
+                return await self._get_latest_sku_image(location, publisher, offer, sku)
+
+        images = [it for it in await asyncio.gather(*[get_latest_sku_image(sku) for sku in sku_names]) if it]
+        LOG.debug(f"Retrieved {len(images)} VM images from Azure")
         return images
 
-    def _get_latest_sku_image(self, location: str, publisher: str, offer: str, sku: str) -> VirtualMachineImage | None:
-        max_date_image: VirtualMachineImage | None = None
-        max_date = ""
-        for azure_image in self._compute_client.virtual_machine_images.list(
+    @metrics.timed("azure")
+    async def _get_latest_sku_image(
+        self, location: str, publisher: str, offer: str, sku: str
+    ) -> VirtualMachineImage | None:
+        azure_images = await self._compute_client.virtual_machine_images.list(
             location=location,
             publisher_name=publisher,
             offer=offer,
             skus=sku,
-        ):
-            if azure_image.name > max_date:
-                max_date_image = azure_image
-        if max_date_image:
-            max_date_image.extra: dict[str, str] = {"sku": sku, "publisher": publisher, "offer": offer}
-        return max_date_image
+        )
+        # ARM sorts the versions as text (1.9.9 after 1.10.1), so the latest one is picked here
+        if latest_image := max(azure_images, key=lambda it: version_key(it.name), default=None):
+            latest_image.extra: dict[str, str] = {"sku": sku, "publisher": publisher, "offer": offer}
+        return latest_image
 
     def _get_cloud_init_script(
         self,
@@ -331,10 +299,8 @@ class AzureConnector(BaseConnector):
         runtime_params: str,
         user_ssh_cert: str,
     ) -> str:
-        template_loader = jinja2.FileSystemLoader(searchpath="./")
-        template_env = jinja2.Environment(loader=template_loader, autoescape=True)
-        template = template_env.get_template(CLOUD_INIT_SCRIPT_FILE)
-        script: str = template.render(
+        script: str = TEMPLATES.render(
+            CLOUD_INIT_SCRIPT_FILE,
             job_id=job_id,
             swm_source=runtime_params.get("swm_source"),
             ssh_pub_key=user_ssh_cert,
@@ -348,9 +314,10 @@ class AzureConnector(BaseConnector):
         )
         return script
 
-    def get_resource_group(self, resource_group_name: str) -> typing.Dict[str, typing.Any]:
+    @metrics.timed("azure")
+    async def get_resource_group(self, resource_group_name: str) -> typing.Dict[str, typing.Any]:
         if "resource_groups" in self._test_responses:
-            for it in self.list_resource_groups():
+            for it in await self.list_resource_groups():
                 if it["name"] == resource_group_name:
                     return it
             return {}
@@ -358,29 +325,91 @@ class AzureConnector(BaseConnector):
         if not resource_group_name.startswith(prefix):
             return None
         try:
-            if resource_group := self._resource_client.resource_groups.get(resource_group_name):
-                return self._get_resource_group_info(resource_group.id, resource_group.name)
+            if resource_group := await self._resource_client.resource_groups.get(resource_group_name):
+                info = await self._get_resource_group_info(resource_group.id, resource_group.name)
+                deployments = self._resource_client.deployments
+                operation = await DEPLOYMENTS.confirm(self._subscription_id or "", resource_group_name, deployments)
+                if operation and operation.status != "succeeded":
+                    info["status"] = operation.status  # resources can look succeeded before the deployment ends
+                return info
         except ResourceNotFoundError:
             LOG.info(f"Resource group does not exist in Azure: {resource_group_name}")
         return None
 
-    def list_resource_groups(self) -> list[dict[str, typing.Any]]:
+    @metrics.timed("azure")
+    async def list_resource_groups(self) -> list[dict[str, typing.Any]]:
         if "resource_groups" in self._test_responses:
             resource_groups = []
             for it in self._test_responses["resource_groups"]:
                 resource_groups.append(it)
             return resource_groups
-        group_resources: list[dict[str, list[typing.Any]]] = []
-        if resource_groups := self._resource_client.resource_groups.list():
-            prefix = self._get_resource_prefix()
-            for resource_group in resource_groups:
-                if not resource_group.name.startswith(prefix):
-                    continue
-                if info := self._get_resource_group_info(resource_group.id, resource_group.name):
-                    group_resources.append(info)
-        return group_resources
-
-    def _get_resource_group_info(self, id: str, name: str) -> dict[str, list[typing.Any]]:
+        try:
+            resource_groups = await resourcegraph.list_resource_groups(
+                self._resource_graph_client,
+                self._subscription_id,
+                self._get_resource_prefix(),
+            )
+        except HttpResponseError as e:
+            LOG.warning(f"Cannot query Azure Resource Graph, fall back to listing resource groups one by one: {e}")
+            resource_groups = await self._list_resource_groups_by_arm()
+        return await self._merge_operations(resource_groups)
+
+    async def _merge_operations(self, resource_groups: list[dict[str, typing.Any]]) -> list[dict[str, typing.Any]]:
+        """Correct the listing by deployments and deletions started by the gate, the way get_resource_group does.
+        Resource Graph lags behind ARM, so a just created resource group can be missing from it
+        and a just deleted one can still be there.
+        """
+        subscription_id = self._subscription_id or ""
+        groups = {it["name"].lower(): it for it in resource_groups}
+        recent = datetime.now() - timedelta(seconds=RESOURCE_GRAPH_LAG_SECONDS)
+
+        async def merge(timestamp: datetime, operation: OperationInfo) -> None:
+            name = operation.resource_group_name
+            if operation.status == "deleting":
+                if name.lower() not in groups:
+                    return
+                if timestamp >= recent and not await self._resource_client.resource_groups.check_existence(name):
+                    del groups[name.lower()]
+                else:
+                    groups[name.lower()]["status"] = "deleting"
+                return
+            deployments = self._resource_client.deployments
+            if not (confirmed := await DEPLOYMENTS.confirm(subscription_id, name, deployments)):
+                return
+            if group := groups.get(name.lower()):
+                if confirmed.status != "succeeded":
+                    group["status"] = confirmed.status
+            elif confirmed.status != "succeeded" or timestamp >= recent:
+                groups[name.lower()] = {
+                    "id": f"/subscriptions/{subscription_id}/resourceGroups/{name}",
+                    "name": name,
+                    "resources": [],
+                    "status": confirmed.status,
+                }
+
+        await asyncio.gather(*[merge(*it) for it in await DEPLOYMENTS.records(subscription_id)])
+        return list(groups.values())
+
+    @metrics.timed("azure")
+    async def _list_resource_groups_by_arm(self) -> list[dict[str, typing.Any]]:
+        resource_groups: list[tuple[str, str]] = []
+        prefix = self._get_resource_prefix()
+        async for resource_group in self._resource_client.resource_groups.list():
+            if resource_group.name.startswith(prefix):
+                resource_groups.append((resource_group.id, resource_group.name))
+
+        settings = config.get_settings()
+        group_resources = await fanout.gather_bounded(
+            resource_groups,
+            lambda it: self._get_resource_group_info(*it),
+            lambda it, _: {"resources": [], "id": it[0], "name": it[1], "status": "unknown"},
+            settings.base.fanout_concurrency,
+            settings.base.fanout_timeout,
+        )
+        return [it for it in group_resources if it]
+
+    @metrics.timed("azure")
+    async def _get_resource_group_info(self, id: str, name: str) -> dict[str, list[typing.Any]]:
         resource_group_info: dict[str, list[typing.Any]] = {
             "resources": [],
             "id": id,
@@ -389,12 +418,12 @@ class AzureConnector(BaseConnector):
         if resources := self._resource_client.resources.list_by_resource_group(
             name, expand="properties,createdTime,changedTime"
         ):
-            for resource in resources:
+            async for resource in resources:
                 if resource.type in [
                     "Microsoft.Network/publicIPAddresses",
                     "Microsoft.Network/networkInterfaces",
                 ]:  # We need extended properties for those resources
-                    if extended_resource := self._resource_client.resources.get_by_id(
+                    if extended_resource := await self._resource_client.resources.get_by_id(
                         resource.id, api_version="2019-02-01"
                     ):
                         resource_group_info["resources"].append(extended_resource)
@@ -402,7 +431,8 @@ class AzureConnector(BaseConnector):
                 resource_group_info["resources"].append(resource)
         return resource_group_info
 
-    def create_deployment(
+    @metrics.timed("azure")
+    async def create_deployment(
         self,
         job_id: str,
         partition_name: str,
@@ -420,7 +450,8 @@ class AzureConnector(BaseConnector):
         location: str,
         ports: str,
         user_ssh_cert: str,
-    ) -> tuple[DeploymentExtended, str]:
+        template: dict[str, typing.Any] | None = None,
+    ) -> tuple[dict[str, typing.Any], str]:
         resource_group_name = self._get_resource_group_name(partition_name)
 
         if self._test_responses:
@@ -432,14 +463,16 @@ class AzureConnector(BaseConnector):
             LOG.debug(f"New partition added: {new_part}")
             return new_part, resource_group_name
 
-        resource_group_creation_result = self._resource_client.resource_groups.create_or_update(
+        resource_group_creation_result = await self._resource_client.resource_groups.create_or_update(
             resource_group_name, {"location": location}
         )
         LOG.info(f"Provisioned resource group with ID: {resource_group_creation_result.id}")
 
         runtime_params = self._get_runtime_params(runtime)
         container_registry = container_image.split("/")[0]
-        cloud_init_script: str = self._get_cloud_init_script(
+        executor = provider_executor("azure")
+        cloud_init_script: str = await executor.run(
+            self._get_cloud_init_script,
             job_id,
             container_image,
             container_registry,
@@ -453,7 +486,8 @@ class AzureConnector(BaseConnector):
         )
 
         deployment_name = self._get_deployment_name(partition_name)
-        deployment_properties = self._get_deployment_properties(
+        deployment_properties = await executor.run(
+            self._get_deployment_properties,
             job_id,
             partition_name,
             flavor_name,
@@ -462,9 +496,10 @@ class AzureConnector(BaseConnector):
             user_ssh_cert,
             cloud_init_script,
             ports,
+            template,
         )
         try:
-            deployment_async_operation = self._resource_client.deployments.begin_create_or_update(
+            deployment_async_operation = await self._resource_client.deployments.begin_create_or_update(
                 resource_group_name,
                 deployment_name,
                 deployment_properties,
@@ -474,19 +509,76 @@ class AzureConnector(BaseConnector):
             raise e
 
         LOG.info(f"Deploying resource group {resource_group_name}, deployment: {deployment_name}")
-        return deployment_async_operation.result(), resource_group_name
+        operation = await DEPLOYMENTS.track(
+            self._subscription_id or "", resource_group_name, deployment_name, deployment_async_operation
+        )
+        return {
+            "id": resource_group_creation_result.id,
+            "name": resource_group_name,
+            "resources": [],
+            "status": operation.status,
+        }, resource_group_name
+
+    @metrics.timed("azure")
+    async def create_deployments(
+        self,
+        specs: list[AzurePartitionSpec],
+        container_registry_username: str,
+        container_registry_password: str,
+        storage_account: str,
+        storage_key: str,
+        storage_container: str,
+        user_ssh_cert: str,
+    ) -> list[tuple[dict[str, typing.Any], str] | Exception]:
+        """Create deployments of many partitions concurrently, return per partition results or errors.
+        The ARM template is built once per distinct set of ports and shared by the deployments.
+        """
+        executor = provider_executor("azure")
+        templates = {
+            ports: await executor.run(self._get_deployment_template, ports) for ports in {it.ports for it in specs}
+        }
+        settings = config.get_settings()
+        return await fanout.gather_bounded(
+            specs,
+            lambda it: self.create_deployment(
+                it.jobid,
+                it.partname,
+                it.osversion,
+                it.containerimage,
+                container_registry_username,
+                container_registry_password,
+                storage_account,
+                storage_key,
+                storage_container,
+                it.flavorname,
+                it.username,
+                it.count,
+                it.runtime,
+                it.location,
+                it.ports,
+                user_ssh_cert,
+                templates[it.ports],
+            ),
+            lambda _, e: e,
+            settings.base.fanout_concurrency,
+            settings.base.creation_timeout,
+            shield=True,  # a cancelled creation would leave a half created partition behind
+        )
 
-    def delete_resource_group(self, resource_group_name: str) -> str | None:
+    @metrics.timed("azure")
+    async def delete_resource_group(self, resource_group_name: str) -> str | None:
         if "resource_groups" in self._test_responses:
-            for it in self.list_resource_groups():
+            for it in await self.list_resource_groups():
                 if it["name"] == resource_group_name:
                     return "Deletion started"
             return None
-        if self._resource_client.resource_groups.begin_delete(resource_group_name):
+        if await self._resource_client.resource_groups.begin_delete(resource_group_name):
+            await DEPLOYMENTS.track_deletion(self._subscription_id or "", resource_group_name)
             return "Deletion started"
         return None
 
-    def find_image(
+    @metrics.timed("azure")
+    async def find_image(
         self, location: str, publisher: str, offer: str, sku: str, version: str
     ) -> VirtualMachineImage | None:
         if "images" in self._test_responses:
@@ -509,7 +601,7 @@ class AzureConnector(BaseConnector):
                     vm_image.extra = {}
                     return vm_image
             return {}
-        if azure_image := self._compute_client.virtual_machine_images.get(
+        if azure_image := await self._compute_client.virtual_machine_images.get(
             location=location,
             publisher_name=publisher,
             offer=offer,
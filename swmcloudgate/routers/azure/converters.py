@@ -91,9 +91,10 @@ def convert_to_partition(data: dict[str, typing.Any], resource_group_name: str)
                     updating = True
                 elif provisioning_state == "deleting":
                     deleting = True
-        if resource.type == "Microsoft.Network/publicIPAddresses":
+        resource_type = resource.type.lower()  # Resource Graph returns lower case types
+        if resource_type == "microsoft.network/publicipaddresses":
             part.master_public_ip = resource.properties.get("ipAddress")
-        if resource.type == "Microsoft.Network/networkInterfaces":
+        if resource_type == "microsoft.network/networkinterfaces":
             if ip_conf := resource.properties.get("ipConfigurations"):
                 part.master_private_ip = ip_conf[0].get("properties", {}).get("privateIPAddress")
 
@@ -107,6 +108,8 @@ def convert_to_partition(data: dict[str, typing.Any], resource_group_name: str)
         part.status = "creating"
     elif succeeded:
         part.status = "succeeded"
+    if status := data.get("status"):  # known better than the resources, e.g. deployment is in progress
+        part.status = status
 
     return part
 
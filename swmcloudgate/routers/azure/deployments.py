@@ -0,0 +1,160 @@
+import typing
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+
+from swmcloudgate import cache, config
+
+from ..models import OperationInfo
+
+LOG = logging.getLogger("swm")
+OPERATION_KEEP_SECONDS = 3 * 3600  # also the age after which an unfinished deployment is considered abandoned
+OPERATION_CONFIRM_SECONDS = 60  # age after which the state of an unfinished deployment is read from ARM again
+ARM_STATUSES = {"succeeded": "succeeded", "failed": "failed", "canceled": "failed"}  # others are in progress
+
+OperationKey = tuple[str, str]
+
+
+class DeploymentRegistry:
+    """Registry of ARM deployments that are being waited for in background.
+    The state of deployments is kept in a storage shared by all workers of the node,
+    so any worker can report it, while the poller is awaited by the worker that started the deployment.
+    The worker can be restarted before the deployment ends, so the state of an unfinished deployment
+    that no poller of this worker awaits, or that was not updated for a while, is read from ARM.
+    Deletions of resource groups are recorded as well, so listings can account for them.
+    """
+
+    def __init__(self, settings: config.Settings | None = None) -> None:
+        self._settings = settings
+        self._storage: cache.CacheStorage | None = None
+        self._tasks: dict[OperationKey, asyncio.Task[None]] = {}
+
+    async def track(
+        self, subscription_id: str, resource_group_name: str, deployment_name: str, poller: typing.Any
+    ) -> OperationInfo:
+        now = datetime.now()
+        await cache.run_blocking(self._get_storage().purge, now - timedelta(seconds=OPERATION_KEEP_SECONDS))
+        operation = OperationInfo(
+            resource_group_name=resource_group_name,
+            deployment_name=deployment_name,
+            status="creating",
+            started=now,
+        )
+        key = (subscription_id, resource_group_name)
+        await self._save(key, operation)
+        task = asyncio.create_task(self._wait(key, operation, poller))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return operation
+
+    async def track_deletion(self, subscription_id: str, resource_group_name: str) -> None:
+        now = datetime.now()
+        await cache.run_blocking(self._get_storage().purge, now - timedelta(seconds=OPERATION_KEEP_SECONDS))
+        operation = OperationInfo(
+            resource_group_name=resource_group_name, deployment_name="", status="deleting", started=now
+        )
+        await self._save((subscription_id, resource_group_name), operation)
+
+    async def get(self, subscription_id: str, resource_group_name: str) -> OperationInfo | None:
+        if record := await self._get_record((subscription_id, resource_group_name)):
+            return self._with_elapsed(record[1])
+        return None
+
+    async def confirm(
+        self, subscription_id: str, resource_group_name: str, deployments: typing.Any
+    ) -> OperationInfo | None:
+        """Return the state of the deployment, read from ARM with the deployments client when the record is in doubt."""
+        key = (subscription_id, resource_group_name)
+        if not (record := await self._get_record(key)):
+            return None
+        timestamp, operation = record
+        confirmed = key in self._tasks and timestamp >= datetime.now() - timedelta(seconds=OPERATION_CONFIRM_SECONDS)
+        if operation.status == "creating" and not confirmed:
+            operation = await self._read_state(key, operation, deployments)
+        return self._with_elapsed(operation)
+
+    async def records(self, subscription_id: str) -> list[tuple[datetime, OperationInfo]]:
+        """Return operations of the subscription with the time their records were last updated."""
+        return [
+            (timestamp, typing.cast(OperationInfo, value[0]))
+            for key, (timestamp, value) in await cache.run_blocking(self._get_storage().items)
+            if key[:1] == (subscription_id,) and len(key) == 2 and self._is_kept(timestamp)
+        ]
+
+    async def list(self, subscription_id: str, status: str | None = None) -> list[OperationInfo]:
+        operations = [self._with_elapsed(operation) for _, operation in await self.records(subscription_id)]
+        return sorted(
+            [it for it in operations if status is None or it.status == status],
+            key=lambda it: it.started,
+        )
+
+    async def close(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self._storage:
+            self._storage.close()
+            self._storage = None
+
+    async def _wait(self, key: OperationKey, operation: OperationInfo, poller: typing.Any) -> None:
+        try:
+            await poller.result()
+            operation.status = "succeeded"
+            LOG.info(f"Deployment {operation.deployment_name} succeeded")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            operation.status = "failed"
+            operation.error = str(e)
+            LOG.error(f"Deployment {operation.deployment_name} failed: {e}")
+        operation.finished = datetime.now()
+        await self._save(key, operation)
+
+    async def _read_state(self, key: OperationKey, operation: OperationInfo, deployments: typing.Any) -> OperationInfo:
+        operation = operation.copy()
+        try:
+            deployment = await deployments.get(operation.resource_group_name, operation.deployment_name)
+        except ResourceNotFoundError:
+            operation.status, operation.error = "failed", "Deployment not found"
+        except HttpResponseError as e:
+            LOG.warning(f"Cannot read state of deployment {operation.deployment_name} from ARM: {e}")
+            return operation
+        else:
+            state = deployment.properties.provisioning_state or ""
+            operation.status = ARM_STATUSES.get(state.lower(), "creating")
+            if operation.status == "failed" and (error := deployment.properties.error):
+                operation.error = error.message
+        LOG.debug(f"Deployment {operation.deployment_name} is {operation.status} according to ARM")
+        if operation.status != "creating":
+            operation.finished = datetime.now()
+        await self._save(key, operation)  # renews the record, so ARM is asked again after OPERATION_CONFIRM_SECONDS
+        return operation
+
+    async def _get_record(self, key: OperationKey) -> tuple[datetime, OperationInfo] | None:
+        if (entry := await cache.run_blocking(self._get_storage().get, key)) and self._is_kept(entry[0]):
+            return entry[0], typing.cast(OperationInfo, entry[1][0])
+        return None
+
+    async def _save(self, key: OperationKey, operation: OperationInfo) -> None:
+        await cache.run_blocking(self._get_storage().put, key, datetime.now(), [operation])
+
+    def _is_kept(self, timestamp: datetime) -> bool:
+        return timestamp >= datetime.now() - timedelta(seconds=OPERATION_KEEP_SECONDS)
+
+    def _with_elapsed(self, operation: OperationInfo) -> OperationInfo:
+        finished = operation.finished or datetime.now()
+        return operation.copy(update={"elapsed": (finished - operation.started).total_seconds()})
+
+    def _get_storage(self) -> cache.CacheStorage:
+        if self._storage is None:
+            settings = self._settings or config.get_settings()
+            storage_class, suffix = cache.STORAGES[settings.base.cache_storage]
+            file_path = Path(f"{settings.base.cache_dir}/cloud-gate-azure-deployments.{suffix}").expanduser()
+            self._storage = storage_class(file_path)
+        return self._storage
+
+
+DEPLOYMENTS = DeploymentRegistry()
@@ -7,11 +7,10 @@ from fastapi import Body, Header, APIRouter, HTTPException
 from swmcloudgate import config
 
 from ..models import HttpBody, ImageInfo
-from .connector import AzureConnector
+from .connector import get_connector
 from .converters import convert_to_image, extract_parameters
 
 LOG = logging.getLogger("swm")
-CONNECTOR = AzureConnector()
 EMPTY_HEADER = Header(None)
 EMPTY_BODY = Body(None)
 ROUTER = APIRouter()
@@ -45,8 +44,8 @@ async def get_image_info(
             LOG.warning(msg)
             return {"error": msg}
 
-        CONNECTOR.reinitialize(subscriptionid, tenant_id, app_id, body.pem_data)
-        if image := CONNECTOR.find_image(location, publisher, offer, skus, version):
+        connector = await get_connector(subscriptionid, tenant_id, app_id, body.pem_data)
+        if image := await connector.find_image(location, publisher, offer, skus, version):
             return convert_to_image(image)
     except Exception as e:
         LOG.error(traceback.format_exception(e))
@@ -101,10 +100,10 @@ async def list_images(
             LOG.warning(msg)
             return {"error": msg}
 
-        CONNECTOR.reinitialize(subscription_id, tenant_id, app_id, body.pem_data)
+        connector = await get_connector(subscription_id, tenant_id, app_id, body.pem_data)
         image_list: list[ImageInfo] = []
 
-        for image in CONNECTOR.list_images(location, publisher, offer, skus):
+        for image in await connector.list_images(location, publisher, offer, skus):
             image_list.append(convert_to_image(image))
 
     except Exception as e:
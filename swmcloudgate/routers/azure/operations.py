@@ -0,0 +1,49 @@
+import logging
+import traceback
+
+from fastapi import Body, APIRouter
+
+from swmcloudgate import config
+
+from ..models import HttpBody, OperationInfo
+from .connector import get_connector
+from .deployments import DEPLOYMENTS
+
+LOG = logging.getLogger("swm")
+ROUTER = APIRouter()
+EMPTY_BODY = Body(None)
+
+
+@ROUTER.get("/azure/operations")
+async def list_operations(
+    body: HttpBody = EMPTY_BODY,
+) -> dict[str, str | list[OperationInfo]]:
+    try:
+        settings = config.get_settings()
+
+        subscription_id = settings.providers.azure.api_credentials.subscription_id
+        tenant_id = settings.providers.azure.api_credentials.tenant_id
+        app_id = settings.providers.azure.api_credentials.app_id
+
+        if not subscription_id:
+            msg = "No subscription ID"
+            LOG.warning(msg)
+            return {"error": msg}
+        if not tenant_id:
+            msg = "No tenant ID"
+            LOG.warning(msg)
+            return {"error": msg}
+        if not app_id:
+            msg = "No app ID"
+            LOG.warning(msg)
+            return {"error": msg}
+        if body is None:
+            msg = "No credentials"
+            LOG.warning(msg)
+            return {"error": msg}
+
+        await get_connector(subscription_id, tenant_id, app_id, body.pem_data)  # authenticates the caller
+        return {"operations": await DEPLOYMENTS.list(subscription_id, status="creating")}
+    except Exception as e:
+        LOG.error(traceback.format_exception(e))
+        return {"error": traceback.format_exception(e)}
@@ -9,12 +9,11 @@ from azure.core.exceptions import HttpResponseError
 
 from swmcloudgate import config
 
-from ..models import HttpBody, PartInfo
-from .connector import AzureConnector
+from ..models import HttpBody, PartInfo, AzurePartitionsBatch
+from .connector import get_connector
 from .converters import convert_to_partition, extract_partition_from_deployment_id
 
 LOG = logging.getLogger("swm")
-CONNECTOR = AzureConnector()
 ROUTER = APIRouter()
 EMPTY_HEADER = Header(None)
 EMPTY_BODY = Body(None)
@@ -73,9 +72,9 @@ async def create_partition(
         storage_container = settings.providers.azure.storage.container
         user_ssh_cert = settings.providers.azure.user_ssh_cert
 
-        CONNECTOR.reinitialize(subscription_id, tenant_id, app_id, body.pem_data)
+        connector = await get_connector(subscription_id, tenant_id, app_id, body.pem_data)
 
-        result, resource_group_name = CONNECTOR.create_deployment(
+        result, resource_group_name = await connector.create_deployment(
             jobid,
             partname,
             osversion,
@@ -134,6 +133,64 @@ async def create_partition(
     return {"error": "Cannot create Azure deployment"}
 
 
+@ROUTER.post("/azure/partitions:batch")
+async def create_partitions(
+    body: AzurePartitionsBatch = EMPTY_BODY,
+):
+    try:
+        if body is None:
+            msg = "No partitions"
+            LOG.warning(msg)
+            return {"error": msg}
+        LOG.info(f"Create {len(body.partitions)} Azure partitions")
+        settings = config.get_settings()
+
+        subscription_id = settings.providers.azure.api_credentials.subscription_id
+        tenant_id = settings.providers.azure.api_credentials.tenant_id
+        app_id = settings.providers.azure.api_credentials.app_id
+
+        if not subscription_id:
+            msg = "No subscription ID"
+            LOG.warning(msg)
+            return {"error": msg}
+        if not tenant_id:
+            msg = "No tenant ID"
+            LOG.warning(msg)
+            return {"error": msg}
+        if not app_id:
+            msg = "No app ID"
+            LOG.warning(msg)
+            return {"error": msg}
+
+        connector = await get_connector(subscription_id, tenant_id, app_id, body.pem_data)
+
+        results: list[dict[str, typing.Any]] = []
+        for spec, result in zip(
+            body.partitions,
+            await connector.create_deployments(
+                body.partitions,
+                settings.providers.azure.container_registry.user,
+                settings.providers.azure.container_registry.password,
+                settings.providers.azure.storage.account,
+                settings.providers.azure.storage.key,
+                settings.providers.azure.storage.container,
+                settings.providers.azure.user_ssh_cert,
+            ),
+        ):
+            if isinstance(result, Exception):
+                results.append({"partname": spec.partname, "error": repr(result)})
+            else:
+                deployment, resource_group_name = result
+                results.append(
+                    {"partname": spec.partname, "partition": convert_to_partition(deployment, resource_group_name)}
+                )
+        return {"results": results}
+
+    except Exception as e:
+        LOG.error(traceback.format_exception(e))
+        return {"error": traceback.format_exception(e)}
+
+
 @ROUTER.get("/azure/partitions")
 async def list_partitions(
     body: HttpBody = EMPTY_BODY,
@@ -158,10 +215,10 @@ async def list_partitions(
             LOG.warning(msg)
             return {"error": msg}
 
-        CONNECTOR.reinitialize(subscription_id, tenant_id, app_id, body.pem_data)
+        connector = await get_connector(subscription_id, tenant_id, app_id, body.pem_data)
 
         partitions: typing.List[PartInfo] = []
-        for resource_group_info in CONNECTOR.list_resource_groups():
+        for resource_group_info in await connector.list_resource_groups():
             partitions.append(convert_to_partition(resource_group_info, resource_group_info["name"]))
 
         return {"partitions": partitions}
@@ -192,8 +249,8 @@ async def get_partition_by_id(
             LOG.warning(msg)
             return {"error": msg}
 
-        CONNECTOR.reinitialize(subscriptionid, tenant_id, app_id, body.pem_data)
-        if result := CONNECTOR.get_resource_group(partitionname):
+        connector = await get_connector(subscriptionid, tenant_id, app_id, body.pem_data)
+        if result := await connector.get_resource_group(partitionname):
             return convert_to_partition(result, partitionname)
 
     except Exception as e:
@@ -231,10 +288,10 @@ async def get_partition_by_name(
             LOG.warning(msg)
             return {"error": msg}
 
-        CONNECTOR.reinitialize(subscription_id, tenant_id, app_id, body.pem_data)
+        connector = await get_connector(subscription_id, tenant_id, app_id, body.pem_data)
 
         resource_group_name = partitionname + "-resource-group"
-        if result := CONNECTOR.get_resource_group(resource_group_name):
+        if result := await connector.get_resource_group(resource_group_name):
             return convert_to_partition(result, partitionname)
 
     except Exception as e:
@@ -267,8 +324,8 @@ async def delete_partition(
             LOG.warning(msg)
             return {"error": msg}
 
-        CONNECTOR.reinitialize(subscriptionid, tenant_id, app_id, body.pem_data)
-        if result := CONNECTOR.delete_resource_group(resourcegroup):
+        connector = await get_connector(subscriptionid, tenant_id, app_id, body.pem_data)
+        if result := await connector.delete_resource_group(resourcegroup):
             return {"result": result}
 
     except Exception as e:
@@ -0,0 +1,61 @@
+import typing
+import logging
+
+from pydantic import BaseModel
+
+from swmcloudgate import cache
+
+LOG = logging.getLogger("swm")
+
+PriceKey = tuple[str, str]  # (normalized region, VM size name)
+
+
+class PriceInfo(BaseModel):
+    price: float
+    description: str
+
+
+def normalize_region(meter_region: str) -> str:
+    """Convert rate card region like "US East 2" to location name like "eastus2"."""
+    parts = meter_region.split(" ")
+    if len(parts) == 1:
+        region = parts[0]
+    else:
+        region = parts[1] + parts[0] + "".join(parts[2:3])
+    return region.lower()
+
+
+class PriceIndex:
+    """Pay-as-you-go VM prices of all regions indexed by (normalized region, size name).
+    The rate card is downloaded and parsed once per offer and kept in the "prices" cache,
+    so prices of any location are joined to its flavors with one lookup per flavor.
+    """
+
+    def __init__(self, commerce_client: typing.Any, price_cache: cache.Cache | None = None) -> None:
+        self._commerce_client = commerce_client
+        self._cache = price_cache or cache.data_cache("prices", "azure")
+
+    async def get_index(self, offer_id: str) -> dict[PriceKey, PriceInfo]:
+        return await self._cache.fetch_or_load([offer_id], lambda: self._retrieve_index(offer_id))
+
+    async def _retrieve_index(self, offer_id: str) -> dict[PriceKey, PriceInfo]:
+        filter_string = (
+            f"OfferDurableId eq 'MS-AZR-{offer_id}'"
+            "and Currency eq 'USD' and Locale eq 'en-US' and RegionInfo eq 'US'"
+        )
+        LOG.debug(f"Rates filter: {filter_string}")
+        meters = (await self._commerce_client.rate_card.get(filter_string)).meters
+        LOG.debug(f"Retrieved {len(meters)} meters")
+
+        index: dict[PriceKey, PriceInfo] = {}
+        for meter in meters:
+            if meter.meter_category != "Virtual Machines":
+                continue
+            if meter.meter_name.endswith("Low Priority"):
+                continue
+            region = normalize_region(meter.meter_region)
+            price = PriceInfo(price=meter.meter_rates["0"], description=meter.meter_sub_category)
+            for meter_name in meter.meter_name.split("/"):
+                index[(region, f"Standard_{meter_name.replace(' ', '_')}")] = price
+        LOG.debug(f"Indexed {len(index)} VM prices")
+        return index
@@ -0,0 +1,66 @@
+import typing
+import logging
+from dataclasses import dataclass
+
+from azure.mgmt.resourcegraph.models import QueryRequest, ResultFormat, QueryRequestOptions
+
+LOG = logging.getLogger("swm")
+RESOURCE_GROUP_TYPE = "microsoft.resources/subscriptions/resourcegroups"
+RESOURCE_GROUPS_QUERY = """
+resourcecontainers
+| where type == '{resource_group_type}' and name startswith '{prefix}'
+| project id, name, type, resourceGroup = name, properties
+| union (
+    resources
+    | where resourceGroup startswith '{prefix}'
+    | project id, name, type, resourceGroup, properties
+)
+"""
+
+
+@dataclass
+class GraphResource:
+    """Resource row returned by Azure Resource Graph (types are lower case)."""
+
+    id: str
+    name: str
+    type: str
+    properties: dict[str, typing.Any]
+
+
+async def query(client: typing.Any, subscription_id: str, query_text: str) -> list[dict[str, typing.Any]]:
+    rows: list[dict[str, typing.Any]] = []
+    skip_token: str | None = None
+    while True:
+        request = QueryRequest(
+            subscriptions=[subscription_id],
+            query=query_text,
+            options=QueryRequestOptions(skip_token=skip_token, result_format=ResultFormat.OBJECT_ARRAY),
+        )
+        response = await client.resources(request)
+        rows.extend(response.data)
+        if not (skip_token := response.skip_token):
+            break
+    LOG.debug(f"Resource Graph returned {len(rows)} rows")
+    return rows
+
+
+async def list_resource_groups(client: typing.Any, subscription_id: str, prefix: str) -> list[dict[str, typing.Any]]:
+    """Return resource groups with the name prefix together with their resources in one query."""
+    rows = await query(
+        client,
+        subscription_id,
+        RESOURCE_GROUPS_QUERY.format(resource_group_type=RESOURCE_GROUP_TYPE, prefix=prefix),
+    )
+    groups: dict[str, dict[str, typing.Any]] = {}
+    for row in rows:
+        if row["type"].lower() == RESOURCE_GROUP_TYPE:
+            groups[row["name"].lower()] = {"resources": [], "id": row["id"], "name": row["name"]}
+    for row in rows:
+        if row["type"].lower() == RESOURCE_GROUP_TYPE:
+            continue
+        if group := groups.get(row["resourceGroup"].lower()):
+            group["resources"].append(
+                GraphResource(id=row["id"], name=row["name"], type=row["type"], properties=row["properties"] or {})
+            )
+    return list(groups.values())
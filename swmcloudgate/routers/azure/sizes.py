@@ -6,11 +6,10 @@ from fastapi import Body, Header, APIRouter
 from swmcloudgate import config
 
 from ..models import HttpBody, ImageInfo
-from .connector import AzureConnector
+from .connector import get_connector
 from .converters import convert_to_flavor, extract_parameters
 
 LOG = logging.getLogger("swm")
-CONNECTOR = AzureConnector()
 ROUTER = APIRouter()
 EMPTY_HEADER = Header(None)
 EMPTY_BODY = Body(None)
@@ -49,10 +48,10 @@ async def list_flavors(
             return {"error": msg}
 
         LOG.debug("Flavors not found in the cache => retrieve from Azure")
-        CONNECTOR.reinitialize(subscription_id, tenant_id, app_id, body.pem_data)
+        connector = await get_connector(subscription_id, tenant_id, app_id, body.pem_data)
         flavor_list: list[ImageInfo] = []
 
-        if sizes := CONNECTOR.list_sizes(location):
+        if sizes := await connector.list_sizes(location):
             for item in sizes:
                 flavor_list.append(convert_to_flavor(item))
     except Exception as e:
@@ -0,0 +1,62 @@
+import typing
+import logging
+
+from pydantic import BaseModel
+from azure.mgmt.compute.models import ResourceSku
+
+from swmcloudgate import cache
+
+LOG = logging.getLogger("swm")
+
+
+class SkuInfo(BaseModel):
+    name: str
+    location: str
+    gpus: int = 0
+    vcpus: int = 0
+    memory_gb: float = 0.0
+    accelerated_networking: bool = False
+    restrictions: list[str] = []
+
+
+class SkuCatalog:
+    """Capabilities of VM resource SKUs indexed by location and SKU name.
+    Only SKUs of the requested location are downloaded (the location filter is applied by Azure),
+    the per-location index is kept in the "skus" cache, so flavor enrichment is a dictionary lookup.
+    Restrictions of SKUs differ per subscription, so the index is cached per subscription too.
+    """
+
+    def __init__(self, subscription_id: str, compute_client: typing.Any, sku_cache: cache.Cache | None = None) -> None:
+        self._subscription_id = subscription_id
+        self._compute_client = compute_client
+        self._cache = sku_cache or cache.data_cache("skus", "azure")
+
+    async def get_index(self, location: str) -> dict[str, SkuInfo]:
+        return await self._cache.fetch_or_load(
+            [self._subscription_id, location], lambda: self._retrieve_index(location)
+        )
+
+    async def get(self, location: str, sku_name: str) -> SkuInfo | None:
+        return (await self.get_index(location)).get(sku_name)
+
+    async def _retrieve_index(self, location: str) -> dict[str, SkuInfo]:
+        LOG.debug(f"Retrieve VM resource SKUs of location {location} from Azure")
+        index: dict[str, SkuInfo] = {}
+        async for sku in self._compute_client.resource_skus.list(filter=f"location eq '{location}'"):
+            if sku.resource_type.lower() != "virtualmachines":
+                continue
+            index[sku.name] = self._sku_info(location, sku)
+        LOG.debug(f"Retrieved {len(index)} VM resource SKUs of location {location}")
+        return index
+
+    def _sku_info(self, location: str, sku: ResourceSku) -> SkuInfo:
+        capabilities = {it.name.lower(): it.value for it in sku.capabilities or []}
+        return SkuInfo(
+            name=sku.name,
+            location=location,
+            gpus=int(capabilities.get("gpus", 0)),
+            vcpus=int(capabilities.get("vcpus", 0)),
+            memory_gb=float(capabilities.get("memorygb", 0)),
+            accelerated_networking=capabilities.get("acceleratednetworkingenabled", "").lower() == "true",
+            restrictions=[f"{it.type}:{it.reason_code}" for it in sku.restrictions or []],
+        )
@@ -1,35 +1,36 @@
 import os
+import copy
 import json
 import typing
 import logging
+import functools
 
 LOG = logging.getLogger("swm")
 
 
+@functools.lru_cache(maxsize=None)
+def load_test_responses(file_path: str, provider_name: str) -> typing.Dict[str, typing.Any]:
+    """Parse the test responses of the provider once per process, connectors get copies of the result."""
+    with open(file_path, "r") as responses_file:
+        json_str = responses_file.read()
+        try:
+            json_objects = json.loads(json_str)
+            for json_obj in json_objects:
+                if json_obj.get("provider", None) == provider_name:
+                    return json_obj.get("requests", {})
+        except json.decoder.JSONDecodeError as e:
+            LOG.error(e)
+    return {}
+
+
 class BaseConnector:
-    def __init__(self, provider_name: str):
+    def __init__(self, provider_name: str, test_responses: typing.Dict[str, typing.Any] | None = None):
         self._provider_name = provider_name
-        self._test_responses = self._get_test_responses()
-
-    def find_image(self, image_id: str) -> typing.Union:
-        images = self.list_images()
-        found = [it for it in images if it.id == image_id]
-        if found:
-            return found[0]
-        return None
+        self._test_responses = self._get_test_responses() if test_responses is None else test_responses
 
-    def _get_test_responses(self) -> typing.Dict[str, str]:
-        file_path = os.getenv("SWM_TEST_CONFIG", None)
-        if file_path:
-            with open(file_path, "r") as responses_file:
-                json_str = responses_file.read()
-                try:
-                    json_objects = json.loads(json_str)
-                    for json_obj in json_objects:
-                        if json_obj.get("provider", None) == self._provider_name:
-                            return json_obj.get("requests", {})
-                except json.decoder.JSONDecodeError as e:
-                    LOG.error(e)
+    def _get_test_responses(self) -> typing.Dict[str, typing.Any]:
+        if file_path := os.getenv("SWM_TEST_CONFIG", None):
+            return copy.deepcopy(load_test_responses(file_path, self._provider_name))  # test stacks are deleted
         return {}
 
     def _get_runtime_params(self, runtime: str) -> dict[str, str]:
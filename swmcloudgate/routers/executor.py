@@ -0,0 +1,128 @@
+import time
+import typing
+import asyncio
+import logging
+import threading
+import contextvars
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+
+from swmcloudgate import config, metrics, tracing
+
+LOG = logging.getLogger("swm")
+
+R = typing.TypeVar("R")
+
+
+@dataclasses.dataclass
+class ExecutorStats:
+    name: str
+    size: int
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+
+class ProviderExecutor:
+    """Bounded thread pool for blocking calls of one provider, so they do not stall the event loop.
+    The cache and metrics storages get pools of their own the same way, under the names "cache" and "metrics".
+    Pools are sized per provider apart from the server concurrency limit, slow calls of one provider
+    cannot take the threads of another. A call that exceeds its timeout fails for the caller,
+    a running thread cannot be interrupted, it finishes the call in background.
+    """
+
+    def __init__(self, name: str, size: int, timeout: float) -> None:
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = ExecutorStats(name, size)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"provider-{name}")
+
+    @property
+    def stats(self) -> ExecutorStats:
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    async def run(self, func: typing.Callable[..., R], *args: typing.Any, timeout: float | None = None) -> R:
+        submitted = time.monotonic()
+        outcome: list[str] = []  # the first outcome of the call is counted, a timed out call finishes later
+
+        def call() -> R:
+            waited = time.monotonic() - submitted
+            tracing.annotate(wait_ms=round(waited * 1000, 3))
+            with self._lock:
+                self._stats.queued -= 1
+                self._stats.running += 1
+                self._stats.wait_seconds_total += waited
+                self._stats.wait_seconds_max = max(waited, self._stats.wait_seconds_max)
+            try:
+                result = func(*args)
+            except BaseException:
+                self._count(outcome, "failed")
+                raise
+            finally:
+                with self._lock:
+                    self._stats.running -= 1
+            self._count(outcome, "completed")
+            return result
+
+        name = getattr(func, "__name__", repr(func))
+        with self._lock:
+            self._stats.queued += 1
+        with tracing.span(f"executor.{self._stats.name}", call=name):
+            # the thread runs the call in a copy of the context, so its spans are added to the request timeline
+            future = self._executor.submit(contextvars.copy_context().run, call)
+            timeout = self._timeout if timeout is None else timeout
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except asyncio.TimeoutError:
+                self._count(outcome, "timed_out")
+                LOG.warning(f"Call {name} in {self._stats.name} executor exceeds {timeout} s")
+                raise
+            finally:
+                if future.cancelled():  # never started, so the thread did not take it off the queue
+                    with self._lock:
+                        self._stats.queued -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, outcome: list[str], counter: str) -> None:
+        with self._lock:
+            if not outcome:
+                outcome.append(counter)
+                setattr(self._stats, counter, getattr(self._stats, counter) + 1)
+
+
+EXECUTORS: dict[str, ProviderExecutor] = {}
+
+
+def provider_executor(provider: str) -> ProviderExecutor:
+    if not (executor := EXECUTORS.get(provider)):
+        settings = config.get_settings()
+        size = settings.base.executor_threads_by_provider.get(provider, settings.base.executor_threads)
+        LOG.debug(f"Start {provider} executor with {size} threads")
+        executor = EXECUTORS[provider] = ProviderExecutor(provider, size, settings.base.executor_timeout)
+    return executor
+
+
+def collect_metrics(registry: metrics.MetricsRegistry) -> None:
+    for name, executor in list(EXECUTORS.items()):
+        stats, labels = executor.stats, {"provider": name}
+        registry.set("swm_executor_queued_calls", labels, stats.queued)
+        registry.set("swm_executor_running_calls", labels, stats.running)
+        registry.set_total("swm_executor_wait_seconds_total", labels, stats.wait_seconds_total)
+        for outcome in ["completed", "failed", "timed_out"]:
+            registry.set_total("swm_executor_calls_total", labels | {"outcome": outcome}, getattr(stats, outcome))
+
+
+def shutdown() -> None:
+    while EXECUTORS:
+        _, executor = EXECUTORS.popitem()
+        executor.shutdown()
+
+
+metrics.METRICS.add_collector(collect_metrics)
@@ -0,0 +1,59 @@
+import typing
+import asyncio
+import logging
+from functools import partial
+
+LOG = logging.getLogger("swm")
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+
+BACKGROUND: set[asyncio.Task[typing.Any]] = set()  # keeps the shielded calls that outlived their timeout
+
+
+async def gather_bounded(
+    items: typing.Iterable[T],
+    fetch: typing.Callable[[T], typing.Awaitable[R]],
+    fallback: typing.Callable[[T, BaseException], R],
+    concurrency: int,
+    timeout: float,
+    shield: bool = False,
+) -> list[R]:
+    """Fetch details of all items concurrently, at most `concurrency` at a time.
+    An item that fails or is not fetched within `timeout` seconds is replaced by the fallback result,
+    so one slow item does not fail the whole listing. Results keep the order of the items.
+    With `shield`, a timed out call is not cancelled, but goes on in background, so calls that create
+    resources in several steps are not stopped midway.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(item: T) -> R:
+        if not shield:
+            return await asyncio.wait_for(fetch(item), timeout)
+        task = asyncio.ensure_future(fetch(item))
+        done, _ = await asyncio.wait([task], timeout=timeout)
+        if not done:
+            BACKGROUND.add(task)
+            task.add_done_callback(partial(_finished_in_background, item))
+            raise asyncio.TimeoutError(f"Not finished within {timeout} s, goes on in background")
+        return task.result()
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            try:
+                return await call(item)
+            except Exception as e:
+                LOG.warning(f"Cannot process {item}: {e!r}")
+                return fallback(item, e)
+
+    return list(await asyncio.gather(*[run(it) for it in items]))
+
+
+def _finished_in_background(item: typing.Any, task: asyncio.Task[typing.Any]) -> None:
+    BACKGROUND.discard(task)
+    if task.cancelled():
+        LOG.warning(f"Processing of {item} is cancelled in background")
+    elif error := task.exception():
+        LOG.warning(f"Cannot process {item} in background: {error!r}")
+    else:
+        LOG.info(f"Processing of {item} finished in background")
@@ -1,4 +1,5 @@
 import typing
+import datetime
 
 from pydantic import BaseModel
 
@@ -31,5 +32,48 @@ class Flavor(BaseModel):
     price: float
 
 
+class OperationInfo(BaseModel):
+    resource_group_name: str
+    deployment_name: str
+    status: str
+    started: datetime.datetime
+    finished: typing.Optional[datetime.datetime] = None
+    elapsed: typing.Optional[float] = None
+    error: typing.Optional[str] = None
+
+
 class HttpBody(BaseModel):
     pem_data: bytes
+
+
+class AzurePartitionSpec(BaseModel):
+    partname: str
+    jobid: str
+    osversion: str
+    containerimage: str
+    flavorname: str
+    username: str
+    count: str = "0"
+    runtime: str
+    location: str
+    ports: str
+
+
+class AzurePartitionsBatch(HttpBody):
+    partitions: typing.List[AzurePartitionSpec]
+
+
+class OpenStackPartitionSpec(BaseModel):
+    partname: str
+    jobid: str
+    vmimage: str
+    flavorname: str
+    keyname: str
+    count: str = "0"
+    runtime: str
+    ports: str
+    containerimage: str
+
+
+class OpenStackPartitionsBatch(BaseModel):
+    partitions: typing.List[OpenStackPartitionSpec]
@@ -0,0 +1,64 @@
+import json
+import time
+import uuid
+import typing
+import logging
+
+from fastapi import Request, APIRouter
+from fastapi.responses import Response
+from starlette.routing import Match
+
+from swmcloudgate import config, tracing
+from swmcloudgate.metrics import METRICS
+
+from .executor import provider_executor
+
+LOG = logging.getLogger("swm")
+ROUTER = APIRouter()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def route_path(request: Request) -> str:
+    """Return the path template of the matched route, so paths with ids do not make a label value each."""
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+async def measure_request(request: Request, call_next: typing.Callable[[Request], typing.Awaitable[Response]]):
+    """Measure the request latency and collect the timeline of the request under its id.
+    The timeline of a slow request is written to the slow requests log.
+    """
+    labels = {"method": request.method, "route": route_path(request)}
+    request_id = request.headers.get(tracing.REQUEST_ID_HEADER) or uuid.uuid4().hex
+    METRICS.add("swm_http_requests_in_flight", labels, 1)
+    started = time.perf_counter()
+    status = "500"
+    with tracing.trace(request_id, f"{request.method} {request.url.path}") as trace:
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            response.headers[tracing.REQUEST_ID_HEADER] = request_id
+            if config.get_settings().base.server_timing:
+                response.headers["Server-Timing"] = trace.server_timing()
+            return response
+        finally:
+            METRICS.add("swm_http_requests_in_flight", labels, -1)
+            elapsed = time.perf_counter() - started
+            METRICS.observe("swm_http_request_duration_seconds", labels | {"status": status}, elapsed)
+            log_slow_request(trace, status, elapsed)
+
+
+def log_slow_request(trace: tracing.Trace, status: str, elapsed: float) -> None:
+    threshold = config.get_settings().base.slow_request_seconds
+    if threshold is not None and elapsed >= threshold:
+        LOG.warning(f"Request {trace.request_id} ({trace.name}) took {elapsed:.3f} s, see the slow requests log")
+        tracing.SLOW_REQUESTS_LOG.info(json.dumps(trace.timeline() | {"status": status}, default=str))
+
+
+@ROUTER.get("/metrics")
+async def get_metrics() -> Response:
+    text = await provider_executor("metrics").run(METRICS.render)  # the files of other workers are read under a lock
+    return Response(text, media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,110 @@
+import http
+import typing
+import logging
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from pydantic import BaseModel
+
+from swmcloudgate import cache
+
+from .client import OpenStackClient
+from .keystone import OpenStackCredentials
+
+LOG = logging.getLogger("swm")
+IMAGE_INDEX_KEY = "index"  # entries of the bare dictionary format cached before are left to expire
+
+
+class GlanceImage(BaseModel):
+    id: str
+    name: str | None = None
+    status: str | None = None
+    visibility: str | None = None
+    size: int | None = None
+    min_disk: int | None = None
+    min_ram: int | None = None
+    created_at: str | None = None
+    updated_at: str | None = None
+
+
+class NovaFlavor(BaseModel):
+    id: str
+    name: str
+    ram: int
+    disk: int
+    vcpus: int
+    swap: int = 0
+    ephemeral_disk: int | None = None
+    extra: dict[str, str] = {}
+
+
+class ImageIndex(BaseModel):
+    images: dict[str, GlanceImage]
+    listed: datetime  # time of the last full listing the images were merged into
+
+
+def catalog_key(credentials: OpenStackCredentials) -> list[str]:
+    return [credentials.auth_url, credentials.tenant_name]
+
+
+class ImageCatalog:
+    """Glance images of a project indexed by image id and kept in the "images" cache,
+    so an image lookup is a dictionary hit. When the cached index is due for refresh, only images
+    updated since the latest known update are requested and merged into the index.
+    Glance v2 does not list deleted images, so the images are listed in full again once the last
+    full listing is older than the cache expiry, which drops the deleted ones.
+    """
+
+    def __init__(self, client: OpenStackClient, image_cache: cache.Cache | None = None) -> None:
+        self._client = client
+        self._image_cache = image_cache
+
+    @property
+    def _cache(self) -> cache.Cache:
+        return self._image_cache or cache.data_cache("images", "openstack")
+
+    async def get_index(self, credentials: OpenStackCredentials) -> dict[str, GlanceImage]:
+        [index] = await self._cache.fetch_or_load(self._key(credentials), lambda: self._load(credentials))
+        return index.images
+
+    async def get(self, credentials: OpenStackCredentials, image_id: str) -> GlanceImage | None:
+        if image := (await self.get_index(credentials)).get(image_id):
+            return image
+        # the image could be created after the index was refreshed
+        expect = [http.client.OK, http.client.NOT_FOUND]
+        if result := await self._client.request(credentials, "image", "GET", f"v2/images/{image_id}", None, expect):
+            return GlanceImage.parse_obj(result)
+        return None
+
+    def _key(self, credentials: OpenStackCredentials) -> list[str]:
+        return [*catalog_key(credentials), IMAGE_INDEX_KEY]
+
+    async def _load(self, credentials: OpenStackCredentials) -> list[ImageIndex]:
+        return [await self._retrieve_index(credentials)]
+
+    async def _retrieve_index(self, credentials: OpenStackCredentials) -> ImageIndex:
+        now = datetime.now()
+        cached = await self._cache.fetch(self._key(credentials))
+        previous = typing.cast(ImageIndex, cached[0]) if cached else None
+        since = max((it.updated_at or "" for it in previous.images.values()), default="") if previous else ""
+        if not previous or not since or previous.listed < now - timedelta(seconds=self._cache.expire):
+            LOG.debug(f"Retrieve all images of project {credentials.tenant_name} from Glance")
+            index = ImageIndex(images={it.id: it for it in await self._list(credentials, {})}, listed=now)
+        else:
+            LOG.debug(f"Retrieve images of project {credentials.tenant_name} updated since {since} from Glance")
+            index = ImageIndex(images=dict(previous.images), listed=previous.listed)
+            for it in await self._list(credentials, {"updated_at": f"gte:{since}"}):
+                index.images[it.id] = it
+        LOG.debug(f"Image index of project {credentials.tenant_name} has {len(index.images)} images")
+        return index
+
+    async def _list(self, credentials: OpenStackCredentials, query: dict[str, str]) -> list[GlanceImage]:
+        images: list[GlanceImage] = []
+        path: str | None = f"v2/images?{urlencode(query)}" if query else "v2/images"
+        while path:
+            result = await self._client.request(credentials, "image", "GET", path)
+            if result is None:
+                raise RuntimeError("Cannot list images")
+            images.extend(GlanceImage.parse_obj(it) for it in result.get("images", []))
+            path = result.get("next")  # Glance pages the images, the link is relative to the endpoint root
+        return images
@@ -0,0 +1,100 @@
+import http
+import typing
+import logging
+
+import aiohttp
+
+from swmcloudgate import tracing
+
+from .keystone import KeystoneSessionPool, OpenStackCredentials
+
+LOG = logging.getLogger("swm")
+CONNECTIONS_LIMIT = 100
+CONNECTIONS_LIMIT_PER_HOST = 32
+KEEPALIVE_TIMEOUT = 30
+REQUEST_TIMEOUT = 60
+SUCCESS_WITH_BODY = [http.client.OK, http.client.CREATED, http.client.ACCEPTED]
+
+
+class OpenStackClient:
+    """Asynchronous client of OpenStack services (Heat, Nova, Glance, ...).
+    All requests of the process go through one aiohttp session, so TCP connections are pooled and kept alive,
+    and the Keystone token of the credentials is shared by all services.
+    """
+
+    def __init__(self, sessions: KeystoneSessionPool | None = None) -> None:
+        self._sessions = sessions or KeystoneSessionPool()
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def sessions(self) -> KeystoneSessionPool:
+        return self._sessions
+
+    async def request(
+        self,
+        credentials: OpenStackCredentials,
+        service: str,
+        method: str,
+        path: str,
+        data: typing.Any = None,
+        expect: list[int] = SUCCESS_WITH_BODY,
+    ) -> dict[str, typing.Any] | None:
+        """Send a request to the service endpoint from the catalog and return the parsed body,
+        an empty dict for expected statuses without a body (e.g. 204 or 404 of a lookup) or None on failure.
+        """
+        with tracing.span(f"openstack.{service}", method=method, path=path.split("?")[0]):
+            return await self._request(credentials, service, method, path, data, expect)
+
+    async def _request(
+        self,
+        credentials: OpenStackCredentials,
+        service: str,
+        method: str,
+        path: str,
+        data: typing.Any,
+        expect: list[int],
+    ) -> dict[str, typing.Any] | None:
+        session = self._get_session()
+        LOG.debug(f"[REQUEST] {method} {service}/{path} {data if data is not None else ''}")
+        for retry in [False, True]:
+            token = await self._sessions.get_token(session, credentials)
+            url = f"{token.get_endpoint(service)}/{path.lstrip('/')}"
+            async with session.request(method, url, json=data, headers={"X-Auth-Token": token.token}) as response:
+                tracing.annotate(status=response.status)
+                if response.status == http.client.UNAUTHORIZED and not retry:
+                    LOG.info(f"Keystone token is rejected by {service}, retry after re-authentication")
+                    self._sessions.invalidate(credentials, token)
+                    continue
+                if response.status not in expect:
+                    LOG.error(f"Unexpected response status of {method} {url}: {response.status}")
+                    LOG.debug(f"[RESPONSE]: {await response.text()}")
+                    return None
+                if response.status not in SUCCESS_WITH_BODY:
+                    return {}
+                result: dict[str, typing.Any] = await response.json(content_type=None)
+                LOG.debug(f"[RESPONSE]: {result}")
+                return result
+        return None
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTIONS_LIMIT,
+                limit_per_host=CONNECTIONS_LIMIT_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ssl=False,  # OpenStack installations are usually served with self-signed certificates
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                headers={"Accept": "application/json"},
+            )
+        return self._session
+
+
+CLIENT = OpenStackClient()
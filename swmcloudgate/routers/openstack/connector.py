@@ -6,50 +6,56 @@ import datetime
 import traceback
 
 import yaml
-import jinja2
-import libcloud.security
 from libcloud.compute.base import NodeImage
-from libcloud.compute.types import Provider
-from libcloud.common.openstack import OpenStackResponse
-from libcloud.compute.providers import get_driver
 from libcloud.compute.drivers.openstack import OpenStackNodeSize
 
+from swmcloudgate import cache, config, metrics
+
+from .. import fanout
+from .client import CLIENT, OpenStackClient
+from .stacks import OUTPUTS_STATUS_SUFFIXES, IMMUTABLE_OUTPUTS_STATUS, StackIndex, StackOutputs
+from ..models import OpenStackPartitionSpec
+from .catalog import NovaFlavor, GlanceImage, ImageCatalog, catalog_key
+from .keystone import OpenStackCredentials
+from ..executor import provider_executor
+from ..registry import ConnectorRegistry
+from ..templates import TEMPLATES
 from ..baseconnector import BaseConnector
 
 LOG = logging.getLogger("swm")
 STACK_TEMLPATE_FILE = "swmcloudgate/routers/openstack/templates/heat_stack.yaml"
 CLOUD_INIT_SCRIPT_FILE = "swmcloudgate/routers/openstack/templates/cloud-init.sh"
-SERVICE_NAMES = {"compute": "nova", "orchestration": "heat", "rating": "cloudkitty"}
+AUTH_URL = "http://172.28.128.254:5000"
+TENANT_NAME = "demo1"
+DOMAIN_NAME = "Default"
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml parser is much faster when available
+
+
+def get_connector(username: str | None, password: str | None, auth_url: str = AUTH_URL) -> "OpenStackConnector":
+    """Return the connector bound to the credentials, it keeps the stacks index of the account between requests."""
+    if not username or not password:
+        return OpenStackConnector()
+    credentials = OpenStackCredentials(auth_url, username, password, TENANT_NAME, DOMAIN_NAME)
+    return CONNECTORS.get(credentials.fingerprint, lambda: OpenStackConnector(credentials))
 
 
 class OpenStackConnector(BaseConnector):
-    def __init__(self, username: str = None, password: str = None, service: str = None):
-        self._driver = None
-        self._init_driver(username, password, service)
-        super().__init__("openstack")
-
-    def reinitialize(self, username: str, password: str, service: str) -> None:
-        self._init_driver(username, password, service)
-
-    def _init_driver(self, username: str, password: str, service: str) -> None:
-        # See also https://libcloud.readthedocs.io/en/stable/compute/drivers/openstack.html
-        if username and password and service:
-            libcloud.security.VERIFY_SSL_CERT = False
-            OpenStack = get_driver(Provider.OPENSTACK)
-            url = "http://172.28.128.254:5000"
-            LOG.info(f"Connect to OpenStack: {url}")
-            self._driver = OpenStack(
-                username,
-                password,
-                ex_tenant_name="demo1",
-                ex_domain_name="Default",
-                ex_force_service_type=service,
-                ex_force_service_name=SERVICE_NAMES[service],
-                ex_force_auth_url=url,
-                ex_force_auth_version="3.x_password",
-            )
+    def __init__(
+        self,
+        credentials: OpenStackCredentials | None = None,
+        client: OpenStackClient | None = None,
+        test_responses: typing.Dict[str, typing.Any] | None = None,
+    ):
+        self._client = client or CLIENT
+        self._credentials = credentials
+        self._stack_index = StackIndex()
+        self._stack_outputs = StackOutputs()
+        self._image_catalog = ImageCatalog(self._client)
+        self._flavor_cache: cache.Cache | None = None
+        super().__init__("openstack", test_responses)
 
-    def list_sizes(self):
+    @metrics.timed("openstack")
+    async def list_sizes(self) -> list[OpenStackNodeSize] | None:
         if "sizes" in self._test_responses:
             node_sizes = []
             for it in self._test_responses["sizes"]:
@@ -64,36 +70,89 @@ class OpenStackConnector(BaseConnector):
                         vcpus=it["vcpus"],
                         ephemeral_disk=it["ephemeral_disk"],
                         swap=it["swap"],
-                        driver=self._driver,
+                        driver=None,
                     )
                 )
             return node_sizes
         try:
-            sizes = self._driver.list_sizes()
-            return sizes
+            credentials = self._get_credentials()
+            flavor_cache = self._flavor_cache or cache.data_cache("flavors", "openstack")
+            flavors = await flavor_cache.fetch_or_load(
+                catalog_key(credentials),
+                lambda: self._retrieve_sizes(credentials),
+            )
         except Exception as e:
             LOG.error(f"Cannot list flavors: {e}")
-        return None
+            return None
+        return [
+            OpenStackNodeSize(
+                id=it.id,
+                name=it.name,
+                bandwidth=None,
+                ram=it.ram,
+                disk=it.disk,
+                price=0.0,  # Nova does not price flavors
+                vcpus=it.vcpus,
+                ephemeral_disk=it.ephemeral_disk,
+                swap=it.swap,
+                extra=it.extra,
+                driver=None,
+            )
+            for it in flavors
+        ]
+
+    @metrics.timed("openstack")
+    async def _retrieve_sizes(self, credentials: OpenStackCredentials) -> list[NovaFlavor]:
+        if (result := await self._request(credentials, "compute", "GET", "flavors/detail")) is None:
+            raise RuntimeError("Cannot retrieve flavors from Nova")
+        LOG.debug(f"Retrieved {len(result.get('flavors', []))} flavors from OpenStack")
+        return [
+            NovaFlavor(
+                id=it["id"],
+                name=it["name"],
+                ram=it["ram"],
+                disk=it["disk"],
+                vcpus=it["vcpus"],
+                swap=it.get("swap") or 0,
+                ephemeral_disk=it.get("OS-FLV-EXT-DATA:ephemeral"),
+                extra=it.get("extra_specs", {}),
+            )
+            for it in result.get("flavors", [])
+        ]
 
-    def list_images(self):
+    @metrics.timed("openstack")
+    async def list_images(self) -> list[NodeImage]:
         if "images" in self._test_responses:
             node_images = []
             for it in self._test_responses["images"]:
                 node_images.append(
-                    NodeImage(
-                        id=it["id"], name=it["name"], extra={"status": it["extra"]["status"]}, driver=self._driver
-                    )
+                    NodeImage(id=it["id"], name=it["name"], extra={"status": it["extra"]["status"]}, driver=None)
                 )
             return node_images
-        return self._driver.list_images()
+        index = await self._image_catalog.get_index(self._get_credentials())
+        return [self._to_image(it) for it in index.values()]
 
-    def find_image(self, image_id: str):
-        images = self.list_images()
-        found = [it for it in images if it.id == image_id]
-        if found:
-            return found[0]
+    @metrics.timed("openstack")
+    async def find_image(self, image_id: str) -> NodeImage | None:
+        if "images" in self._test_responses:
+            found = [it for it in await self.list_images() if it.id == image_id]
+            return found[0] if found else None
+        if image := await self._image_catalog.get(self._get_credentials(), image_id):
+            return self._to_image(image)
         return None
 
+    def _to_image(self, image: GlanceImage) -> NodeImage:
+        extra = {
+            "status": image.status,
+            "visibility": image.visibility,
+            "size": image.size,
+            "min_disk": image.min_disk,
+            "min_ram": image.min_ram,
+            "created": image.created_at,
+            "updated": image.updated_at,
+        }
+        return NodeImage(id=image.id, name=image.name, extra=extra, driver=None)
+
     def _get_stack_template(
         self,
         stack_name: str,
@@ -106,10 +165,8 @@ class OpenStackConnector(BaseConnector):
         ports: str,
         container_image: str,
     ) -> str:
-        template_loader = jinja2.FileSystemLoader(searchpath="./")
-        template_env = jinja2.Environment(loader=template_loader, autoescape=True)
-        template = template_env.get_template(STACK_TEMLPATE_FILE)
-        yaml_str = template.render(
+        yaml_str = TEMPLATES.render(
+            STACK_TEMLPATE_FILE,
             stack_name=stack_name,
             image_name=image_name,
             flavor_name=flavor_name,
@@ -118,14 +175,12 @@ class OpenStackConnector(BaseConnector):
             ingres_tcp_ports=ports.split(","),
             init_script=self._get_cloud_init_script(job_id, runtime, container_image),
         )
-        return yaml.safe_load(yaml_str)
+        return yaml.load(yaml_str, Loader=YAML_LOADER)  # nosec B506
 
     def _get_cloud_init_script(self, job_id: str, runtime: str, contianer_image: str) -> str:
         runtime_params = self._get_runtime_params(runtime)
-        template_loader = jinja2.FileSystemLoader(searchpath="./")
-        template_env = jinja2.Environment(loader=template_loader, autoescape=True)
-        template = template_env.get_template(CLOUD_INIT_SCRIPT_FILE)
-        script: str = template.render(
+        script: str = TEMPLATES.render(
+            CLOUD_INIT_SCRIPT_FILE,
             job_id=job_id,
             swm_source=runtime_params.get("swm_source"),
             ssh_pub_key=runtime_params.get("ssh_pub_key"),
@@ -133,39 +188,66 @@ class OpenStackConnector(BaseConnector):
         )
         return script
 
-    def _request(
+    def _get_credentials(self) -> OpenStackCredentials:
+        if not self._credentials:
+            raise PermissionError("OpenStack credentials are not provided")
+        return self._credentials
+
+    async def _request(
         self,
-        action: str,
+        credentials: OpenStackCredentials,
+        service: str,
         method: str,
-        data: typing.Any,
-        expect: typing.List[int],
-    ) -> OpenStackResponse:
-        LOG.debug(f"[REQUEST] {method} {action} {data}")
-        response = None
-        try:
-            response = self._driver.connection.request(action=action, data=data, method=method)
-        except libcloud.common.exceptions.BaseHTTPError as e:
-            LOG.error(f"HTTP error: {e}")
-        if not response:
-            return None
-        result = response.parse_body()
-        status = response.status
-        if status not in expect:
-            LOG.info(f"Unexpected response status: {status}")
-            return None
-        LOG.debug(f"[RESPONSE]: {result}")
-        return result
+        path: str,
+        data: typing.Any = None,
+        expect: typing.List[int] | None = None,
+    ) -> typing.Dict[str, typing.Any] | None:
+        return await self._client.request(credentials, service, method, path, data, expect or [http.client.OK])
 
-    def list_stacks(self) -> typing.List[typing.Dict[str, typing.Any]]:
+    @metrics.timed("openstack")
+    async def list_stacks(self, with_outputs: bool = False) -> typing.List[typing.Dict[str, typing.Any]]:
         if "stacks" in self._test_responses:
             stacks = []
             for it in self._test_responses["stacks"]:
                 stacks.append(it)
             return stacks
-        result = self._request(action="stacks", method="GET", data={}, expect=[http.client.OK])
-        return result.get("stacks", []) if result else []
+        credentials = self._get_credentials()
+        result = await self._request(credentials, "orchestration", "GET", "stacks")
+        stacks = result.get("stacks", []) if result else []
+        self._stack_index.update(stacks)
+        if with_outputs:
+            return await self._add_outputs(credentials, stacks)
+        return stacks
 
-    def create_stack(
+    @metrics.timed("openstack")
+    async def _add_outputs(
+        self, credentials: OpenStackCredentials, stacks: typing.List[typing.Dict[str, typing.Any]]
+    ) -> typing.List[typing.Dict[str, typing.Any]]:
+        """Add outputs to the stack summaries, details of in progress and complete stacks are fetched concurrently."""
+
+        async def fetch(stack: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+            status = stack.get("stack_status", "")
+            if "id" not in stack or status.startswith("DELETE_") or not status.endswith(OUTPUTS_STATUS_SUFFIXES):
+                return stack
+            if (outputs := self._stack_outputs.get(stack["id"], status)) is None:
+                if not (details := await self.get_stack(stack["id"], credentials)):
+                    return stack
+                outputs = details.get("outputs", [])
+                if details.get("stack_status") == IMMUTABLE_OUTPUTS_STATUS:
+                    self._stack_outputs.add(stack["id"], outputs)
+            return {**stack, "outputs": outputs}
+
+        settings = config.get_settings()
+        return await fanout.gather_bounded(
+            stacks,
+            fetch,
+            lambda it, _: it,
+            settings.base.fanout_concurrency,
+            settings.base.fanout_timeout,
+        )
+
+    @metrics.timed("openstack")
+    async def create_stack(
         self,
         tenant_name: str,
         stack_name: str,
@@ -177,7 +259,8 @@ class OpenStackConnector(BaseConnector):
         runtime: str,
         ports: str,
         container_image: str,
-    ) -> str:
+        credentials: OpenStackCredentials | None = None,
+    ) -> typing.Dict[str, typing.Any]:
         if self._test_responses:
             id = str(uuid.uuid4())
             time = datetime.datetime.now().isoformat()
@@ -191,8 +274,10 @@ class OpenStackConnector(BaseConnector):
             }
             self._test_responses.setdefault("stacks", []).append(new_stack)
             return {"id": id, "links": []}
+        credentials = credentials or self._get_credentials()
         try:
-            template = self._get_stack_template(
+            template = await provider_executor("openstack").run(
+                self._get_stack_template,
                 stack_name,
                 image_name,
                 flavor_name,
@@ -207,23 +292,67 @@ class OpenStackConnector(BaseConnector):
             LOG.error(f"Cannot read stack template: {e}, {traceback.format_exc()}")
             return {}
         LOG.debug("Heat stack template has been loaded")
-        result = self._request(action="stacks", method="POST", data=template, expect=[http.client.CREATED])
-        return result.get("stack", {}) if result else {}
+        result = await self._request(credentials, "orchestration", "POST", "stacks", template, [http.client.CREATED])
+        stack = result.get("stack", {}) if result else {}
+        if "id" in stack:
+            self._stack_index.add(stack_name, stack["id"])
+        return stack
+
+    @metrics.timed("openstack")
+    async def create_stacks(
+        self, tenant_name: str, specs: list[OpenStackPartitionSpec]
+    ) -> list[typing.Dict[str, typing.Any] | Exception]:
+        """Create stacks of many partitions concurrently, return per partition results or errors."""
+        settings = config.get_settings()
+        credentials = None if self._test_responses else self._get_credentials()
+        return await fanout.gather_bounded(
+            specs,
+            lambda it: self.create_stack(
+                tenant_name,
+                it.partname,
+                it.vmimage,
+                it.flavorname,
+                it.keyname,
+                it.count,
+                it.jobid,
+                it.runtime,
+                it.ports,
+                it.containerimage,
+                credentials,
+            ),
+            lambda _, e: e,
+            settings.base.fanout_concurrency,
+            settings.base.creation_timeout,
+            shield=True,  # a cancelled creation would leave a half created partition behind
+        )
 
-    def get_stack(self, stack_id: str) -> typing.Dict[str, typing.Any]:
+    @metrics.timed("openstack")
+    async def get_stack(
+        self, stack_id: str, credentials: OpenStackCredentials | None = None
+    ) -> typing.Dict[str, typing.Any]:
         if "stacks" in self._test_responses:
-            for it in self.list_stacks():
+            for it in await self.list_stacks():
                 if it["id"] == stack_id:
                     return it
             return {}
-        stacks = self.list_stacks()  # libcloud (tested on 1.7.0) fails to parse output if stack does not exist
-        if list(filter(lambda stack: stack.get("id") == stack_id or stack.get("stack_name") == stack_id, stacks)):
-            stack_info = self._request(action=f"stacks/{stack_id}", method="GET", data={}, expect=[http.client.OK])
-            return stack_info.get("stack", None) if stack_info else {}
+        credentials = credentials or self._get_credentials()
+        paths = [f"stacks/{stack_id}"]
+        if indexed := self._stack_index.get(stack_id):
+            paths.insert(0, f"stacks/{indexed[0]}/{indexed[1]}")  # canonical URL, Heat redirects to it otherwise
+        for path in paths:
+            expect = [http.client.OK, http.client.NOT_FOUND]
+            if (stack_info := await self._request(credentials, "orchestration", "GET", path, None, expect)) and (
+                stack := stack_info.get("stack")
+            ):
+                self._stack_index.add(stack["stack_name"], stack["id"])
+                return stack
+            self._stack_index.discard(stack_id)
         return {}
 
-    def delete_stack(self, stack_id: str) -> str:
-        stack = self.get_stack(stack_id)
+    @metrics.timed("openstack")
+    async def delete_stack(self, stack_id: str) -> str:
+        credentials = None if self._test_responses else self._get_credentials()
+        stack = await self.get_stack(stack_id, credentials)
         if not stack:
             return f"Stack with id {stack_id} not found"
         if self._test_responses:
@@ -232,6 +361,10 @@ class OpenStackConnector(BaseConnector):
                     self._test_responses["stacks"].remove(it)
                     break
         else:
-            action = f'stacks/{stack["stack_name"]}/{stack_id}'
-            self._request(action=action, method="DELETE", data={}, expect=[http.client.NO_CONTENT])
+            path = f'stacks/{stack["stack_name"]}/{stack["id"]}'
+            await self._request(credentials, "orchestration", "DELETE", path, None, [http.client.NO_CONTENT])
+            self._stack_index.discard(stack["id"])
         return "Deletion started"
+
+
+CONNECTORS: ConnectorRegistry[OpenStackConnector] = ConnectorRegistry()
@@ -6,11 +6,10 @@ import traceback
 from fastapi import Header, APIRouter, HTTPException
 
 from ..models import ImageInfo
-from .connector import OpenStackConnector
+from .connector import get_connector
 from .converters import convert_to_image
 
 LOG = logging.getLogger("swm")
-CONNECTOR = OpenStackConnector()
 EMPTY_HEADER = Header(None)
 ROUTER = APIRouter()
 
@@ -18,8 +17,8 @@ ROUTER = APIRouter()
 @ROUTER.get("/openstack/images/{id}")
 async def get_image_info(id: str, username: str = EMPTY_HEADER, password: str = EMPTY_HEADER):
     try:
-        CONNECTOR.reinitialize(username, password, "compute")
-        if image := CONNECTOR.find_image(id):
+        connector = get_connector(username, password)
+        if image := await connector.find_image(id):
             return convert_to_image(image)
     except Exception as e:
         LOG.error(traceback.format_exception(e))
@@ -33,8 +32,8 @@ async def get_image_info(id: str, username: str = EMPTY_HEADER, password: str =
 async def list_images(username: str = EMPTY_HEADER, password: str = EMPTY_HEADER):
     image_list: typing.List[ImageInfo] = []
     try:
-        CONNECTOR.reinitialize(username, password, "compute")
-        for image in CONNECTOR.list_images():
+        connector = get_connector(username, password)
+        for image in await connector.list_images():
             image_list.append(convert_to_image(image))
     except Exception as e:
         LOG.error(traceback.format_exception(e))
@@ -0,0 +1,126 @@
+import time
+import typing
+import asyncio
+import hashlib
+import logging
+import datetime
+from collections import OrderedDict
+from dataclasses import field, dataclass
+
+import aiohttp
+
+from swmcloudgate import tracing
+
+LOG = logging.getLogger("swm")
+SERVICE_NAMES = {"compute": "nova", "orchestration": "heat", "image": "glance", "rating": "cloudkitty"}
+SESSION_POOL_SIZE = 16
+TOKEN_REFRESH_MARGIN = 300  # seconds before expiration when the token is not handed out anymore
+
+
+def expires_soon(expiration: datetime.datetime | None) -> bool:
+    return expiration is None or expiration.timestamp() - TOKEN_REFRESH_MARGIN < time.time()
+
+
+@dataclass(frozen=True)
+class OpenStackCredentials:
+    auth_url: str
+    username: str
+    password: str = field(repr=False)
+    tenant_name: str = "demo1"
+    domain_name: str = "Default"
+
+    @property
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for it in [self.auth_url, self.username, self.password, self.tenant_name, self.domain_name]:
+            digest.update(it.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+
+@dataclass
+class KeystoneToken:
+    token: str = field(repr=False)
+    expires: datetime.datetime
+    catalog: list[dict[str, typing.Any]] = field(repr=False)
+
+    def get_endpoint(self, service: str, interface: str = "public") -> str:
+        entries = sorted(
+            [it for it in self.catalog if it.get("type") == service],
+            key=lambda it: it.get("name") != SERVICE_NAMES.get(service),
+        )
+        for entry in entries:
+            for endpoint in entry.get("endpoints", []):
+                if endpoint.get("interface") == interface:
+                    return endpoint["url"].rstrip("/")
+        raise LookupError(f"No {interface} endpoint of OpenStack {service} service in the catalog")
+
+
+class KeystoneSessionPool:
+    """Pool of Keystone tokens keyed by the credentials fingerprint.
+    A scoped token and its service catalog are requested once per credentials and shared by the requests
+    to all services. Concurrent authentications with the same credentials are coalesced into one request.
+    The token is re-requested only when a service rejects it with 401 or when it is about to expire.
+    """
+
+    def __init__(self, max_size: int = SESSION_POOL_SIZE) -> None:
+        self._max_size = max_size
+        self._tokens: OrderedDict[str, KeystoneToken] = OrderedDict()
+        self._authenticating: dict[str, asyncio.Task[KeystoneToken]] = {}
+        self.authentications = 0
+
+    async def get_token(self, session: aiohttp.ClientSession, credentials: OpenStackCredentials) -> KeystoneToken:
+        key = credentials.fingerprint
+        if (token := self._tokens.get(key)) and not expires_soon(token.expires):
+            self._tokens.move_to_end(key)
+            return token
+        if not (task := self._authenticating.get(key)):
+            task = asyncio.create_task(self._authenticate(session, credentials))
+            self._authenticating[key] = task
+            task.add_done_callback(lambda _: self._authenticating.pop(key, None))
+        return await asyncio.shield(task)
+
+    def invalidate(self, credentials: OpenStackCredentials, token: KeystoneToken) -> None:
+        key = credentials.fingerprint
+        if self._tokens.get(key) is token:
+            LOG.debug(f"Keystone token of {credentials.username} evicted")
+            del self._tokens[key]
+
+    async def _authenticate(self, session: aiohttp.ClientSession, credentials: OpenStackCredentials) -> KeystoneToken:
+        body = {
+            "auth": {
+                "identity": {
+                    "methods": ["password"],
+                    "password": {
+                        "user": {
+                            "name": credentials.username,
+                            "domain": {"name": credentials.domain_name},
+                            "password": credentials.password,
+                        }
+                    },
+                },
+                "scope": {"project": {"name": credentials.tenant_name, "domain": {"name": credentials.domain_name}}},
+            }
+        }
+        LOG.info(f"Authenticate {credentials.username} in OpenStack: {credentials.auth_url}")
+        with tracing.span("openstack.keystone"):
+            return await self._request_token(session, credentials, body)
+
+    async def _request_token(
+        self, session: aiohttp.ClientSession, credentials: OpenStackCredentials, body: dict[str, typing.Any]
+    ) -> KeystoneToken:
+        async with session.post(f"{credentials.auth_url}/v3/auth/tokens", json=body) as response:
+            if response.status != 201:
+                raise PermissionError(f"Keystone authentication failed: {response.status} {await response.text()}")
+            data = await response.json()
+            token = KeystoneToken(
+                token=response.headers["X-Subject-Token"],
+                expires=datetime.datetime.fromisoformat(data["token"]["expires_at"].replace("Z", "+00:00")),
+                catalog=data["token"].get("catalog", []),
+            )
+        LOG.debug(f"Keystone token of {credentials.username} expires at {token.expires}")
+        self.authentications += 1
+        self._tokens[credentials.fingerprint] = token
+        while len(self._tokens) > self._max_size:
+            self._tokens.popitem(last=False)
+        return token
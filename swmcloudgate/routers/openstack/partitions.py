@@ -2,14 +2,14 @@ import http
 import typing
 import logging
 
-from fastapi import Header, APIRouter, HTTPException
+from fastapi import Body, Header, APIRouter, HTTPException
 
-from ..models import PartInfo
-from .connector import OpenStackConnector
+from ..models import PartInfo, OpenStackPartitionsBatch
+from .connector import get_connector
 from .converters import convert_to_partition
 
-CONNECTOR = OpenStackConnector()
 EMPTY_HEADER = Header(None)
+EMPTY_BODY = Body(None)
 LOG = logging.getLogger("swm")
 ROUTER = APIRouter()
 
@@ -29,8 +29,8 @@ async def create_partition(
     ports: str = EMPTY_HEADER,
     containerimage: str = EMPTY_HEADER,
 ):
-    CONNECTOR.reinitialize(username, password, "orchestration")
-    result = CONNECTOR.create_stack(
+    connector = get_connector(username, password)
+    result = await connector.create_stack(
         tenantname,
         partname,
         vmimage,
@@ -55,11 +55,35 @@ async def create_partition(
     return {"partition": result}
 
 
+@ROUTER.post("/openstack/partitions:batch")
+async def create_partitions(
+    username: str = EMPTY_HEADER,
+    password: str = EMPTY_HEADER,
+    tenantname: str = EMPTY_HEADER,
+    body: OpenStackPartitionsBatch = EMPTY_BODY,
+):
+    if body is None:
+        msg = "No partitions"
+        LOG.warning(msg)
+        return {"error": msg}
+    LOG.info(f"Create {len(body.partitions)} OpenStack partitions for tenant {tenantname}")
+    connector = get_connector(username, password)
+    results: list[dict[str, typing.Any]] = []
+    for spec, result in zip(body.partitions, await connector.create_stacks(tenantname, body.partitions)):
+        if isinstance(result, Exception):
+            results.append({"partname": spec.partname, "error": repr(result)})
+        elif not result:
+            results.append({"partname": spec.partname, "error": "Cannot create stack"})
+        else:
+            results.append({"partname": spec.partname, "partition": result})
+    return {"results": results}
+
+
 @ROUTER.get("/openstack/partitions")
-async def list_partitions(username: str = EMPTY_HEADER, password: str = EMPTY_HEADER):
-    CONNECTOR.reinitialize(username, password, "orchestration")
+async def list_partitions(username: str = EMPTY_HEADER, password: str = EMPTY_HEADER, outputs: bool = False):
+    connector = get_connector(username, password)
     partitions: typing.List[PartInfo] = []
-    for stack in CONNECTOR.list_stacks():
+    for stack in await connector.list_stacks(with_outputs=outputs):
         if "id" not in stack or "stack_name" not in stack:
             LOG.warn(f"Returned stack information is incomplete: {stack}")
             continue
@@ -69,8 +93,8 @@ async def list_partitions(username: str = EMPTY_HEADER, password: str = EMPTY_HE
 
 @ROUTER.get("/openstack/partitions/{id}")
 async def get_partition_info(id: str, username: str = EMPTY_HEADER, password: str = EMPTY_HEADER):
-    CONNECTOR.reinitialize(username, password, "orchestration")
-    if stack := CONNECTOR.get_stack(id):
+    connector = get_connector(username, password)
+    if stack := await connector.get_stack(id):
         return convert_to_partition(stack)
     raise HTTPException(
         status_code=http.client.NOT_FOUND,
@@ -80,6 +104,6 @@ async def get_partition_info(id: str, username: str = EMPTY_HEADER, password: st
 
 @ROUTER.delete("/openstack/partitions/{id}")
 async def delete_partition(id: str, username: str = EMPTY_HEADER, password: str = EMPTY_HEADER):
-    CONNECTOR.reinitialize(username, password, "orchestration")
-    result = CONNECTOR.delete_stack(id)
+    connector = get_connector(username, password)
+    result = await connector.delete_stack(id)
     return {"result": result}
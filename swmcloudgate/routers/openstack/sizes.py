@@ -3,19 +3,18 @@ import typing
 from fastapi import Header, APIRouter
 
 from ..models import ImageInfo
-from .connector import OpenStackConnector
+from .connector import get_connector
 from .converters import convert_to_flavor
 
-CONNECTOR = OpenStackConnector()
 EMPTY_HEADER = Header(None)
 ROUTER = APIRouter()
 
 
 @ROUTER.get("/openstack/flavors")
 async def list_flavors(username: str = EMPTY_HEADER, password: str = EMPTY_HEADER):
-    CONNECTOR.reinitialize(username, password, "compute")
+    connector = get_connector(username, password)
     flavor_list: typing.List[ImageInfo] = []
-    if sizes := CONNECTOR.list_sizes():
+    if sizes := await connector.list_sizes():
         for item in sizes:
             flavor_list.append(convert_to_flavor(item))
     return {"flavors": flavor_list}
@@ -0,0 +1,79 @@
+import time
+import typing
+import logging
+import threading
+
+LOG = logging.getLogger("swm")
+STACK_INDEX_TTL = 30  # seconds, stacks can be created or deleted by other workers or in Horizon
+STACK_OUTPUTS_MAX_SIZE = 4096
+IMMUTABLE_OUTPUTS_STATUS = "CREATE_COMPLETE"
+OUTPUTS_STATUS_SUFFIXES = ("_IN_PROGRESS", "_COMPLETE")  # stacks of other statuses have no outputs worth fetching
+
+
+class StackIndex:
+    """Short-lived index of stack names and ids, so a stack can be addressed
+    by its canonical URL stacks/{name}/{id} without the Heat redirect or listing all stacks.
+    """
+
+    def __init__(self, ttl: float = STACK_INDEX_TTL) -> None:
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[float, str, str]] = {}  # name or id -> (timestamp, name, id)
+
+    def get(self, name_or_id: str) -> tuple[str, str] | None:
+        with self._lock:
+            if entry := self._entries.get(name_or_id):
+                if entry[0] + self._ttl > time.monotonic():
+                    return entry[1], entry[2]
+                self._discard(entry[1], entry[2])
+        return None
+
+    def add(self, stack_name: str, stack_id: str) -> None:
+        entry = (time.monotonic(), stack_name, stack_id)
+        with self._lock:
+            self._entries[stack_name] = self._entries[stack_id] = entry
+
+    def update(self, stacks: typing.Iterable[dict[str, typing.Any]]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries = {}
+            for it in stacks:
+                if "id" in it and "stack_name" in it:
+                    entry = (now, it["stack_name"], it["id"])
+                    self._entries[it["stack_name"]] = self._entries[it["id"]] = entry
+
+    def discard(self, name_or_id: str) -> None:
+        with self._lock:
+            if entry := self._entries.get(name_or_id):
+                self._discard(entry[1], entry[2])
+            else:
+                self._entries.pop(name_or_id, None)
+
+    def _discard(self, stack_name: str, stack_id: str) -> None:
+        LOG.debug(f"Stack {stack_name} ({stack_id}) removed from index")
+        self._entries.pop(stack_name, None)
+        self._entries.pop(stack_id, None)
+
+
+class StackOutputs:
+    """Outputs of created stacks, they do not change until the stack is updated, so later polls reuse them.
+    An entry is used only while the listed stack status is still CREATE_COMPLETE.
+    """
+
+    def __init__(self, max_size: int = STACK_OUTPUTS_MAX_SIZE) -> None:
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: dict[str, list[dict[str, typing.Any]]] = {}  # stack id -> outputs
+
+    def get(self, stack_id: str, stack_status: str) -> list[dict[str, typing.Any]] | None:
+        with self._lock:
+            if stack_status == IMMUTABLE_OUTPUTS_STATUS:
+                return self._entries.get(stack_id)
+            self._entries.pop(stack_id, None)
+        return None
+
+    def add(self, stack_id: str, outputs: list[dict[str, typing.Any]]) -> None:
+        with self._lock:
+            if len(self._entries) >= self._max_size:
+                self._entries.pop(next(iter(self._entries)))  # the oldest entry
+            self._entries[stack_id] = outputs
@@ -0,0 +1,36 @@
+import typing
+import logging
+import threading
+from collections import OrderedDict
+
+LOG = logging.getLogger("swm")
+CONNECTOR_REGISTRY_SIZE = 64
+
+C = typing.TypeVar("C")
+
+
+class ConnectorRegistry(typing.Generic[C]):
+    """Connectors bound to credentials and keyed by the credentials fingerprint.
+    A connector never changes its credentials, so concurrent requests of different accounts cannot
+    swap each other's clients, while the state kept by a connector is reused by the requests of its account.
+    Least recently used connectors are dropped.
+    """
+
+    def __init__(self, max_size: int = CONNECTOR_REGISTRY_SIZE) -> None:
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._connectors: OrderedDict[str, C] = OrderedDict()
+
+    def get(self, key: str, create: typing.Callable[[], C]) -> C:
+        with self._lock:
+            if connector := self._connectors.get(key):
+                self._connectors.move_to_end(key)
+                return connector
+            connector = self._connectors[key] = create()
+            while len(self._connectors) > self._max_size:
+                self._connectors.popitem(last=False)
+                LOG.debug("Least recently used connector is dropped from the registry")
+            return connector
+
+    def __len__(self) -> int:
+        return len(self._connectors)
@@ -0,0 +1,59 @@
+import os
+import copy
+import json
+import typing
+import logging
+import threading
+
+import jinja2
+
+from swmcloudgate import tracing
+
+LOG = logging.getLogger("swm")
+
+
+class TemplateRegistry:
+    """Process-wide registry of templates used to create partitions.
+    Jinja templates are compiled once per environment and recompiled by jinja only when the file mtime changes.
+    JSON documents (e.g. ARM templates) are parsed once, reloaded when the file mtime changes,
+    and every caller gets its own deep copy of the pristine document, so it can be modified freely.
+    """
+
+    def __init__(self, search_path: str = "./") -> None:
+        self._search_path = search_path
+        self._lock = threading.Lock()
+        self._environments: dict[bool, jinja2.Environment] = {}
+        self._documents: dict[str, tuple[int, typing.Any]] = {}
+
+    def get_template(self, file_path: str, autoescape: bool = True) -> jinja2.Template:
+        return self._get_environment(autoescape).get_template(file_path)
+
+    def render(self, file_path: str, autoescape: bool = True, **kwargs: typing.Any) -> str:
+        with tracing.span("template.render", template=file_path):
+            return self.get_template(file_path, autoescape).render(**kwargs)
+
+    def load_json(self, file_path: str) -> typing.Any:
+        with tracing.span("template.load", template=file_path):
+            mtime_ns = os.stat(file_path).st_mtime_ns
+            entry = self._documents.get(file_path)
+            if entry is None or entry[0] != mtime_ns:
+                LOG.debug(f"Load template {file_path}")
+                with open(file_path) as template_file:
+                    entry = (mtime_ns, json.load(template_file))
+                self._documents[file_path] = entry
+            return copy.deepcopy(entry[1])
+
+    def _get_environment(self, autoescape: bool) -> jinja2.Environment:
+        if (environment := self._environments.get(autoescape)) is None:
+            with self._lock:
+                if (environment := self._environments.get(autoescape)) is None:
+                    environment = jinja2.Environment(  # nosec B701
+                        loader=jinja2.FileSystemLoader(searchpath=self._search_path),
+                        autoescape=autoescape,
+                        auto_reload=True,
+                    )
+                    self._environments[autoescape] = environment
+        return environment
+
+
+TEMPLATES = TemplateRegistry()
@@ -0,0 +1,128 @@
+import time
+import typing
+import logging
+import itertools
+import contextlib
+import contextvars
+from dataclasses import field, dataclass
+
+LOG = logging.getLogger("swm")
+SLOW_REQUESTS_LOG = logging.getLogger("swm.slow")
+REQUEST_ID_HEADER = "X-Request-ID"
+MAX_SPANS = 2000  # spans of a listing with many partitions beyond that are only counted
+SERVER_TIMING_ENTRIES = 16
+
+
+@dataclass
+class Span:
+    id: int
+    name: str
+    start: float  # seconds since the request start
+    parent: int | None = None
+    duration: float | None = None
+    attributes: dict[str, typing.Any] = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    """Timeline of one request: spans of connector methods, cache operations, template renders, etc.
+    Spans made in tasks and executor threads of the request are added to the trace of the request,
+    because they inherit the context in which they are started.
+    """
+
+    request_id: str
+    name: str
+    started: float = field(default_factory=time.perf_counter)
+    spans: list[Span] = field(default_factory=list)
+    dropped: int = 0
+    _ids: typing.Iterator[int] = field(default_factory=itertools.count, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def timeline(self) -> dict[str, typing.Any]:
+        return {
+            "request_id": self.request_id,
+            "request": self.name,
+            "duration_ms": round(self.elapsed * 1000, 3),
+            "spans": [
+                {
+                    "id": it.id,
+                    "parent": it.parent,
+                    "name": it.name,
+                    "start_ms": round(it.start * 1000, 3),
+                    "duration_ms": None if it.duration is None else round(it.duration * 1000, 3),
+                    **it.attributes,
+                }
+                for it in self.spans
+            ],
+            "dropped_spans": self.dropped,
+        }
+
+    def server_timing(self) -> str:
+        """Return the Server-Timing header value with the total time of the spans by name, the longest first."""
+        totals: dict[str, list[float]] = {}
+        for it in self.spans:
+            total = totals.setdefault(it.name, [0.0, 0])
+            total[0] += it.duration or 0.0
+            total[1] += 1
+        entries = sorted(totals.items(), key=lambda it: it[1][0], reverse=True)[:SERVER_TIMING_ENTRIES]
+        metrics = [f'{name};dur={seconds * 1000:.3f};desc="x{count}"' for name, (seconds, count) in entries]
+        return ", ".join([*metrics, f"total;dur={self.elapsed * 1000:.3f}"])
+
+
+_TRACE: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("swm_trace", default=None)
+_SPAN: contextvars.ContextVar[Span | None] = contextvars.ContextVar("swm_span", default=None)
+
+
+def current() -> Trace | None:
+    return _TRACE.get()
+
+
+@contextlib.contextmanager
+def trace(request_id: str, name: str) -> typing.Iterator[Trace]:
+    """Collect spans made while the block runs into a new trace."""
+    new_trace = Trace(request_id, name)
+    token, span_token = _TRACE.set(new_trace), _SPAN.set(None)
+    try:
+        yield new_trace
+    finally:
+        _SPAN.reset(span_token)
+        _TRACE.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: typing.Any) -> typing.Iterator[None]:
+    """Add a span of the block to the trace of the current request, outside of a request it does nothing."""
+    if (current_trace := _TRACE.get()) is None:
+        yield
+        return
+    if len(current_trace.spans) >= MAX_SPANS:
+        current_trace.dropped += 1
+        yield
+        return
+    parent = _SPAN.get()
+    item = Span(
+        next(current_trace._ids),
+        name,
+        time.perf_counter() - current_trace.started,
+        None if parent is None else parent.id,
+        attributes=attributes,
+    )
+    current_trace.spans.append(item)
+    token = _SPAN.set(item)
+    try:
+        yield
+    except BaseException as e:
+        item.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        item.duration = time.perf_counter() - current_trace.started - item.start
+        _SPAN.reset(token)
+
+
+def annotate(**attributes: typing.Any) -> None:
+    """Add attributes, like a cache lookup result, to the innermost span of the current request."""
+    if (item := _SPAN.get()) is not None:
+        item.attributes.update(attributes)
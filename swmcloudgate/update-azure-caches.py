@@ -32,6 +32,7 @@
 import os
 import ssl
 import socket
+import argparse
 from pathlib import Path
 
 import requests
@@ -67,8 +68,18 @@ def make_pem_data(cert_path: str, key_path: str) -> str:
     return joined_content
 
 
-def main() -> None:
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Warm up Azure flavors and images caches of cloud gate")
+    parser.add_argument(
+        "--locations",
+        default="eastus",
+        help="Comma separated Azure locations; the rate card is downloaded once and reused by all of them",
+    )
+    return parser.parse_args()
 
+
+def main() -> None:
+    args = parse_args()
     settings = config.get_settings()
 
     subscription_id = settings.providers.azure.api_credentials.subscription_id
@@ -81,8 +92,9 @@ def main() -> None:
     pem_data = make_pem_data(CERT, KEY)
 
     try:
-        list_flavors(subscription_id, tenant_id, app_id, pem_data)
-        list_images(subscription_id, tenant_id, app_id, publisher, offer, pem_data)
+        for location in args.locations.split(","):
+            list_flavors(subscription_id, tenant_id, app_id, location, pem_data)
+            list_images(subscription_id, tenant_id, app_id, location, publisher, offer, pem_data)
     except requests.exceptions.SSLError as e:
         print(f"\nERROR: {e}")
 
@@ -93,14 +105,14 @@ class TLS13Adapter(HTTPAdapter):
         self.poolmanager = PoolManager(*args, ssl_context=ctx, **kwargs)
 
 
-def list_flavors(subscription_id: str, tenant_id: str, app_id: str, pem_data: str) -> None:
+def list_flavors(subscription_id: str, tenant_id: str, app_id: str, location: str, pem_data: str) -> None:
     url = f"https://{HOST}:{PORT}/azure/flavors"
     headers = {
         "Accept": "application/json",
         "subscriptionid": subscription_id,
         "tenantid": tenant_id,
         "appid": app_id,
-        "extra": "location=eastus",
+        "extra": f"location={location}",
     }
     body = {"pem_data": pem_data}
 
@@ -116,13 +128,14 @@ def list_flavors(subscription_id: str, tenant_id: str, app_id: str, pem_data: st
 
     response.raise_for_status()
     json_data = response.json()
-    print(f"Cached {len(json_data.get('flavors', []))} VM flavors")
+    print(f"Cached {len(json_data.get('flavors', []))} VM flavors of {location}")
 
 
 def list_images(
     subscription_id: str,
     tenant_id: str,
     app_id: str,
+    location: str,
     publisher: str,
     offer: str,
     pem_data: str,
@@ -133,7 +146,7 @@ def list_images(
         "subscriptionid": subscription_id,
         "tenantid": tenant_id,
         "appid": app_id,
-        "extra": f"location=eastus;publisher={publisher};offer={offer}",
+        "extra": f"location={location};publisher={publisher};offer={offer}",
     }
     body = {"pem_data": pem_data}
 
@@ -148,7 +161,7 @@ def list_images(
     )
     response.raise_for_status()
     json_data = response.json()
-    print(f"Cached {len(json_data.get('images', []))} VM images")
+    print(f"Cached {len(json_data.get('images', []))} VM images of {location}")
 
 
 if __name__ == "__main__":
@@ -42,6 +42,7 @@ class TestAzureGate(asynctest.TestCase):
     async def tearDown(self):
         self.assertTrue(self.proc.is_alive())
         self.proc.terminate()
+        self.proc.join()  # release the port before the next test starts a server
 
     async def test_list_flavors(self):
         async with aiohttp.ClientSession(headers=self._default_headers) as session:
@@ -306,3 +307,52 @@ class TestAzureGate(asynctest.TestCase):
                     data = await resp.text()
         self.assertEqual(list(data.keys()), ["partition"])
         self.assertTrue(isinstance(data["partition"]["id"], str))
+
+    async def test_list_operations(self):
+        async with aiohttp.ClientSession(headers=self._default_headers) as session:
+            async with session.get(
+                url=f"http://{self._hostname}:{self._port}/azure/operations", json={"pem_data": "test"}
+            ) as resp:
+                try:
+                    data = await resp.json()
+                except aiohttp.client_exceptions.ContentTypeError:
+                    data = await resp.text()
+        self.assertEqual(list(data.keys()), ["operations"])
+        self.assertTrue(isinstance(data["operations"], list))
+
+    async def test_list_operations_without_credentials(self):
+        async with aiohttp.ClientSession(headers=self._default_headers) as session:
+            async with session.get(url=f"http://{self._hostname}:{self._port}/azure/operations") as resp:
+                data = await resp.json()
+        self.assertEqual(data, {"error": "No credentials"})
+
+    async def test_create_partitions_batch(self):
+        specs = [
+            {
+                "partname": f"part{it}",
+                "jobid": f"3579a076-9924-11ee-ba53-a3132f7ae2f{it}",
+                "osversion": "ubuntu-22.04",
+                "containerimage": "swmregistry.azurecr.io/jupyter/datascience-notebook:hub-3.1.1",
+                "flavorname": "Standard_B2s",
+                "username": "user",
+                "count": "0",
+                "runtime": "swm_source=ssh, ssh_pub_key=ssh-rsa AAAAB3NzaC1yc2EAAAABIwAAAQEA7GA",
+                "location": "eastus",
+                "ports": "10001,10022",
+            }
+            for it in range(3)
+        ]
+        async with aiohttp.ClientSession(headers=self._default_headers) as session:
+            async with session.post(
+                url=f"http://{self._hostname}:{self._port}/azure/partitions:batch",
+                json={"pem_data": "test", "partitions": specs},
+            ) as resp:
+                try:
+                    data = await resp.json()
+                except aiohttp.client_exceptions.ContentTypeError:
+                    data = await resp.text()
+        self.assertEqual([it["partname"] for it in data["results"]], ["part0", "part1", "part2"])
+        self.assertEqual(
+            [it["partition"]["name"] for it in data["results"]],
+            ["part0-resource-group", "part1-resource-group", "part2-resource-group"],
+        )
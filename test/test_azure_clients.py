@@ -0,0 +1,138 @@
+import os
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import asynctest
+
+from swmcloudgate.routers.azure import clients, connector
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeResourceGraphClient(FakeClient):
+    def __init__(self, subscription_id: str) -> None:
+        super().__init__()
+        self._subscription_id = subscription_id
+
+    async def resources(self, request) -> SimpleNamespace:
+        assert request.subscriptions == [self._subscription_id], "Query is sent with clients of another subscription"
+        await asyncio.sleep(random.uniform(0, 0.02))  # requests of other subscriptions run meanwhile
+        row = {
+            "id": f"/subscriptions/{self._subscription_id}/resourceGroups/swm-1",
+            "name": "swm-1",
+            "type": "Microsoft.Resources/subscriptions/resourceGroups",
+            "resourceGroup": "swm-1",
+            "properties": {},
+        }
+        return SimpleNamespace(data=[row], skip_token=None)
+
+
+class FakeClientPool(clients.AzureClientPool):
+    def __init__(self, max_size: int = clients.CLIENT_POOL_SIZE) -> None:
+        super().__init__(max_size)
+        self.created: list[str] = []
+
+    async def _create_clients(self, subscription_id, tenant_id, app_id, pem_data) -> clients.AzureClients:
+        self.created.append(subscription_id)
+        await asyncio.sleep(0.05)  # token acquisition and subscription retrieval
+        return clients.AzureClients(
+            credential=FakeClient(),
+            compute_client=FakeClient(),
+            resource_client=FakeClient(),
+            commerce_client=FakeClient(),
+            resource_graph_client=FakeResourceGraphClient(subscription_id),
+            subscription=SimpleNamespace(subscription_id=subscription_id),
+            token_expires_on=int(time.time()) + 3600,
+        )
+
+
+class TestAzureClientPool(asynctest.TestCase):
+    async def setUp(self):
+        self._pool = FakeClientPool(max_size=2)
+
+    async def tearDown(self):
+        await self._pool.close()
+
+    async def test_clients_reused(self):
+        first = await self._pool.get("sub1", "tenant", "app", b"pem")
+        second = await self._pool.get("sub1", "tenant", "app", b"pem")
+        self.assertIs(first, second)
+        self.assertEqual(self._pool.created, ["sub1"])
+        self.assertEqual((self._pool._hits, self._pool._misses), (1, 1))
+
+    async def test_clients_separated_by_credentials(self):
+        first = await self._pool.get("sub1", "tenant", "app", b"pem1")
+        second = await self._pool.get("sub1", "tenant", "app", b"pem2")
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self._pool.created), 2)
+
+    async def test_concurrent_creation_coalesced(self):
+        results = await asyncio.gather(*[self._pool.get("sub1", "tenant", "app", b"pem") for _ in range(10)])
+        self.assertEqual(self._pool.created, ["sub1"])
+        self.assertTrue(all(it is results[0] for it in results))
+
+    async def test_least_recently_used_evicted(self):
+        with asynctest.patch.object(clients, "EVICTED_CLIENTS_CLOSE_DELAY", 0):
+            first = await self._pool.get("sub1", "tenant", "app", b"pem")
+            await self._pool.get("sub2", "tenant", "app", b"pem")
+            await self._pool.get("sub1", "tenant", "app", b"pem")
+            second = await self._pool.get("sub3", "tenant", "app", b"pem")
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(self._pool.created, ["sub1", "sub2", "sub3"])
+        self.assertIs(await self._pool.get("sub1", "tenant", "app", b"pem"), first)
+        self.assertIs(await self._pool.get("sub3", "tenant", "app", b"pem"), second)
+        await self._pool.get("sub2", "tenant", "app", b"pem")
+        self.assertEqual(self._pool.created, ["sub1", "sub2", "sub3", "sub2"])
+        self.assertFalse(first.compute_client.closed)
+
+    async def test_close(self):
+        created = await self._pool.get("sub1", "tenant", "app", b"pem")
+        await self._pool.close()
+        self.assertTrue(created.credential.closed)
+        self.assertTrue(created.token_refresher.cancelled())
+
+    async def test_clients_pooled_when_request_cancelled(self):
+        request = asyncio.ensure_future(self._pool.get("sub1", "tenant", "app", b"pem"))
+        await asyncio.sleep(0.01)
+        request.cancel()
+        await asyncio.sleep(0.1)
+
+        created = await self._pool.get("sub1", "tenant", "app", b"pem")
+        self.assertEqual(self._pool.created, ["sub1"])
+        await self._pool.close()
+        self.assertTrue(created.credential.closed)
+        self.assertTrue(created.token_refresher.cancelled())
+
+
+class TestAzureConnectorIsolation(asynctest.TestCase):
+    async def setUp(self):
+        self._pool = FakeClientPool()
+
+    async def tearDown(self):
+        await self._pool.close()
+
+    async def _list_partitions(self, subscription_id: str) -> list[str]:
+        azure = await connector.get_connector(subscription_id, "tenant", "app", b"pem")
+        await asyncio.sleep(random.uniform(0, 0.02))  # another request gets its connector meanwhile
+        return [it["id"] for it in await azure.list_resource_groups()]
+
+    async def test_interleaved_subscriptions(self):
+        subscriptions = [f"sub{it % 5}" for it in range(200)]
+        random.shuffle(subscriptions)
+        with mock.patch.dict(os.environ), mock.patch.object(connector, "CLIENT_POOL", self._pool):
+            os.environ.pop("SWM_TEST_CONFIG", None)
+            results = await asyncio.gather(*[self._list_partitions(it) for it in subscriptions])
+
+        for subscription_id, ids in zip(subscriptions, results):
+            self.assertEqual(ids, [f"/subscriptions/{subscription_id}/resourceGroups/swm-1"])
+        self.assertEqual(sorted(self._pool.created), [f"sub{it}" for it in range(5)])
@@ -0,0 +1,50 @@
+import asyncio
+from types import SimpleNamespace
+
+import asynctest
+from azure.mgmt.compute.models import VirtualMachineImageResource
+
+from swmcloudgate.routers.azure import connector
+from swmcloudgate.routers.azure.connector import AzureConnector, version_key
+
+
+class FakeVirtualMachineImages:
+    def __init__(self, skus: list[str], versions: list[str]) -> None:
+        self._skus = skus
+        self._versions = versions
+        self.list_calls: list[dict] = []
+        self.running = 0
+        self.max_running = 0
+
+    async def list_skus(self, location: str, publisher_name: str, offer: str) -> list[SimpleNamespace]:
+        return [SimpleNamespace(name=it) for it in self._skus]
+
+    async def list(self, **kwargs) -> list[VirtualMachineImageResource]:
+        self.list_calls.append(kwargs)
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        await asyncio.sleep(0.05)  # ARM round trip
+        self.running -= 1
+        versions = sorted(self._versions, reverse=kwargs.get("orderby") == "name desc")  # as text, like ARM
+        versions = versions[: kwargs["top"]] if "top" in kwargs else versions
+        return [VirtualMachineImageResource(name=it, location=kwargs["location"]) for it in versions]
+
+
+class TestAzureConnectorImages(asynctest.TestCase):
+    def setUp(self):
+        self._connector = AzureConnector()
+        self._images = FakeVirtualMachineImages([f"sku{it}" for it in range(20)], ["1.9.9", "1.10.1", "1.2.10"])
+        self._connector._compute_client = SimpleNamespace(virtual_machine_images=self._images)
+
+    def test_version_key(self):
+        self.assertEqual(sorted(["1.9.9", "1.10.1", "1.2.10"], key=version_key), ["1.2.10", "1.9.9", "1.10.1"])
+
+    async def test_latest_version_selected(self):
+        images = await self._connector._retrieve_images("eastus", "publisher", "offer", "sku1")
+        self.assertEqual([(it.name, it.extra["sku"]) for it in images], [("1.10.1", "sku1")])
+        self.assertNotIn("top", self._images.list_calls[0])
+
+    async def test_skus_are_queried_concurrently(self):
+        images = await self._connector._retrieve_images("eastus", "publisher", "offer", "")
+        self.assertEqual([it.extra["sku"] for it in images], [f"sku{it}" for it in range(20)])
+        self.assertEqual(self._images.max_running, connector.IMAGE_SKUS_CONCURRENCY)
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import asynctest
+
+from swmcloudgate import config
+from swmcloudgate.routers.azure.deployments import DeploymentRegistry
+
+
+class FakePoller:
+    def __init__(self, error: Exception | None = None) -> None:
+        self._done = asyncio.Event()
+        self._error = error
+
+    def finish(self) -> None:
+        self._done.set()
+
+    async def result(self) -> None:
+        await self._done.wait()
+        if self._error:
+            raise self._error
+
+
+class FakeDeployments:
+    def __init__(self, provisioning_state: str) -> None:
+        self._provisioning_state = provisioning_state
+        self.get_calls: list[tuple[str, str]] = []
+
+    async def get(self, resource_group_name: str, deployment_name: str) -> SimpleNamespace:
+        self.get_calls.append((resource_group_name, deployment_name))
+        return SimpleNamespace(properties=SimpleNamespace(provisioning_state=self._provisioning_state, error=None))
+
+
+class TestDeploymentRegistry(asynctest.TestCase):
+    async def setUp(self):
+        self._cache_dir = TemporaryDirectory()
+        settings = config.Settings(base=config.BaseSection(cache_dir=Path(self._cache_dir.name)))
+        self._registry = DeploymentRegistry(settings)
+        self._other_worker_registry = DeploymentRegistry(settings)
+
+    async def tearDown(self):
+        await self._registry.close()
+        await self._other_worker_registry.close()
+        self._cache_dir.cleanup()
+
+    async def test_deployment_tracked_in_background(self):
+        poller = FakePoller()
+        operation = await self._registry.track("sub1", "swm-1-resource-group", "swm-1-deployment", poller)
+        self.assertEqual(operation.status, "creating")
+
+        await asyncio.sleep(0.1)
+        in_flight = await self._other_worker_registry.list("sub1", status="creating")
+        self.assertEqual([it.deployment_name for it in in_flight], ["swm-1-deployment"])
+        self.assertGreaterEqual(in_flight[0].elapsed, 0.1)
+
+        poller.finish()
+        await asyncio.sleep(0.1)
+        self.assertEqual((await self._other_worker_registry.get("sub1", "swm-1-resource-group")).status, "succeeded")
+        self.assertEqual(await self._other_worker_registry.list("sub1", status="creating"), [])
+
+    async def test_deployment_failure_is_kept(self):
+        poller = FakePoller(RuntimeError("Quota exceeded"))
+        await self._registry.track("sub1", "swm-2-resource-group", "swm-2-deployment", poller)
+        poller.finish()
+        await asyncio.sleep(0.1)
+
+        operation = await self._other_worker_registry.get("sub1", "swm-2-resource-group")
+        self.assertEqual(operation.status, "failed")
+        self.assertEqual(operation.error, "Quota exceeded")
+        self.assertIsNotNone(operation.finished)
+        self.assertIsNone(await self._other_worker_registry.get("sub1", "swm-3-resource-group"))
+
+    async def test_state_of_restarted_worker_deployment_read_from_arm(self):
+        await self._registry.track("sub1", "swm-4-resource-group", "swm-4-deployment", FakePoller())
+        await self._registry.close()  # the worker is restarted before the deployment ends
+        self.assertEqual((await self._other_worker_registry.get("sub1", "swm-4-resource-group")).status, "creating")
+
+        deployments = FakeDeployments("Succeeded")
+        operation = await self._other_worker_registry.confirm("sub1", "swm-4-resource-group", deployments)
+        self.assertEqual(operation.status, "succeeded")
+        self.assertIsNotNone(operation.finished)
+        self.assertEqual(deployments.get_calls, [("swm-4-resource-group", "swm-4-deployment")])
+        self.assertEqual((await self._other_worker_registry.get("sub1", "swm-4-resource-group")).status, "succeeded")
+
+    async def test_tracked_deployment_not_read_from_arm(self):
+        poller = FakePoller()
+        await self._registry.track("sub1", "swm-5-resource-group", "swm-5-deployment", poller)
+        deployments = FakeDeployments("Running")
+        operation = await self._registry.confirm("sub1", "swm-5-resource-group", deployments)
+        self.assertEqual(operation.status, "creating")
+        self.assertEqual(deployments.get_calls, [])
+
+        operation = await self._other_worker_registry.confirm("sub1", "swm-5-resource-group", deployments)
+        self.assertEqual(operation.status, "creating")
+        self.assertEqual(len(deployments.get_calls), 1)
+        poller.finish()
+
+    async def test_subscriptions_kept_apart(self):
+        await self._registry.track("sub1", "swm-6-resource-group", "swm-6-deployment", FakePoller())
+        self.assertIsNone(await self._other_worker_registry.get("sub2", "swm-6-resource-group"))
+        self.assertEqual(await self._other_worker_registry.list("sub2"), [])
+        self.assertEqual(len(await self._other_worker_registry.list("sub1")), 1)
+        self.assertIsNone(await self._other_worker_registry.confirm("sub2", "swm-6-resource-group", None))
@@ -0,0 +1,253 @@
+import ssl
+import time
+import asyncio
+import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import asynctest
+from aiohttp import web
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from azure.core.credentials import AccessToken
+from azure.mgmt.resourcegraph.aio import ResourceGraphClient
+from cryptography.hazmat.primitives import hashes, serialization
+from azure.mgmt.resource.resources.aio import ResourceManagementClient
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from swmcloudgate import config
+from swmcloudgate.routers.azure import connector
+from swmcloudgate.routers.azure.connector import AzureConnector
+from swmcloudgate.routers.azure.converters import convert_to_partition
+from swmcloudgate.routers.azure.deployments import DeploymentRegistry
+
+SUBSCRIPTION_ID = "00000000-0000-0000-0000-000000000000"
+PARTITIONS_COUNT = 20
+GRAPH_PAGE_SIZE = 50
+
+
+def make_certificate(directory: Path) -> tuple[Path, Path]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = directory / "cert.pem", directory / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    )
+    return cert_path, key_path
+
+
+class FakeCredential:
+    async def get_token(self, *scopes, **kwargs) -> AccessToken:
+        return AccessToken("token", int(time.time()) + 3600)
+
+    async def close(self) -> None:
+        pass
+
+
+class ArmStandIn:
+    """Serves the ARM and Resource Graph requests used to list partitions and counts them."""
+
+    def __init__(self, partitions_count: int) -> None:
+        self.requests = 0
+        self.graph_available = True
+        self.slow_groups: set[str] = set()
+        self.deleted_groups: set[str] = set()  # still returned by Resource Graph
+        self.groups: dict[str, list[dict]] = {}
+        for index in range(partitions_count):
+            group_name = f"swm-{index}-resource-group"
+            group_id = f"/subscriptions/{SUBSCRIPTION_ID}/resourceGroups/{group_name}"
+            self.groups[group_name] = [
+                self._resource(group_id, "Microsoft.Network/publicIPAddresses", {"ipAddress": f"10.0.0.{index}"}),
+                self._resource(
+                    group_id,
+                    "Microsoft.Network/networkInterfaces",
+                    {"ipConfigurations": [{"properties": {"privateIPAddress": f"192.168.0.{index}"}}]},
+                ),
+                self._resource(group_id, "Microsoft.Compute/virtualMachines", {}),
+            ]
+        self.groups["other-resource-group"] = []
+
+    def _resource(self, group_id: str, resource_type: str, properties: dict) -> dict:
+        name = resource_type.split("/")[-1]
+        properties["provisioningState"] = "Succeeded"
+        return {
+            "id": f"{group_id}/providers/{resource_type}/{name}",
+            "name": name,
+            "type": resource_type,
+            "location": "eastus",
+            "properties": properties,
+        }
+
+    @web.middleware
+    async def count_requests(self, request: web.Request, handler) -> web.Response:
+        self.requests += 1
+        return await handler(request)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        parts = [it for it in request.path.split("/") if it]
+        if request.method == "POST" and request.path.lower() == "/providers/microsoft.resourcegraph/resources":
+            if not self.graph_available:
+                return web.json_response({"error": {"code": "Forbidden", "message": "No access"}}, status=403)
+            return self._graph_query(await request.json())
+        if request.method == "HEAD" and len(parts) == 4:
+            exists = parts[3] in self.groups and parts[3] not in self.deleted_groups
+            return web.Response(status=204 if exists else 404)
+        if len(parts) == 3 and parts[2].lower() == "resourcegroups":
+            return web.json_response(
+                {"value": [{"id": self._group_id(it), "name": it, "location": "eastus"} for it in self.groups]}
+            )
+        if len(parts) == 5 and parts[4] == "resources":
+            if parts[3] in self.slow_groups:
+                await asyncio.sleep(1)
+            return web.json_response(
+                {
+                    "value": [
+                        {key: it[key] for key in ["id", "name", "type", "location"]} for it in self.groups[parts[3]]
+                    ]
+                }
+            )
+        for resource in self.groups.get(parts[3], []):
+            if resource["id"] == "/" + "/".join(parts):
+                return web.json_response(resource)
+        return web.json_response({"error": {"code": "NotFound", "message": request.path}}, status=404)
+
+    def _group_id(self, group_name: str) -> str:
+        return f"/subscriptions/{SUBSCRIPTION_ID}/resourceGroups/{group_name}"
+
+    def _graph_query(self, body: dict) -> web.Response:
+        rows = []
+        for group_name, resources in self.groups.items():
+            if not group_name.startswith("swm-"):
+                continue
+            rows.append(
+                {
+                    "id": self._group_id(group_name),
+                    "name": group_name,
+                    "type": "microsoft.resources/subscriptions/resourcegroups",
+                    "resourceGroup": group_name,
+                    "properties": {"provisioningState": "Succeeded"},
+                }
+            )
+            for it in resources:
+                rows.append(
+                    {
+                        "id": it["id"],
+                        "name": it["name"],
+                        "type": it["type"].lower(),
+                        "resourceGroup": group_name.lower(),
+                        "properties": it["properties"],
+                    }
+                )
+        skip = int(body.get("options", {}).get("$skipToken") or 0)
+        page = rows[skip:][:GRAPH_PAGE_SIZE]
+        response = {"totalRecords": len(rows), "count": len(page), "resultTruncated": "false", "data": page}
+        if skip + GRAPH_PAGE_SIZE < len(rows):
+            response["$skipToken"] = str(skip + GRAPH_PAGE_SIZE)
+        return web.json_response(response)
+
+
+class TestAzurePartitionsListing(asynctest.TestCase):
+    async def setUp(self):
+        self._temp_dir = TemporaryDirectory()
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(*make_certificate(Path(self._temp_dir.name)))
+
+        self._arm = ArmStandIn(PARTITIONS_COUNT)
+        app = web.Application(middlewares=[self._arm.count_requests])
+        app.router.add_route("*", "/{tail:.*}", self._arm.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0, ssl_context=ssl_context)
+        await site.start()
+        base_url = f"https://127.0.0.1:{self._runner.addresses[0][1]}"
+
+        credential = FakeCredential()
+        self._connector = AzureConnector()
+        self._connector._test_responses = {}  # SWM_TEST_CONFIG can be left set by other tests
+        self._connector._subscription_id = SUBSCRIPTION_ID
+        self._connector._resource_client = ResourceManagementClient(
+            credential, SUBSCRIPTION_ID, base_url=base_url, connection_verify=False
+        )
+        self._connector._resource_graph_client = ResourceGraphClient(
+            credential, base_url=base_url, connection_verify=False
+        )
+        settings = config.Settings(base=config.BaseSection(cache_dir=Path(self._temp_dir.name)))
+        self._deployments = DeploymentRegistry(settings)
+        self._deployments_patch = asynctest.patch.object(connector, "DEPLOYMENTS", self._deployments)
+        self._deployments_patch.start()
+
+    async def tearDown(self):
+        self._deployments_patch.stop()
+        await self._deployments.close()
+        await self._connector._resource_client.close()
+        await self._connector._resource_graph_client.close()
+        await self._runner.cleanup()
+        self._temp_dir.cleanup()
+
+    async def _list_partitions(self, list_resource_groups) -> tuple[list, int]:
+        self._arm.requests = 0
+        partitions = [convert_to_partition(it, it["name"]) for it in await list_resource_groups()]
+        return sorted(partitions, key=lambda it: it.name), self._arm.requests
+
+    async def test_round_trips_per_partition(self):
+        arm_partitions, arm_requests = await self._list_partitions(self._connector._list_resource_groups_by_arm)
+        graph_partitions, graph_requests = await self._list_partitions(self._connector.list_resource_groups)
+        self.assertEqual(graph_partitions, arm_partitions)
+        self.assertEqual(len(graph_partitions), PARTITIONS_COUNT)
+        self.assertEqual(graph_partitions[0].master_public_ip, "10.0.0.0")
+        self.assertEqual(graph_partitions[0].master_private_ip, "192.168.0.0")
+        self.assertEqual(graph_partitions[0].status, "succeeded")
+        self.assertEqual(arm_requests, 1 + 3 * PARTITIONS_COUNT)
+        self.assertEqual(graph_requests, 2)  # 80 rows in pages of 50
+
+    async def test_fall_back_to_arm(self):
+        self._arm.graph_available = False
+        partitions, requests = await self._list_partitions(self._connector.list_resource_groups)
+        self.assertEqual(len(partitions), PARTITIONS_COUNT)
+        self.assertEqual(requests, 2 + 3 * PARTITIONS_COUNT)
+
+    async def test_slow_group_is_unknown(self):
+        self._arm.graph_available = False
+        self._arm.slow_groups.add("swm-7-resource-group")
+        settings = config.Settings(
+            base=config.BaseSection(cache_dir=self._temp_dir.name, fanout_concurrency=4, fanout_timeout=0.3)
+        )
+        with asynctest.patch.object(config, "get_settings", return_value=settings):
+            partitions, _ = await self._list_partitions(self._connector.list_resource_groups)
+        self.assertEqual(len(partitions), PARTITIONS_COUNT)
+        statuses = {it.name: it.status for it in partitions}
+        self.assertEqual(statuses.pop("swm-7-resource-group"), "unknown")
+        self.assertEqual(set(statuses.values()), {"succeeded"})
+
+    async def test_gate_operations_merged(self):
+        class Poller:
+            async def result(self) -> None:
+                await asyncio.Event().wait()
+
+        await self._deployments.track(SUBSCRIPTION_ID, "swm-new-resource-group", "swm-new-deployment", Poller())
+        await self._deployments.track(SUBSCRIPTION_ID, "swm-5-resource-group", "swm-5-deployment", Poller())
+        await self._deployments.track("other-subscription", "swm-6-resource-group", "swm-6-deployment", Poller())
+        for group_name in ["swm-3-resource-group", "swm-4-resource-group"]:
+            await self._deployments.track_deletion(SUBSCRIPTION_ID, group_name)
+        self._arm.deleted_groups.add("swm-3-resource-group")
+
+        partitions, _ = await self._list_partitions(self._connector.list_resource_groups)
+        statuses = {it.name: it.status for it in partitions}
+        self.assertEqual(len(partitions), PARTITIONS_COUNT)
+        self.assertEqual(statuses.pop("swm-new-resource-group"), "creating")  # not in Resource Graph yet
+        self.assertNotIn("swm-3-resource-group", statuses)  # deleted, but still in Resource Graph
+        self.assertEqual(statuses.pop("swm-4-resource-group"), "deleting")
+        self.assertEqual(statuses.pop("swm-5-resource-group"), "creating")
+        self.assertEqual(set(statuses.values()), {"succeeded"})
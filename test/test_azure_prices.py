@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import asynctest
+
+from swmcloudgate import cache, config
+from swmcloudgate.routers.azure.prices import PriceInfo, PriceIndex, normalize_region
+
+
+def make_meter(name: str, region: str, price: float, category: str = "Virtual Machines") -> SimpleNamespace:
+    return SimpleNamespace(
+        meter_name=name,
+        meter_region=region,
+        meter_category=category,
+        meter_sub_category=f"{name} Series",
+        meter_rates={"0": price},
+    )
+
+
+class FakeRateCard:
+    def __init__(self, meters: list[SimpleNamespace]) -> None:
+        self.meters = meters
+        self.calls = 0
+
+    async def get(self, filter: str) -> SimpleNamespace:
+        self.calls += 1
+        return SimpleNamespace(meters=self.meters)
+
+
+class TestPriceIndex(asynctest.TestCase):
+    def setUp(self):
+        self._cache_dir = Path(TemporaryDirectory().name)
+        settings = config.Settings(base=config.BaseSection(cache_dir=self._cache_dir))
+        self._rate_card = FakeRateCard(
+            [
+                make_meter("D2s v3/D2 v3", "US East", 0.096),
+                make_meter("D2s v3", "US East 2", 0.1),
+                make_meter("D2s v3 Low Priority", "US East", 0.02),
+                make_meter("NC6", "EU West", 0.9),
+                make_meter("Standard IO", "US East", 0.05, category="Storage"),
+            ]
+        )
+        commerce_client = SimpleNamespace(rate_card=self._rate_card)
+        self._index = PriceIndex(commerce_client, cache.Cache("prices", "azure", settings))
+
+    def test_normalize_region(self):
+        self.assertEqual(normalize_region("US East"), "eastus")
+        self.assertEqual(normalize_region("US East 2"), "eastus2")
+        self.assertEqual(normalize_region("Global"), "global")
+
+    async def test_index_covers_all_regions(self):
+        index = await self._index.get_index("0003P")
+        self.assertEqual(
+            index,
+            {
+                ("eastus", "Standard_D2s_v3"): PriceInfo(price=0.096, description="D2s v3/D2 v3 Series"),
+                ("eastus", "Standard_D2_v3"): PriceInfo(price=0.096, description="D2s v3/D2 v3 Series"),
+                ("eastus2", "Standard_D2s_v3"): PriceInfo(price=0.1, description="D2s v3 Series"),
+                ("westeu", "Standard_NC6"): PriceInfo(price=0.9, description="NC6 Series"),
+            },
+        )
+
+    async def test_rate_card_is_downloaded_once(self):
+        for _ in range(3):
+            await self._index.get_index("0003P")
+        self.assertEqual(self._rate_card.calls, 1)
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import asynctest
+
+from swmcloudgate import cache, config
+from swmcloudgate.routers.azure.skus import SkuInfo, SkuCatalog
+
+
+def make_sku(name: str, resource_type: str = "virtualMachines", restrictions: list = None, **capabilities):
+    return SimpleNamespace(
+        name=name,
+        resource_type=resource_type,
+        capabilities=[SimpleNamespace(name=key, value=value) for key, value in capabilities.items()],
+        restrictions=restrictions or [],
+    )
+
+
+class FakeResourceSkus:
+    def __init__(self, skus: list[SimpleNamespace]) -> None:
+        self.skus = skus
+        self.filters: list[str] = []
+
+    async def list(self, filter: str = None):
+        self.filters.append(filter)
+        for sku in self.skus:
+            yield sku
+
+
+class TestSkuCatalog(asynctest.TestCase):
+    def setUp(self):
+        self._cache_dir = Path(TemporaryDirectory().name)
+        settings = config.Settings(
+            base=config.BaseSection(cache_dir=self._cache_dir, cache_expire_by_kind={"skus": 60})
+        )
+        self._cache = cache.Cache("skus", "azure", settings)
+        self._resource_skus = FakeResourceSkus(
+            [
+                make_sku("Standard_NC6", GPUs="1", vCPUs="6", MemoryGB="56", AcceleratedNetworkingEnabled="False"),
+                make_sku(
+                    "Standard_D2s_v3",
+                    vCPUs="2",
+                    MemoryGB="8",
+                    AcceleratedNetworkingEnabled="True",
+                    restrictions=[SimpleNamespace(type="Location", reason_code="NotAvailableForSubscription")],
+                ),
+                make_sku("Standard_LRS", resource_type="disks"),
+            ]
+        )
+        compute_client = SimpleNamespace(resource_skus=self._resource_skus)
+        self._compute_client = compute_client
+        self._catalog = SkuCatalog("sub1", compute_client, self._cache)
+
+    async def test_index_is_location_scoped(self):
+        index = await self._catalog.get_index("westus")
+        self.assertEqual(self._resource_skus.filters, ["location eq 'westus'"])
+        self.assertEqual(sorted(index.keys()), ["Standard_D2s_v3", "Standard_NC6"])
+        self.assertEqual(
+            index["Standard_NC6"],
+            SkuInfo(name="Standard_NC6", location="westus", gpus=1, vcpus=6, memory_gb=56.0),
+        )
+        self.assertEqual(
+            index["Standard_D2s_v3"],
+            SkuInfo(
+                name="Standard_D2s_v3",
+                location="westus",
+                vcpus=2,
+                memory_gb=8.0,
+                accelerated_networking=True,
+                restrictions=["Location:NotAvailableForSubscription"],
+            ),
+        )
+
+    async def test_index_is_cached(self):
+        self.assertEqual((await self._catalog.get("westus", "Standard_NC6")).gpus, 1)
+        self.assertIsNone(await self._catalog.get("westus", "Standard_Unknown"))
+        await self._catalog.get_index("eastus")
+        self.assertEqual(self._resource_skus.filters, ["location eq 'westus'", "location eq 'eastus'"])
+
+    async def test_index_is_subscription_scoped(self):
+        await self._catalog.get_index("westus")
+        await SkuCatalog("sub2", self._compute_client, self._cache).get_index("westus")
+        await self._catalog.get_index("westus")
+        self.assertEqual(self._resource_skus.filters, ["location eq 'westus'", "location eq 'westus'"])
+
+    def test_expire_is_overridden_per_kind(self):
+        self.assertEqual(self._cache.expire, 60)
+        self.assertEqual(cache.Cache("flavors", "azure", self._cache._settings).expire, 7200000)
@@ -1,12 +1,20 @@
+import os
 import json
+import time
 import pickle
+import typing
+import asyncio
 import unittest
+import multiprocessing
 from pathlib import Path
 from datetime import datetime, timedelta
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 
-from swmcloudgate import cache
-from swmcloudgate.routers.models import BaseModel
+import asynctest
+
+from swmcloudgate import cache, config
+from swmcloudgate.routers.models import BaseModel, ImageInfo
+from swmcloudgate.routers.azure.connector import AzureConnector
 
 
 class TestCache(unittest.TestCase):
@@ -23,10 +31,10 @@ class TestCache(unittest.TestCase):
         self.assertIsNone(self._cache.fetch_and_update(["key1", "key2"]))
 
         outdated_timestamp = datetime.now() - timedelta(seconds=self._cache.expire + 1)
-        self._cache._data.append((outdated_timestamp, ["key1", "key2"], [BaseModel()]))
+        self._cache._insert(["key1", "key2"], outdated_timestamp, [BaseModel()])
         self.assertIsNone(self._cache.fetch_and_update(["key1", "key2"]))
 
-        self._cache._data.append((datetime.now(), ["key1", "key2"], [BaseModel()]))
+        self._cache._insert(["key1", "key2"], datetime.now(), [BaseModel()])
         self.assertEqual(self._cache.fetch_and_update(["key1", "key2"]), [BaseModel()])
 
     def test_update(self):
@@ -41,44 +49,267 @@ class TestCache(unittest.TestCase):
         self.assertEqual(len(self._cache._data), 1)
 
         outdated_timestamp = datetime.now() - timedelta(seconds=self._cache.expire + 1)
-        self._cache._data.append((outdated_timestamp, ["key3", "key4"], [BaseModel()]))
+        self._cache._storage.put(("key3", "key4"), outdated_timestamp, [BaseModel()])
         changed, deleted = self._cache.update(["key3", "key4"], [BaseModel()])
         self.assertEqual(changed, 1)
         self.assertEqual(deleted, 1)
         self.assertEqual(len(self._cache._data), 2)
 
-    def test_load_from_filesystem(self):
-        data, cache_file_path = self._cache._load_from_filesystem()
-        self.assertEqual(data, [])
-        self.assertEqual(cache_file_path, Path(f"{self._cache_dir}/cloud-gate-test-test_data_kind.dat"))
+    def test_purge(self):
+        outdated_timestamp = datetime.now() - timedelta(seconds=self._cache.expire + 1)
+        self._cache._insert(["key1"], outdated_timestamp, [BaseModel()])
+        self._cache._insert(["key2"], datetime.now(), [BaseModel()])
+        self._cache._insert(["key3"], outdated_timestamp, [BaseModel()])
+        self._cache._insert(["key3"], datetime.now(), [BaseModel()])  # supersedes the outdated key3
+
+        deleted = self._cache._purge(datetime.now() - timedelta(seconds=self._cache.expire))
+        self.assertEqual(deleted, 1)
+        self.assertEqual(sorted(self._cache._data.keys()), [("key2",), ("key3",)])
+
+    def test_fetch_latency_is_flat(self):
+        def measure(keys_count: int) -> float:
+            now = datetime.now()
+            for it in range(keys_count):
+                self._cache._insert(["location", f"publisher{it}", "offer", "sku"], now, [BaseModel()])
+            keys = [["location", f"publisher{it}", "offer", "sku"] for it in range(0, keys_count, keys_count // 100)]
+            timings = []
+            for _ in range(5):  # best of several runs to filter out scheduling noise
+                started = time.perf_counter()
+                for _ in range(20):
+                    for key in keys:
+                        self.assertIsNotNone(self._cache.fetch_and_update(key))
+                timings.append((time.perf_counter() - started) / (20 * len(keys)))
+            return min(timings)
+
+        small = measure(100)
+        large = measure(20000)
+        self.assertLess(large, small * 5)
+
+    def test_storage_is_lazy_and_per_key(self):
+        self._cache.update(["key1"], [BaseModel()])
+        self._cache.update(["key2"], [BaseModel()])
+
+        settings = config.get_settings(Path(self._config_file.name))
+        reopened = cache.Cache("test_data_kind", "test", settings)
+        self.assertEqual(reopened._data, {})
+        self.assertEqual(reopened.fetch_and_update(["key2"]), [BaseModel()])
+        self.assertEqual(list(reopened._data.keys()), [("key2",)])
+        self.assertIsNone(reopened.fetch_and_update(["key3"]))
+
+
+def fetch_in_worker(config_file: str, fetches_file: str, results: multiprocessing.Queue) -> None:
+    async def load() -> list[ImageInfo]:
+        with open(fetches_file, "a") as file:
+            file.write(f"{os.getpid()}\n")
+        await asyncio.sleep(0.5)  # slow upstream call
+        return [ImageInfo(id="i1", name="image1")]
+
+    shared_cache = cache.data_cache("shared_data_kind", "test", Path(config_file))
+    results.put(asyncio.run(shared_cache.fetch_or_load(["location"], load)))
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        self._cache_dir = Path(TemporaryDirectory().name)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._config_file = NamedTemporaryFile()
+        data = {"base": {"cache_dir": self._cache_dir.as_posix()}}
+        with open(self._config_file.name, "w") as json_file:
+            json.dump(data, json_file, indent=4)
+
+    def test_single_fetch_serves_all_workers(self):
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        fetches_file = self._cache_dir / "fetches.txt"
+        workers = [
+            context.Process(target=fetch_in_worker, args=(self._config_file.name, fetches_file.as_posix(), results))
+            for _ in range(8)
+        ]
+        for worker in workers:
+            worker.start()
+        values = [results.get(timeout=30) for _ in workers]
+        for worker in workers:
+            worker.join(timeout=30)
+            self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(len(fetches_file.read_text().splitlines()), 1)
+        self.assertEqual(values, [[ImageInfo(id="i1", name="image1")]] * len(workers))
+
+
+class TestCacheSingleFlight(asynctest.TestCase):
+    def setUp(self):
+        os.environ["SWM_TEST_CONFIG"] = "test/data/responses.json"
+        self._connector = AzureConnector()
+        self._cache_dir = Path(TemporaryDirectory().name)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._config_file = NamedTemporaryFile()
+        data = {"base": {"cache_dir": self._cache_dir.as_posix()}}
+        with open(self._config_file.name, "w") as json_file:
+            json.dump(data, json_file, indent=4)
+        self._settings = config.get_settings(Path(self._config_file.name))
+        self._calls = 0
+
+    def tearDown(self):
+        del os.environ["SWM_TEST_CONFIG"]
+
+    async def _slow(self, coroutine: typing.Awaitable[typing.Any]) -> typing.Any:
+        self._calls += 1
+        await asyncio.sleep(0.2)
+        return await coroutine
+
+    async def test_concurrent_flavors_misses_are_coalesced(self):
+        flavors_cache = cache.Cache("flavors", "azure", self._settings)
+        results = await asyncio.gather(
+            *[
+                flavors_cache.fetch_or_load(["test"], lambda: self._slow(self._connector.list_sizes("test")))
+                for _ in range(10)
+            ]
+        )
+        self.assertEqual(self._calls, 1)
+        self.assertEqual([[it.name for it in result] for result in results], [["flavor1", "flavor2"]] * 10)
+        self.assertEqual(flavors_cache.fetch_and_update(["test"]), results[0])
+
+    async def test_concurrent_vmimages_misses_are_coalesced(self):
+        images_cache = cache.Cache("vmimages", "azure", self._settings)
+        key = ["test", "publisher", "offer"]
+        results = await asyncio.gather(
+            *[
+                images_cache.fetch_or_load(
+                    key, lambda: self._slow(self._connector.list_images("test", "publisher", "offer", ""))
+                )
+                for _ in range(10)
+            ]
+        )
+        self.assertEqual(self._calls, 1)
+        self.assertEqual([[it.name for it in result] for result in results], [["image1", "cirros"]] * 10)
+
+    async def test_error_is_propagated_to_all_waiters(self):
+        async def fail() -> list[BaseModel]:
+            raise RuntimeError("Azure is not available")
+
+        flavors_cache = cache.Cache("flavors", "azure", self._settings)
+        results = await asyncio.gather(
+            *[flavors_cache.fetch_or_load(["test"], lambda: self._slow(fail())) for _ in range(5)],
+            return_exceptions=True,
+        )
+        self.assertEqual(self._calls, 1)
+        self.assertEqual([str(it) for it in results], ["Azure is not available"] * 5)
+        self.assertEqual(flavors_cache._in_flight, {})
+        self.assertIsNone(flavors_cache.fetch_and_update(["test"]))
+
+
+class TestCacheStaleWhileRevalidate(asynctest.TestCase):
+    def setUp(self):
+        self._cache_dir = Path(TemporaryDirectory().name)
+        settings = config.Settings(base=config.BaseSection(cache_dir=self._cache_dir, cache_refresh=60))
+        self._cache = cache.Cache("flavors", "azure", settings)
+        self._calls = 0
+
+    async def _load(self) -> list[BaseModel]:
+        self._calls += 1
+        await asyncio.sleep(0.1)
+        return [ImageInfo(id="i2", name="fresh")]
+
+    async def _fail(self) -> list[BaseModel]:
+        self._calls += 1
+        raise RuntimeError("Azure is not available")
+
+    async def test_stale_value_is_served_while_refreshed(self):
+        stale_timestamp = datetime.now() - timedelta(seconds=self._cache.refresh + 1)
+        self._cache._storage.put(("test",), stale_timestamp, [ImageInfo(id="i1", name="stale")])
+
+        results = await asyncio.gather(*[self._cache.fetch_or_load(["test"], self._load) for _ in range(5)])
+        self.assertEqual(results, [[ImageInfo(id="i1", name="stale")]] * 5)
+
+        await asyncio.gather(*self._cache._in_flight.values())
+        self.assertEqual(self._calls, 1)
+        self.assertEqual(await self._cache.fetch_or_load(["test"], self._load), [ImageInfo(id="i2", name="fresh")])
+        self.assertEqual(self._calls, 1)
+
+    async def test_stale_value_is_kept_when_refresh_fails(self):
+        stale_timestamp = datetime.now() - timedelta(seconds=self._cache.refresh + 1)
+        self._cache._storage.put(("test",), stale_timestamp, [ImageInfo(id="i1", name="stale")])
+
+        self.assertEqual(await self._cache.fetch_or_load(["test"], self._fail), [ImageInfo(id="i1", name="stale")])
+        await asyncio.gather(*self._cache._in_flight.values(), return_exceptions=True)
+        self.assertEqual(await self._cache.fetch_or_load(["test"], self._fail), [ImageInfo(id="i1", name="stale")])
+        await asyncio.gather(*self._cache._in_flight.values(), return_exceptions=True)
+        self.assertEqual(self._calls, 2)
+
+    async def test_expired_value_is_not_served(self):
+        expired_timestamp = datetime.now() - timedelta(seconds=self._cache.expire + 1)
+        self._cache._storage.put(("test",), expired_timestamp, [ImageInfo(id="i1", name="stale")])
+
+        self.assertEqual(await self._cache.fetch_or_load(["test"], self._load), [ImageInfo(id="i2", name="fresh")])
+        self.assertEqual(self._calls, 1)
+
+
+class TestSqliteCacheStorage(unittest.TestCase):
+    def setUp(self):
+        self._cache_dir = Path(TemporaryDirectory().name)
+        self._storage = cache.SqliteCacheStorage(self._cache_dir / "cloud-gate-test-test_data_kind.sqlite")
+
+    def tearDown(self):
+        self._storage.close()
+
+    def test_get_put(self):
+        self.assertIsNone(self._storage.get(("key1", "key2")))
 
-        cache_file_path = Path(f"{self._cache_dir}/cloud-gate-test-test_data_kind.dat")
         now = datetime.now()
-        with open(cache_file_path, "wb") as file:
+        self._storage.put(("key1", "key2"), now, [BaseModel()])
+        self.assertEqual(self._storage.get(("key1", "key2")), (now, [BaseModel()]))
+
+        self._storage.put(("key1", "key2"), now, [])
+        self.assertEqual(self._storage.get(("key1", "key2")), (now, []))
+
+    def test_purge(self):
+        now = datetime.now()
+        self._storage.put(("key1",), now - timedelta(seconds=10), [BaseModel()])
+        self._storage.put(("key2",), now, [BaseModel()])
+        self.assertEqual(self._storage.purge(now - timedelta(seconds=5)), 1)
+        self.assertIsNone(self._storage.get(("key1",)))
+        self.assertIsNotNone(self._storage.get(("key2",)))
+
+
+class TestPickleCacheStorage(unittest.TestCase):
+    def setUp(self):
+        self._cache_dir = Path(TemporaryDirectory().name)
+        self._cache_file_path = self._cache_dir / "cloud-gate-test-test_data_kind.dat"
+        self._storage = cache.PickleCacheStorage(self._cache_file_path)
+
+    def test_get(self):
+        self.assertIsNone(self._storage.get(("key1", "key2")))
+
+        now = datetime.now()
+        with open(self._cache_file_path, "wb") as file:
             pickle.dump([(now, ["key1", "key2"], [BaseModel()])], file)
-        data, cache_file_path = self._cache._load_from_filesystem()
-        self.assertEqual(data, [(now, ["key1", "key2"], [BaseModel()])])
-        self.assertEqual(cache_file_path, Path(f"{self._cache_dir}/cloud-gate-test-test_data_kind.dat"))
+        storage = cache.PickleCacheStorage(self._cache_file_path)
+        self.assertEqual(storage.get(("key1", "key2")), (now, [BaseModel()]))
 
     def test_read(self):
-        cache_file_path = Path(f"{self._cache_dir}/non_existent_file.dat")
-        data = self._cache._read(cache_file_path)
+        data = self._storage._read(self._cache_dir / "non_existent_file.dat")
         self.assertEqual(data, [])
 
         now = datetime.now()
-        cache_file_path = Path(f"{self._cache_dir}/cloud-gate-test-test_data_kind.dat")
-        with open(cache_file_path, "wb") as file:
+        with open(self._cache_file_path, "wb") as file:
             pickle.dump([(now, ["key1", "key2"], [BaseModel()])], file)
-        data = self._cache._read(cache_file_path)
+        data = self._storage._read(self._cache_file_path)
         self.assertEqual(data, [(now, ["key1", "key2"], [BaseModel()])])
 
     def test_write(self):
         now = datetime.now()
-        cache_file_path = Path(f"{self._cache_dir}/cloud-gate-test-test_data_kind.dat")
-        self._cache._write(cache_file_path, [(now, ["key1", "key2"], [BaseModel()])])
-        with open(cache_file_path, "rb") as file:
+        self._storage._write(self._cache_file_path, [(now, ["key1", "key2"], [BaseModel()])])
+        with open(self._cache_file_path, "rb") as file:
             data = pickle.load(file)
         self.assertEqual(data, [(now, ["key1", "key2"], [BaseModel()])])
+        self.assertEqual(list(self._cache_dir.iterdir()), [self._cache_file_path])
+
+    def test_put_and_purge(self):
+        now = datetime.now()
+        self._storage.put(("key1",), now - timedelta(seconds=10), [BaseModel()])
+        self._storage.put(("key2",), now, [BaseModel()])
+        self.assertEqual(self._storage.purge(now - timedelta(seconds=5)), 1)
+        self.assertEqual(self._storage._read(self._cache_file_path), [(now, ["key2"], [BaseModel()])])
 
 
 if __name__ == "__main__":
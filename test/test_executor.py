@@ -0,0 +1,55 @@
+import time
+import asyncio
+
+import asynctest
+
+from swmcloudgate.routers.executor import ProviderExecutor
+
+
+class TestProviderExecutor(asynctest.TestCase):
+    async def setUp(self):
+        self._slow = ProviderExecutor("slow", size=2, timeout=5)
+        self._fast = ProviderExecutor("fast", size=2, timeout=5)
+
+    async def tearDown(self):
+        self._slow.shutdown()
+        self._fast.shutdown()
+
+    async def test_queue_depth_and_wait_time(self):
+        calls = [asyncio.ensure_future(self._slow.run(time.sleep, 0.1)) for _ in range(6)]
+        await asyncio.sleep(0.05)
+        stats = self._slow.stats
+        self.assertEqual((stats.running, stats.queued), (2, 4))
+
+        await asyncio.gather(*calls)
+        stats = self._slow.stats
+        self.assertEqual((stats.running, stats.queued, stats.completed), (0, 0, 6))
+        self.assertGreaterEqual(stats.wait_seconds_max, 0.19)  # the last wave waits for two waves before it
+        self.assertGreater(stats.wait_seconds_total, stats.wait_seconds_max)
+
+    async def test_busy_pool_does_not_delay_other_providers(self):
+        slow_calls = [asyncio.ensure_future(self._slow.run(time.sleep, 0.3)) for _ in range(10)]
+        started = time.monotonic()
+        self.assertEqual(await asyncio.gather(*[self._fast.run(sum, [it, 1]) for it in range(10)]), list(range(1, 11)))
+        self.assertLess(time.monotonic() - started, 0.2)
+        self.assertEqual(self._fast.stats.completed, 10)
+        for it in slow_calls:
+            it.cancel()
+
+    async def test_timeout_and_failure(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await self._slow.run(time.sleep, 0.3, timeout=0.05)
+        with self.assertRaises(ZeroDivisionError):
+            await self._slow.run(divmod, 1, 0)
+
+        await asyncio.sleep(0.3)
+        stats = self._slow.stats
+        self.assertEqual((stats.timed_out, stats.failed, stats.completed, stats.running), (1, 1, 0, 0))
+
+    async def test_queued_call_timed_out(self):
+        running = [asyncio.ensure_future(self._slow.run(time.sleep, 0.2)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with self.assertRaises(asyncio.TimeoutError):
+            await self._slow.run(time.sleep, 0, timeout=0.05)
+        self.assertEqual(self._slow.stats.queued, 0)
+        await asyncio.gather(*running)
@@ -0,0 +1,49 @@
+import time
+import asyncio
+
+import asynctest
+
+from swmcloudgate.routers import fanout
+
+
+class TestGatherBounded(asynctest.TestCase):
+    async def setUp(self):
+        self._running = 0
+        self._max_running = 0
+
+    async def _fetch(self, item: int) -> str:
+        self._running += 1
+        self._max_running = max(self._running, self._max_running)
+        try:
+            if item == 3:
+                raise RuntimeError("not available")
+            await asyncio.sleep(1 if item == 5 else 0.05)
+            return f"details{item}"
+        finally:
+            self._running -= 1
+
+    async def test_partial_results(self):
+        started = time.monotonic()
+        results = await fanout.gather_bounded(
+            range(10), self._fetch, lambda it, e: f"unknown{it}", concurrency=4, timeout=0.2
+        )
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual(results, [f"unknown{it}" if it in [3, 5] else f"details{it}" for it in range(10)])
+        self.assertEqual(self._max_running, 4)
+
+    async def test_shielded_calls_go_on_in_background(self):
+        finished: list[int] = []
+
+        async def create(item: int) -> str:
+            await asyncio.sleep(0.3 if item == 1 else 0)
+            finished.append(item)
+            return f"created{item}"
+
+        results = await fanout.gather_bounded(range(2), create, lambda _, e: e, concurrency=2, timeout=0.1, shield=True)
+        self.assertEqual(results[0], "created0")
+        self.assertEqual(repr(results[1]), "TimeoutError('Not finished within 0.1 s, goes on in background')")
+        self.assertEqual(len(fanout.BACKGROUND), 1)
+
+        await asyncio.sleep(0.3)
+        self.assertEqual(finished, [0, 1])
+        self.assertEqual(fanout.BACKGROUND, set())
@@ -0,0 +1,102 @@
+import json
+import asyncio
+import multiprocessing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import asynctest
+
+from swmcloudgate import cache, config, metrics
+
+
+def run_worker(directory: str, requests: int, ready: multiprocessing.Event, stop: multiprocessing.Event) -> None:
+    registry = metrics.MetricsRegistry(Path(directory))
+    for _ in range(requests):
+        registry.observe("swm_http_request_duration_seconds", {"route": "/openstack/flavors"}, 0.02)
+    registry.add("swm_http_requests_in_flight", {"route": "/openstack/flavors"}, 1)
+    registry.flush()
+    ready.set()
+    stop.wait(30)
+
+
+class TestMetricsRegistry(asynctest.TestCase):
+    def setUp(self):
+        self._temp_dir = TemporaryDirectory()
+        self._registry = metrics.MetricsRegistry(Path(self._temp_dir.name))
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_histogram_rendering(self):
+        for seconds in [0.003, 0.04, 0.04, 100]:
+            self._registry.observe("swm_upstream_call_duration_seconds", {"method": "list_sizes"}, seconds)
+        text = self._registry.render()
+        self.assertIn("# TYPE swm_upstream_call_duration_seconds histogram", text)
+        self.assertIn('swm_upstream_call_duration_seconds_bucket{method="list_sizes",le="0.005"} 1', text)
+        self.assertIn('swm_upstream_call_duration_seconds_bucket{method="list_sizes",le="0.05"} 3', text)
+        self.assertIn('swm_upstream_call_duration_seconds_bucket{method="list_sizes",le="60.0"} 3', text)
+        self.assertIn('swm_upstream_call_duration_seconds_bucket{method="list_sizes",le="+Inf"} 4', text)
+        self.assertIn('swm_upstream_call_duration_seconds_count{method="list_sizes"} 4', text)
+        self.assertIn('swm_upstream_call_duration_seconds_sum{method="list_sizes"} 100.083', text)
+
+    def test_samples_of_workers_summed_up(self):
+        context = multiprocessing.get_context("fork")
+        stop = [context.Event(), context.Event()]
+        workers = []
+        for requests, stop_event in zip([2, 3], stop):
+            ready = context.Event()
+            workers.append(context.Process(target=run_worker, args=(self._temp_dir.name, requests, ready, stop_event)))
+            workers[-1].start()
+            self.assertTrue(ready.wait(30))
+
+        text = self._registry.render()
+        self.assertIn('swm_http_request_duration_seconds_count{route="/openstack/flavors"} 5', text)
+        self.assertIn('swm_http_requests_in_flight{route="/openstack/flavors"} 2.0', text)
+
+        stop[0].set()
+        workers[0].join(30)
+        text = self._registry.render()
+        self.assertIn('swm_http_request_duration_seconds_count{route="/openstack/flavors"} 5', text)  # archived
+        self.assertIn('swm_http_requests_in_flight{route="/openstack/flavors"} 1.0', text)
+        self.assertEqual(len(list(Path(self._temp_dir.name).glob("*.json"))), 3)  # 2 workers and the archive
+
+        stop[1].set()
+        workers[1].join(30)
+
+    async def test_upstream_call_outcome(self):
+        class Connector:
+            @metrics.timed("openstack")
+            async def list_stacks(self, fail: bool) -> list[str]:
+                await asyncio.sleep(0.01)
+                if fail:
+                    raise RuntimeError("Heat is not available")
+                return []
+
+        with asynctest.patch.object(metrics, "METRICS", self._registry):
+            await Connector().list_stacks(False)
+            with self.assertRaises(RuntimeError):
+                await Connector().list_stacks(True)
+
+        histograms = self._registry.snapshot()["histograms"]["swm_upstream_call_duration_seconds"]
+        self.assertEqual(sorted(dict(json.loads(it))["outcome"] for it in histograms), ["error", "ok"])
+        in_flight = self._registry.snapshot()["gauges"]["swm_upstream_calls_in_flight"]
+        self.assertEqual(list(in_flight.values()), [0.0])
+
+
+class TestCacheMetrics(asynctest.TestCase):
+    async def test_hits_and_misses_counted(self):
+        with TemporaryDirectory() as temp_dir:
+            settings = config.Settings(base=config.BaseSection(cache_dir=Path(temp_dir)))
+            registry = metrics.MetricsRegistry(Path(temp_dir) / "metrics")
+            flavors = cache.Cache("flavors", "azure", settings)
+
+            async def load() -> list[str]:
+                return ["flavor1"]
+
+            with asynctest.patch.object(metrics, "METRICS", registry):
+                for _ in range(3):
+                    self.assertEqual(await flavors.fetch_or_load(["eastus"], load), ["flavor1"])
+
+            text = registry.render()
+        self.assertIn('swm_cache_requests_total{kind="flavors",provider="azure",result="hit"} 2.0', text)
+        self.assertIn('swm_cache_requests_total{kind="flavors",provider="azure",result="miss"} 1.0', text)
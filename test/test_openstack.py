@@ -35,6 +35,7 @@ class TestOpenstackGate(asynctest.TestCase):
     async def tearDown(self):
         self.assertTrue(self.proc.is_alive())
         self.proc.terminate()
+        self.proc.join()  # release the port before the next test starts a server
 
     async def test_list_flavors(self):
         headers = {
@@ -267,3 +268,66 @@ class TestOpenstackGate(asynctest.TestCase):
                     data = await resp.text()
         self.assertEqual(list(data.keys()), ["partition"])
         self.assertTrue(isinstance(data["partition"]["id"], str))
+
+    async def test_create_partitions_batch(self):
+        headers = {
+            "Accept": "application/json",
+            "username": "demo1",
+            "password": "demo1",
+            "tenantname": "demo1",
+        }
+        specs = [
+            {
+                "partname": f"stack{it}",
+                "jobid": f"3579a076-9924-11ee-ba53-a3132f7ae2f{it}",
+                "vmimage": "cirros",
+                "flavorname": "m1.micro",
+                "keyname": "demo1",
+                "count": "0",
+                "runtime": "swm_source=ssh, ssh_pub_key=ssh-rsa AAAAB3NzaC1yc2EAAAABIwAAAQEA7GA",
+                "ports": "10001,10022",
+                "containerimage": "jupyter/datascience-notebook:hub-3.1.1",
+            }
+            for it in range(3)
+        ]
+        async with aiohttp.ClientSession(headers=headers) as session:
+            async with session.post(
+                f"http://{self._hostname}:{self._port}/openstack/partitions:batch", json={"partitions": specs}
+            ) as resp:
+                try:
+                    data = await resp.json()
+                except aiohttp.client_exceptions.ContentTypeError:
+                    data = await resp.text()
+        self.assertEqual([it["partname"] for it in data["results"]], ["stack0", "stack1", "stack2"])
+        self.assertTrue(all(isinstance(it["partition"]["id"], str) for it in data["results"]))
+
+    async def test_create_partitions_batch_without_body(self):
+        headers = {"username": "demo1", "password": "demo1", "tenantname": "demo1"}
+        async with aiohttp.ClientSession(headers=headers) as session:
+            async with session.post(f"http://{self._hostname}:{self._port}/openstack/partitions:batch") as resp:
+                self.assertEqual(resp.status, 200)
+                data = await resp.json()
+        self.assertEqual(data, {"error": "No partitions"})
+
+    async def test_metrics(self):
+        headers = {
+            "Accept": "application/json",
+            "username": "demo1",
+            "password": "demo1",
+        }
+        async with aiohttp.ClientSession(headers=headers) as session:
+            async with session.get(f"http://{self._hostname}:{self._port}/openstack/partitions/s1") as resp:
+                self.assertEqual(resp.status, 200)
+            async with session.get(f"http://{self._hostname}:{self._port}/metrics") as resp:
+                content_type = resp.headers["Content-Type"]
+                data = await resp.text()
+        self.assertTrue(content_type.startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE swm_http_request_duration_seconds histogram", data)
+        self.assertIn(
+            'swm_http_request_duration_seconds_bucket{method="GET",route="/openstack/partitions/{id}",status="200",le=',
+            data,
+        )
+        self.assertIn(
+            'swm_upstream_call_duration_seconds_count{method="get_stack",outcome="ok",provider="openstack"}', data
+        )
+        self.assertIn('swm_http_requests_in_flight{method="GET",route="/metrics"}', data)
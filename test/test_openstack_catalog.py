@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from .test_openstack_client import StubOpenStack, OpenStackStubTestCase
+
+
+class TestImageCatalog(OpenStackStubTestCase):
+    def _image_requests(self) -> list[str]:
+        return [it for it in self._stub.requests if it.startswith("/glance/")]
+
+    async def test_image_lookup_from_index(self):
+        self.assertEqual((await self._connector.find_image("image3")).name, "cirros3")
+        self.assertEqual(len(self._image_requests()), 3)  # the index is loaded page by page
+
+        self._stub.requests.clear()
+        for it in range(5):
+            self.assertEqual((await self._connector.find_image(f"image{it}")).name, f"cirros{it}")
+        self.assertEqual([it.id for it in await self._connector.list_images()], [f"image{it}" for it in range(5)])
+        self.assertEqual(self._image_requests(), [])
+
+    async def test_image_created_after_refresh(self):
+        await self._connector.list_images()
+        self._stub.images["image9"] = StubOpenStack.image("image9", "fedora", "2024-02-01T00:00:00Z")
+        self.assertEqual((await self._connector.find_image("image9")).name, "fedora")
+        self.assertIsNone(await self._connector.find_image("image-unknown"))
+        self.assertEqual(self._image_requests()[-2:], ["/glance/v2/images/image9", "/glance/v2/images/image-unknown"])
+
+    async def test_incremental_refresh(self):
+        await self._connector.list_images()
+        catalog, credentials = self._connector._image_catalog, self._connector._get_credentials()
+        [listed_index] = catalog._cache.fetch_and_update(catalog._key(credentials))
+        self._stub.requests.clear()
+        self._stub.images["image1"] = StubOpenStack.image("image1", "cirros1-renamed", "2024-02-01T00:00:00Z")
+        self._stub.images["image9"] = StubOpenStack.image("image9", "fedora", "2024-02-01T00:00:01Z")
+
+        index = await catalog._retrieve_index(credentials)
+        self.assertEqual(index.listed, listed_index.listed)
+        self.assertEqual(
+            {it.id: it.name for it in index.images.values()},
+            {"image0": "cirros0", "image1": "cirros1-renamed", "image2": "cirros2", "image3": "cirros3"}
+            | {"image4": "cirros4", "image9": "fedora"},
+        )
+        self.assertEqual(
+            self._image_requests(),
+            [
+                "/glance/v2/images?updated_at=gte:2024-01-01T00:00:04Z",
+                "/glance/v2/images?updated_at=gte:2024-01-01T00:00:04Z&marker=image4",
+            ],
+        )
+
+    async def test_full_listing_after_expiry(self):
+        await self._connector.list_images()
+        catalog, credentials = self._connector._image_catalog, self._connector._get_credentials()
+        [index] = catalog._cache.fetch_and_update(catalog._key(credentials))
+        listed = datetime.now() - timedelta(seconds=catalog._cache.expire + 1)
+        # incremental refreshes keep the cache entry fresh, but not the time of the full listing
+        catalog._cache.update(catalog._key(credentials), [index.copy(update={"listed": listed})])
+        del self._stub.images["image2"]
+        self._stub.requests.clear()
+
+        index = await catalog._retrieve_index(credentials)
+        self.assertNotIn("image2", index.images)
+        self.assertGreater(index.listed, listed)
+        self.assertEqual(self._image_requests()[0], "/glance/v2/images")
+
+
+class TestFlavorCache(OpenStackStubTestCase):
+    async def test_flavors_cached_by_endpoint_and_project(self):
+        for _ in range(3):
+            self.assertEqual([it.name for it in await self._connector.list_sizes()], ["m1.micro"])
+        self.assertEqual([it.id for it in await self._new_connector().list_sizes()], ["p1"])
+        self.assertEqual(self._stub.requests, ["/nova/v2.1/flavors/detail"])
@@ -0,0 +1,211 @@
+import time
+import socket
+import asyncio
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from tempfile import TemporaryDirectory
+from unittest import mock
+from urllib.parse import urlencode
+
+import asynctest
+from aiohttp import web
+
+from swmcloudgate import cache, config
+from swmcloudgate.routers.openstack import sizes, connector
+from swmcloudgate.routers.openstack.client import OpenStackClient
+from swmcloudgate.routers.openstack.catalog import ImageCatalog
+from swmcloudgate.routers.openstack.keystone import OpenStackCredentials
+
+IMAGES_PAGE_SIZE = 2
+
+
+class StubOpenStack:
+    """Keystone, Heat, Nova and Glance stand-in that counts token requests, can reject a token once
+    and keeps track of the requests served concurrently and of the client connections.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.token_lifetime = 3600
+        self.token_requests = 0
+        self.reject_next = False
+        self.stacks = {f"id{it}": f"stack{it}" for it in range(5)}  # id -> name
+        self.statuses: dict[str, str] = {}  # id -> status, stacks are created completely by default
+        self.images = {
+            f"image{it}": self.image(f"image{it}", f"cirros{it}", f"2024-01-01T00:00:0{it}Z") for it in range(5)
+        }
+        self.requests: list[str] = []
+        self.peers: set[tuple[str, int]] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._tokens: set[str] = set()
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    @staticmethod
+    def image(id: str, name: str, updated_at: str) -> dict[str, str]:
+        return {"id": id, "name": name, "status": "active", "updated_at": updated_at}
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/v3/auth/tokens", self._authenticate)
+        app.router.add_route("*", "/{path:.*}", self._serve)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        await web.SockSite(self._runner, sock).start()
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _authenticate(self, request: web.Request) -> web.Response:
+        self.token_requests += 1
+        token = f"token{self.token_requests}"
+        self._tokens = {token}
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.token_lifetime)
+        catalog = [
+            {"type": "compute", "name": "nova", "url": f"{self.url}/nova/v2.1"},
+            {"type": "orchestration", "name": "heat", "url": f"{self.url}/heat/v1/demo1"},
+            {"type": "image", "name": "glance", "url": f"{self.url}/glance"},
+        ]
+        body = {
+            "token": {
+                "expires_at": expires_at.strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+                "catalog": [
+                    {
+                        "type": it["type"],
+                        "name": it["name"],
+                        "endpoints": [
+                            {"interface": "internal", "region": "RegionOne", "url": "http://internal.invalid"},
+                            {"interface": "public", "region": "RegionOne", "url": it["url"]},
+                        ],
+                    }
+                    for it in catalog
+                ],
+            }
+        }
+        return web.json_response(body, status=201, headers={"X-Subject-Token": token})
+
+    async def _serve(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append(request.path_qs)
+        self.peers.add(request.transport.get_extra_info("peername"))
+        if self.reject_next or request.headers.get("X-Auth-Token") not in self._tokens:
+            self.reject_next = False
+            return web.json_response({"error": {"code": 401, "message": "Authentication required"}}, status=401)
+        self.in_flight += 1
+        self.max_in_flight = max(self.in_flight, self.max_in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._route(request, request.path.strip("/").split("/"))
+        finally:
+            self.in_flight -= 1
+
+    def _route(self, request: web.Request, path: list[str]) -> web.StreamResponse:
+        match request.method, path:
+            case "GET", ["nova", "v2.1", "flavors", "detail"]:
+                flavors = [{"id": "p1", "name": "m1.micro", "ram": 256, "disk": 1, "vcpus": 1, "swap": ""}]
+                return web.json_response({"flavors": flavors})
+            case "GET", ["glance", "v2", "images"]:
+                ids = sorted(self.images)
+                if updated_since := request.query.get("updated_at", "").removeprefix("gte:"):
+                    ids = [it for it in ids if self.images[it]["updated_at"] >= updated_since]
+                start = ids.index(request.query["marker"]) + 1 if "marker" in request.query else 0
+                page = ids[start:][:IMAGES_PAGE_SIZE]
+                body = {"images": [self.images[it] for it in page]}
+                if start + IMAGES_PAGE_SIZE < len(ids):
+                    body["next"] = f"/v2/images?{urlencode({**request.query, 'marker': page[-1]})}"
+                return web.json_response(body)
+            case "GET", ["glance", "v2", "images", image_id] if image_id in self.images:
+                return web.json_response(self.images[image_id])
+            case "GET", ["heat", "v1", "demo1", "stacks"]:
+                stacks = [{"id": k, "stack_name": v, "stack_status": self._status(k)} for k, v in self.stacks.items()]
+                return web.json_response({"stacks": stacks})
+            case "POST", ["heat", "v1", "demo1", "stacks"]:
+                return self._create_stack(request)
+            case "GET", ["heat", "v1", "demo1", "stacks", name_or_id]:
+                for id, name in self.stacks.items():
+                    if name_or_id in [id, name]:
+                        raise web.HTTPFound(f"/heat/v1/demo1/stacks/{name}/{id}")
+            case "GET", ["heat", "v1", "demo1", "stacks", name, id] if self.stacks.get(id) == name:
+                outputs = [{"output_key": "master_instance_public_ip", "output_value": f"public-{id}"}]
+                stack = {"id": id, "stack_name": name, "stack_status": self._status(id), "outputs": outputs}
+                return web.json_response({"stack": stack})
+            case "DELETE", ["heat", "v1", "demo1", "stacks", name, id] if self.stacks.get(id) == name:
+                del self.stacks[id]
+                return web.Response(status=204)
+        body = {"code": 404, "error": {"message": "Not found", "type": "EntityNotFound"}, "title": "Not Found"}
+        return web.json_response(body, status=404)
+
+    def _status(self, stack_id: str) -> str:
+        return self.statuses.get(stack_id, "CREATE_COMPLETE")
+
+    def _create_stack(self, request: web.Request) -> web.Response:
+        id = f"id{len(self.stacks) + 100}"
+        self.stacks[id] = f"created{id}"
+        return web.json_response({"stack": {"id": id, "links": []}}, status=201)
+
+
+class OpenStackStubTestCase(asynctest.TestCase):
+    delay = 0.0
+
+    async def setUp(self):
+        self._stub = StubOpenStack(self.delay)
+        await self._stub.start()
+        self._client = OpenStackClient()
+        self._cache_dir = TemporaryDirectory()
+        self._settings = config.Settings(base=config.BaseSection(cache_dir=Path(self._cache_dir.name)))
+        self._connector = self._new_connector()
+
+    async def tearDown(self):
+        await self._client.close()
+        await self._stub.stop()
+        self._cache_dir.cleanup()
+
+    def _new_connector(self, password: str = "demo1") -> connector.OpenStackConnector:
+        credentials = OpenStackCredentials(self._stub.url, "demo1", password)
+        openstack = connector.OpenStackConnector(credentials, self._client, test_responses={})
+        openstack._flavor_cache = cache.Cache("flavors", "openstack", self._settings)
+        openstack._image_catalog = ImageCatalog(self._client, cache.Cache("images", "openstack", self._settings))
+        return openstack
+
+
+class TestOpenStackClient(OpenStackStubTestCase):
+    delay = 0.2
+
+    async def test_concurrent_requests_served_in_parallel(self):
+        for _ in range(2):
+            started = time.monotonic()
+            results = await asyncio.gather(
+                *[self._connector.get_stack(f"id{it % 5}") for it in range(8)],
+                *[self._connector.list_stacks() for _ in range(8)],
+            )
+            elapsed = time.monotonic() - started
+            self.assertEqual([it["stack_name"] for it in results[:8]], [f"stack{it % 5}" for it in range(8)])
+            self.assertTrue(all(len(it) == 5 for it in results[8:]))
+            self.assertLess(elapsed, self.delay * 5)  # 16 serialized requests would take 16 delays at least
+
+        self.assertGreaterEqual(self._stub.max_in_flight, 8)
+        self.assertEqual(self._stub.token_requests, 1)  # concurrent authentications are coalesced
+        self.assertLessEqual(len(self._stub.peers), 16)  # connections of the first wave are kept alive
+
+    async def test_images(self):
+        images = await self._connector.list_images()
+        self.assertEqual([it.name for it in images], [f"cirros{it}" for it in range(5)])
+        self.assertEqual(images[0].extra["status"], "active")
+        self.assertEqual((await self._connector.find_image("image3")).name, "cirros3")
+        self.assertIsNone(await self._connector.find_image("image-unknown"))
+
+    async def test_flavors(self):
+        [flavor] = await self._connector.list_sizes()
+        self.assertEqual((flavor.id, flavor.name, flavor.ram, flavor.vcpus, flavor.swap), ("p1", "m1.micro", 256, 1, 0))
+
+    async def test_flavors_route(self):
+        with mock.patch.object(sizes, "get_connector", return_value=self._connector):
+            result = await sizes.list_flavors("demo1", "demo1")
+        [flavor] = result["flavors"]
+        self.assertEqual(
+            (flavor.id, flavor.name, flavor.mem, flavor.cpus, flavor.price), ("p1", "m1.micro", 256, 1, 0.0)
+        )
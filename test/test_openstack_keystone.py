@@ -0,0 +1,33 @@
+from .test_openstack_client import OpenStackStubTestCase
+
+
+class TestKeystoneSessions(OpenStackStubTestCase):
+    async def test_one_authentication_for_all_services(self):
+        for _ in range(3):
+            self.assertEqual((await self._connector.list_stacks())[0]["stack_name"], "stack0")
+            self.assertEqual(len(await self._connector.list_sizes()), 1)
+            self.assertEqual(len(await self._connector.list_images()), 5)
+        self.assertEqual(self._stub.token_requests, 1)
+
+        await self._new_connector(password="other").list_stacks()
+        self.assertEqual(self._stub.token_requests, 2)
+
+    async def test_reauthentication_on_unauthorized(self):
+        self.assertEqual(len(await self._connector.list_stacks()), 5)
+        self._stub.reject_next = True
+        self.assertEqual(len(await self._connector.list_stacks()), 5)
+        self.assertEqual(self._stub.token_requests, 2)
+        self.assertEqual(len(await self._connector.list_sizes()), 1)
+        self.assertEqual(self._stub.token_requests, 2)
+
+    async def test_reauthentication_before_expiration(self):
+        self._stub.token_lifetime = 60
+        await self._connector.list_stacks()
+        await self._connector.list_stacks()
+        self.assertEqual(self._stub.token_requests, 2)
+
+        self._stub.token_lifetime = 3600
+        await self._connector.list_stacks()
+        await self._connector.list_sizes()
+        await self._connector.list_stacks()
+        self.assertEqual(self._stub.token_requests, 3)
@@ -0,0 +1,133 @@
+import os
+import time
+from unittest import mock
+
+import asynctest
+
+from swmcloudgate.routers.registry import ConnectorRegistry
+from swmcloudgate.routers.openstack import connector
+from swmcloudgate.routers.openstack.stacks import StackIndex
+
+from .test_openstack_client import OpenStackStubTestCase
+
+STACKS_COUNT = 500
+
+
+class TestStackLookup(OpenStackStubTestCase):
+    async def setUp(self):
+        await super().setUp()
+        self._stub.stacks = {f"id{it}": f"stack{it}" for it in range(STACKS_COUNT)}
+
+    async def test_direct_lookup(self):
+        self.assertEqual((await self._connector.get_stack("id7"))["stack_name"], "stack7")
+        self.assertEqual((await self._connector.get_stack("stack7"))["id"], "id7")
+        self.assertEqual(
+            self._stub.requests,
+            [
+                "/heat/v1/demo1/stacks/id7",
+                "/heat/v1/demo1/stacks/stack7/id7",
+                "/heat/v1/demo1/stacks/stack7/id7",
+            ],
+        )
+
+    async def test_missing_stack(self):
+        self.assertEqual(await self._connector.get_stack("id-unknown"), {})
+        self.assertEqual(await self._connector.delete_stack("id-unknown"), "Stack with id id-unknown not found")
+
+    async def test_index_invalidated_on_delete(self):
+        self.assertEqual(await self._connector.delete_stack("id9"), "Deletion started")
+        self.assertNotIn("id9", self._stub.stacks)
+        self.assertEqual(await self._connector.get_stack("stack9"), {})
+
+        self._stub.stacks["id9-new"] = "stack9"  # the partition is created again under the same name
+        self.assertEqual((await self._connector.get_stack("stack9"))["id"], "id9-new")
+
+    async def test_created_stack_indexed(self):
+        runtime = "swm_source=ssh, ssh_pub_key=ssh-rsa AAAAB3NzaC1yc2EAAAABIwAAAQEA7GA"
+        stack = await self._connector.create_stack(
+            "demo1", "new", "cirros", "m1.micro", "demo1", "0", "job1", runtime, "10001", "image"
+        )
+        self._stub.stacks[stack["id"]] = "new"
+        self._stub.requests.clear()
+        self.assertEqual((await self._connector.get_stack("new"))["id"], stack["id"])
+        self.assertEqual(self._stub.requests, [f"/heat/v1/demo1/stacks/new/{stack['id']}"])
+
+    async def test_lookup_cost(self):
+        started = time.perf_counter()
+        for it in range(20):
+            self._connector._stack_index = StackIndex()
+            self.assertTrue(await self._connector.list_stacks())  # the old lookup listed all stacks first
+            await self._connector.get_stack(f"id{it}")
+        before = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for it in range(20):
+            await self._connector.get_stack(f"id{it}")
+        after = time.perf_counter() - started
+        self.assertLess(after, before)
+
+
+class TestStackOutputs(OpenStackStubTestCase):
+    def _outputs(self, stacks: list[dict]) -> dict[str, list]:
+        return {it["stack_name"]: [x["output_value"] for x in it.get("outputs", [])] for it in stacks}
+
+    async def test_outputs_of_active_stacks_fetched(self):
+        self._stub.statuses = {"id1": "CREATE_IN_PROGRESS", "id2": "CREATE_FAILED", "id3": "DELETE_IN_PROGRESS"}
+        stacks = await self._connector.list_stacks(with_outputs=True)
+        self.assertEqual(
+            self._outputs(stacks),
+            {"stack0": ["public-id0"], "stack1": ["public-id1"], "stack2": [], "stack3": [], "stack4": ["public-id4"]},
+        )
+        self.assertEqual(self._stub.requests[0], "/heat/v1/demo1/stacks")
+        self.assertEqual(
+            sorted(self._stub.requests[1:]), [f"/heat/v1/demo1/stacks/stack{it}/id{it}" for it in [0, 1, 4]]
+        )
+
+    async def test_outputs_of_created_stacks_reused(self):
+        self._stub.statuses = {"id1": "CREATE_IN_PROGRESS"}
+        await self._connector.list_stacks(with_outputs=True)
+        self._stub.requests.clear()
+        stacks = await self._connector.list_stacks(with_outputs=True)
+        self.assertEqual(self._outputs(stacks)["stack0"], ["public-id0"])
+        self.assertEqual(self._stub.requests, ["/heat/v1/demo1/stacks", "/heat/v1/demo1/stacks/stack1/id1"])
+
+        self._stub.statuses = {"id0": "UPDATE_IN_PROGRESS"}  # outputs of an updated stack can change
+        self._stub.requests.clear()
+        await self._connector.list_stacks(with_outputs=True)
+        self.assertEqual(
+            sorted(self._stub.requests),
+            ["/heat/v1/demo1/stacks", "/heat/v1/demo1/stacks/stack0/id0", "/heat/v1/demo1/stacks/stack1/id1"],
+        )
+
+    async def test_outputs_not_fetched_by_default(self):
+        stacks = await self._connector.list_stacks()
+        self.assertTrue(all("outputs" not in it for it in stacks))
+        self.assertEqual(self._stub.requests, ["/heat/v1/demo1/stacks"])
+
+
+class TestConnectorRegistry(OpenStackStubTestCase):
+    def test_connector_bound_to_credentials(self):
+        with mock.patch.object(connector, "CONNECTORS", ConnectorRegistry(max_size=2)):
+            first = connector.get_connector("demo1", "demo1", self._stub.url)
+            self.assertIs(connector.get_connector("demo1", "demo1", self._stub.url), first)
+            self.assertIsNot(connector.get_connector("demo2", "demo2", self._stub.url), first)
+            self.assertEqual(first._get_credentials().username, "demo1")
+
+            first._stack_index.add("stack1", "id1")  # stack names are unique only within an account
+            self.assertIsNone(connector.get_connector("demo2", "demo2", self._stub.url)._stack_index.get("stack1"))
+
+            connector.get_connector("demo3", "demo3", self._stub.url)
+            self.assertIsNot(connector.get_connector("demo1", "demo1", self._stub.url), first)
+
+    def test_connector_without_credentials(self):
+        with self.assertRaises(PermissionError):
+            connector.get_connector(None, None)._get_credentials()
+
+
+class TestTestResponses(asynctest.TestCase):
+    async def test_connectors_do_not_share_responses(self):
+        with mock.patch.dict(os.environ, {"SWM_TEST_CONFIG": "test/data/responses.json"}):
+            first, second = connector.OpenStackConnector(), connector.OpenStackConnector()
+        self.assertEqual(await first.delete_stack("s1"), "Deletion started")
+        self.assertEqual(await first.get_stack("s1"), {})
+        self.assertEqual((await second.get_stack("s1"))["id"], "s1")
@@ -0,0 +1,93 @@
+import time
+import asyncio
+import threading
+from pathlib import Path
+from unittest import mock
+
+import asynctest
+from fastapi.testclient import TestClient
+
+from swmcloudgate import config, profiling
+from swmcloudgate.main import app
+
+LEAKED: list[bytes] = []
+
+
+def spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestProfiling(asynctest.TestCase):
+    async def test_busy_thread_sampled(self):
+        stop = threading.Event()
+        busy = threading.Thread(target=spin, args=(stop,), name="busy-worker")
+        busy.start()
+        try:
+            stacks = await profiling.profile_cpu(0.2, interval=0.005)
+        finally:
+            stop.set()
+            busy.join()
+
+        lines = [it.rsplit(" ", 1) for it in stacks.splitlines()]
+        busy_samples = sum(int(count) for stack, count in lines if stack.startswith("busy-worker;"))
+        self.assertGreater(busy_samples, 5)
+        self.assertTrue(any("spin (test_profiling.py:" in stack for stack, _ in lines))
+        self.assertFalse(any(stack.startswith("swm-profiler;") for stack, _ in lines))
+
+    async def test_memory_growth_reported(self):
+        async def allocate() -> None:
+            await asyncio.sleep(0.05)
+            LEAKED.extend(bytes(1024) for _ in range(1000))
+
+        task = asyncio.ensure_future(allocate())
+        statistics = await profiling.trace_memory(0.2, limit=5)
+        await task
+        LEAKED.clear()
+
+        self.assertEqual(statistics[0]["file"], __file__)
+        self.assertGreater(statistics[0]["size_diff"], 1000 * 1024)
+
+    async def test_one_profiling_at_a_time(self):
+        first = asyncio.ensure_future(profiling.profile_cpu(0.2))
+        await asyncio.sleep(0.05)
+        with self.assertRaises(profiling.ProfilerBusyError):
+            await profiling.trace_memory(0.1, limit=5)
+        await first
+
+
+class TestAdminEndpoints(asynctest.TestCase):
+    def setUp(self):
+        self._client = TestClient(app)
+
+    def _settings(self, **admin) -> mock.Mock:
+        settings = config.Settings(base=config.BaseSection(cache_dir=Path("~/.swm/cache")), admin=admin)
+        return mock.patch.object(config, "get_settings", return_value=settings)
+
+    def test_disabled_by_default(self):
+        with self._settings():
+            response = self._client.get("/admin/profile/cpu", headers={"X-Admin-Token": ""})
+        self.assertEqual(response.status_code, 404)
+
+    def test_token_required(self):
+        for settings, token in [({"token": "secret"}, "wrong"), ({"token": "secret"}, None), ({}, "")]:
+            headers = {} if token is None else {"X-Admin-Token": token}
+            with self._settings(enabled=True, **settings):
+                response = self._client.get("/admin/memory/diff?seconds=0.01", headers=headers)
+            self.assertEqual(response.status_code, 403)
+
+    def test_cpu_profile(self):
+        started = time.monotonic()
+        with self._settings(enabled=True, token="secret", max_profile_seconds=0.2):
+            response = self._client.get("/admin/profile/cpu?seconds=30", headers={"X-Admin-Token": "secret"})
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        self.assertIn("X-Worker-PID", response.headers)
+        self.assertRegex(response.text.splitlines()[0], r"^\S.*;.* \d+$")
+
+    def test_memory_diff(self):
+        with self._settings(enabled=True, token="secret"):
+            response = self._client.get("/admin/memory/diff?seconds=0.05&limit=3", headers={"X-Admin-Token": "secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json()["statistics"]), 3)
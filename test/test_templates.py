@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import typing
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import yaml
+import jinja2
+
+from swmcloudgate.routers.azure import connector as azure_connector
+from swmcloudgate.routers.openstack import connector as openstack_connector
+from swmcloudgate.routers.templates import TemplateRegistry
+from swmcloudgate.routers.azure.connector import AzureConnector
+from swmcloudgate.routers.openstack.connector import OpenStackConnector
+
+PARTITIONS_COUNT = 50
+RUNTIME = "swm_source=ssh, ssh_pub_key=ssh-rsa AAAAB3NzaC1yc2EAAAABIwAAAQEA7GA"
+
+
+class TestTemplateRegistry(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = TemporaryDirectory()
+        self._registry = TemplateRegistry(search_path=self._temp_dir.name)
+        self._template_path = Path(self._temp_dir.name) / "template.txt"
+        self._document_path = Path(self._temp_dir.name) / "template.json"
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _write(self, path: Path, content: str, mtime: int) -> None:
+        path.write_text(content)
+        os.utime(path, (mtime, mtime))
+
+    def test_template_reloaded_on_change(self):
+        self._write(self._template_path, "Hello {{ name }}", 1000)
+        self.assertEqual(self._registry.render("template.txt", name="world"), "Hello world")
+        self.assertIs(self._registry.get_template("template.txt"), self._registry.get_template("template.txt"))
+
+        self._write(self._template_path, "Bye {{ name }}", 2000)
+        self.assertEqual(self._registry.render("template.txt", name="world"), "Bye world")
+
+    def test_document_copy_is_pristine(self):
+        self._write(self._document_path, json.dumps({"resources": [{"rules": []}]}), 1000)
+        document = self._registry.load_json(self._document_path.as_posix())
+        document["resources"][0]["rules"].append("rule1")
+        self.assertEqual(self._registry.load_json(self._document_path.as_posix()), {"resources": [{"rules": []}]})
+
+        self._write(self._document_path, json.dumps({"resources": []}), 2000)
+        self.assertEqual(self._registry.load_json(self._document_path.as_posix()), {"resources": []})
+
+
+class UncachedTemplateRegistry(TemplateRegistry):
+    """Renders like the connectors did before the registry: new environment and file read per call."""
+
+    def get_template(self, file_path: str, autoescape: bool = True) -> jinja2.Template:
+        template_env = jinja2.Environment(  # nosec B701
+            loader=jinja2.FileSystemLoader(searchpath="./"), autoescape=autoescape
+        )
+        return template_env.get_template(file_path)
+
+    def load_json(self, file_path: str) -> typing.Any:
+        with open(file_path) as template_file:
+            return json.load(template_file)
+
+
+class TestRenderingCost(unittest.TestCase):
+    def _render_azure(self, connector: AzureConnector, index: int) -> dict:
+        script = connector._get_cloud_init_script(
+            f"job{index}", "image", "registry", "user", "pass", "account", "key", "container", {}, "ssh-rsa"
+        )
+        return connector._get_deployment_properties(
+            f"job{index}", f"part{index}", "Standard_B2s", "ubuntu", "user", "ssh-rsa", script, "10001,10022"
+        )
+
+    def _render_openstack(self, connector: OpenStackConnector, index: int) -> dict:
+        return connector._get_stack_template(
+            f"stack{index}", "image", "flavor", "key", "1", f"job{index}", RUNTIME, "10001,10022", "image"
+        )
+
+    def _measure(self, render: typing.Callable[[int], dict]) -> float:
+        render(0)  # warm up, compiles templates once for the registry
+        started = time.perf_counter()
+        for index in range(PARTITIONS_COUNT):
+            render(index)
+        return (time.perf_counter() - started) / PARTITIONS_COUNT
+
+    def _measure_before_and_after(self, render: typing.Callable[[int], dict]) -> tuple[float, float]:
+        uncached = UncachedTemplateRegistry()
+        with (
+            mock.patch.object(azure_connector, "TEMPLATES", uncached),
+            mock.patch.object(openstack_connector, "TEMPLATES", uncached),
+            mock.patch.object(openstack_connector, "YAML_LOADER", yaml.SafeLoader),
+        ):
+            before = self._measure(render)
+        return before, self._measure(render)
+
+    def test_rendering_cost_per_partition(self):
+        azure, openstack = AzureConnector(), OpenStackConnector()
+        costs = {
+            "Azure": self._measure_before_and_after(lambda it: self._render_azure(azure, it)),
+            "OpenStack": self._measure_before_and_after(lambda it: self._render_openstack(openstack, it)),
+        }
+        for provider, (before, after) in costs.items():
+            self.assertLess(after, before, provider)
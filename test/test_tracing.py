@@ -0,0 +1,89 @@
+import os
+import json
+import asyncio
+from pathlib import Path
+from unittest import mock
+
+import asynctest
+from fastapi.testclient import TestClient
+
+from swmcloudgate import config, tracing
+from swmcloudgate.main import app
+from swmcloudgate.routers.executor import ProviderExecutor
+
+
+class TestTrace(asynctest.TestCase):
+    async def test_spans_of_tasks_and_threads(self):
+        executor = ProviderExecutor("test", size=2, timeout=5)
+
+        def render() -> str:
+            with tracing.span("template.render"):
+                return "rendered"
+
+        async def fetch(item: int) -> None:
+            with tracing.span("azure.get", item=item):
+                await asyncio.sleep(0.01)
+                tracing.annotate(status=200)
+
+        with tracing.trace("req-1", "GET /azure/partitions") as trace:
+            with tracing.span("azure.list_resource_groups"):
+                await asyncio.gather(*[fetch(it) for it in range(3)])
+                self.assertEqual(await executor.run(render), "rendered")
+        executor.shutdown()
+
+        timeline = trace.timeline()
+        self.assertEqual(timeline["request_id"], "req-1")
+        spans = {it["name"]: it for it in timeline["spans"]}
+        root = spans["azure.list_resource_groups"]
+        self.assertIsNone(root["parent"])
+        self.assertEqual([it["item"] for it in timeline["spans"] if it["name"] == "azure.get"], [0, 1, 2])
+        self.assertTrue(all(it["parent"] == root["id"] for it in timeline["spans"] if it["name"] == "azure.get"))
+        self.assertEqual(spans["azure.get"]["status"], 200)
+        self.assertEqual(spans["executor.test"]["parent"], root["id"])
+        self.assertEqual(spans["template.render"]["parent"], spans["executor.test"]["id"])
+        self.assertIn("wait_ms", spans["executor.test"])
+        self.assertGreaterEqual(root["duration_ms"], 10)
+
+        header = trace.server_timing()
+        self.assertIn("azure.list_resource_groups;dur=", header)
+        self.assertIn("azure.get;dur=", header)
+        self.assertIn('desc="x3"', header)
+        self.assertIn("total;dur=", header)
+
+    def test_no_spans_outside_of_request(self):
+        with tracing.span("cache.flavors"):
+            tracing.annotate(result="hit")
+        self.assertIsNone(tracing.current())
+
+
+class TestRequestTimeline(asynctest.TestCase):
+    def setUp(self):
+        self._environ = mock.patch.dict(os.environ, {"SWM_TEST_CONFIG": "test/data/responses.json"})
+        self._environ.start()
+        base = config.BaseSection(cache_dir=Path("~/.swm/cache"), slow_request_seconds=0, server_timing=True)
+        self._settings = mock.patch.object(config, "get_settings", return_value=config.Settings(base=base))
+        self._settings.start()
+        self._client = TestClient(app)
+
+    def tearDown(self):
+        self._settings.stop()
+        self._environ.stop()
+
+    def test_slow_request_logged_with_timeline(self):
+        headers = {"username": "demo1", "password": "demo1", tracing.REQUEST_ID_HEADER: "req-42"}
+        with self.assertLogs("swm.slow", level="INFO") as logs:
+            response = self._client.get("/openstack/partitions", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers[tracing.REQUEST_ID_HEADER], "req-42")
+        self.assertIn("openstack.list_stacks;dur=", response.headers["Server-Timing"])
+
+        [record] = logs.records
+        timeline = json.loads(record.getMessage())
+        self.assertEqual(timeline["request_id"], "req-42")
+        self.assertEqual(timeline["request"], "GET /openstack/partitions")
+        self.assertEqual(timeline["status"], "200")
+        self.assertEqual([it["name"] for it in timeline["spans"]], ["openstack.list_stacks"])
+
+    def test_request_id_generated(self):
+        response = self._client.get("/openstack/flavors", headers={"username": "demo1", "password": "demo1"})
+        self.assertEqual(len(response.headers[tracing.REQUEST_ID_HEADER]), 32)